@@ -4,15 +4,32 @@ import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 from datetime import datetime, timedelta, date
 import pytz
-from fpdf import FPDF
 from PIL import Image
 import os
-import tempfile
+import io
 import plotly.express as px
 import requests
 import base64
 import json
 import re
+import sqlite3
+import time
+import random
+import threading
+import importlib.machinery
+import uuid
+import weakref
+from abc import ABC, abstractmethod
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib3.util.retry import Retry
+from etiket import EtiketPDF, pazaryeri_kartlari
+from pazaryeri import (TRENDYOL_ESZAMANLI_ISTEK, PAZARYERI_ADAPTORLERI, TrendyolAdaptoru, fetch_trendyol_orders,
+                       kayitli_cevap_istegi, siparis_no_normalize)
+
+# Streamlit bu script'i __spec__'i olmayan bir __main__ modülünde çalıştırır. Bu durumda spawn/forkserver ile açılan
+# süreç havuzu işçileri (etiket.py) script'i baştan çalıştırır; modül adı verilince multiprocessing __main__'e dokunmaz.
+__spec__ = importlib.machinery.ModuleSpec("__main__", None)
 
 # --- SAYFA AYARLARI ---
 st.set_page_config(page_title="MiniVagon Bulut", page_icon="☁️", layout="wide")
@@ -20,6 +37,71 @@ st.set_page_config(page_title="MiniVagon Bulut", page_icon="☁️", layout="wid
 # --- SABİTLER ---
 SHEET_ADI = "MiniVagonDB"
 RESIM_KLASORU = "resimler"
+YEREL_VERI_KLASORU = "yerel_veri"
+SNAPSHOT_DB = os.path.join(YEREL_VERI_KLASORU, "snapshot.db")
+# Sheets arayüzünden elle yapılan düzenlemeleri de yakalamak için snapshot bu sürede bir tamamen yenilenir
+SNAPSHOT_TAM_SENKRON_SN = 600
+# Bu süre içinde eşitlenmiş bir sayfa için Sheets'e tekrar gidilmez (verileri_getir ttl'i ile aynı)
+SNAPSHOT_KONTROL_SN = 5
+KUYRUK_DB = os.path.join(YEREL_VERI_KLASORU, "yazma_kuyrugu.db")
+# Bekleyen satırların Sheets'e toplu aktarılma aralığı ve hata durumunda en uzun bekleme
+KUYRUK_BOSALTMA_SN = 3
+KUYRUK_MAKS_BEKLEME_SN = 120
+# Google Sheets API kullanıcı başına dakikalık istek kotası ve 429/5xx için tekrar deneme ayarları
+SHEETS_DAKIKA_KOTASI = 60
+SHEETS_MAKS_DENEME = 5
+SHEETS_MAKS_BEKLEME_SN = 32
+# Dış API'lere giden tüm istekler için paylaşılan HTTP istemcisi: bağlantı kurma / cevap okuma zaman aşımları,
+# host başına açık tutulan bağlantı sayısı ve bağlantı hatalarında (sadece idempotent isteklerde) tekrar deneme
+HTTP_BAGLANTI_ZAMAN_ASIMI_SN = 5
+HTTP_OKUMA_ZAMAN_ASIMI_SN = 30
+HTTP_HAVUZ_BOYUTU = 10
+HTTP_MAKS_DENEME = 2
+# e-Fatura token'ı JWT'deki exp süresinin dolmasına bu kadar kala yenilenir; exp okunamazsa bu süre geçerli sayılır
+EFATURA_TOKEN_YENILEME_PAYI_SN = 120
+EFATURA_TOKEN_VARSAYILAN_OMUR_SN = 30 * 60
+# Toplu e-fatura kesiminde aynı anda gönderilen en fazla istek ve ağ geçidinin dakikalık istek kotası
+EFATURA_ESZAMANLI_ISTEK = 4
+EFATURA_DAKIKA_KOTASI = 120
+# Artımlı senkron: son görülen değişiklik zamanı bu dosyada tutulur. İlk senkron bu kadar gün geriye gider;
+# sonrakiler işaretten biraz (pay) geriden başlar ki sınırdaki güncellemeler kaçmasın
+SENKRON_DB = os.path.join(YEREL_VERI_KLASORU, "senkron.db")
+PAZARYERI_ILK_SENKRON_GUN = 7
+PAZARYERI_SENKRON_PAYI_SN = 15 * 60
+# Her e-fatura denemesinin sonucu (BEKLIYOR / KESILDI + UUID / HATA) bu dosyada tutulur; yarıda kalan bir
+# toplu kesim tekrar çalıştırıldığında kesilmiş faturalar yeniden gönderilmez
+FATURA_GUNLUGU_DB = os.path.join(YEREL_VERI_KLASORU, "fatura_gunlugu.db")
+# Fatura Takibi ekranı açılırken günlük Sheets'e en fazla bu aralıkla uzlaştırılır (kesim sonrası her zaman)
+FATURA_UZLASTIRMA_SN = 5 * 60
+# Onay bekleyen toplu etiket PDF'i oturum başına en fazla bu kadar bellekte tutulur; daha büyüğü bu klasördeki spool
+# dosyasına yazılır ve indirme anında diskten okunur. Süreç yeniden başlarken sahipsiz kalan dosyalar bu süreden sonra silinir
+ETIKET_OTURUM_BELLEK_BUTCESI = 2 * 1024 * 1024
+ETIKET_SPOOL_KLASORU = os.path.join(YEREL_VERI_KLASORU, "etiket_spool")
+ETIKET_SPOOL_OMUR_SN = 24 * 60 * 60
+# secrets'ta [depolama] tur = "sqlite" seçildiğinde kullanılan yerel veritabanı (dosya ile değiştirilebilir)
+YEREL_DEPO_DB = os.path.join(YEREL_VERI_KLASORU, "depo.db")
+
+# Çalışma sayfalarının başlık satırları (uygulama eksik sayfayı bunlarla oluşturur; yerel depo da aynı şemayı kullanır)
+SAYFA_BASLIKLARI = {
+    "Siparisler": ["Siparis No","Tarih","Durum","Müşteri","Telefon","TC No","Mail","Ürün 1","Adet 1","İsim 1","Ürün 2","Adet 2","İsim 2","Tutar","Ödeme","Kaynak","Adres","Not","Fatura Durumu","Tedarik Durumu","İl","İlçe"],
+    "PazaryeriSiparisleri": ["Pazaryeri Siparis No","Tarih","Durum","Müşteri","Telefon","TC No","Mail","Ürün 1","Adet 1","İsim 1","Ürün 2","Adet 2","İsim 2","Tutar","Ödeme","Kaynak","Adres","Kargo Takip No","Fatura Durumu","Tedarik Durumu", "İl", "İlçe", "Kargo Firması", "Yazdırıldı Durumu"],
+    "Cariler": ["Cari Adı", "Tarih", "Fatura No", "Not", "Tutar", "Tip"],
+    "Alislar": ["Tarih", "Bağlı Sipariş", "Cari Hesap", "Ürün", "Adet", "Birim Fiyat", "Toplam", "Durum", "Not"],
+    "Maliyetler": ["Görsel", "Ürün Kod", "Ürün Id", "Tahta", "VERNİK", "YAKMA", "BOYA", "MUSLUK", "BORU", "HALAT", "Metal çubuk", "CAM", "UĞUR KAR", "MALİYET"],
+    "Urunler": ["Urun Adi", "Resim Dosya Adi"],
+    # Sipariş kalemleri (uzun format): her ürün satırı ayrı kayıt. Sipariş Türü "Manuel" veya "Pazaryeri"
+    "SiparisSatirlari": ["Siparis No", "Sipariş Türü", "Sıra", "Ürün", "Adet", "İsim"],
+}
+# tablo_getir'in tip dönüşümleri (sadece sayfada bulunan sütunlara uygulanır)
+ADET_SUTUNLARI = ["Adet 1", "Adet 2", "Adet"]
+KATEGORI_SUTUNLARI = ["Durum", "Ödeme", "Kaynak", "Fatura Durumu", "Tedarik Durumu", "Tip"]
+# Sipariş numarası sütunları; tabloya kanonik biçimi "Sipariş Anahtarı" olarak eklenir
+SIPARIS_NO_SUTUNLARI = ["Siparis No", "Pazaryeri Siparis No"]
+TARIH_BICIMLERI = ["%d.%m.%Y %H:%M", "%d.%m.%Y"]
+# Kayıtlı bir pazaryeri siparişinde pazaryerinden gelen değerle güncellenen sütunlar
+PAZARYERI_GUNCELLENEN_SUTUNLAR = ["Durum", "Kargo Takip No", "Kargo Firması"]
+# kalem_tablosu sütunları
+KALEM_SUTUNLARI = ["Sipariş Türü", "Sipariş Anahtarı", "Ürün", "Adet", "İsim"]
 
 
 # --- GİRİŞ SİSTEMİ (LOGIN) ---
@@ -64,6 +146,49 @@ def simdi():
     tz = pytz.timezone('Europe/Istanbul')
     return datetime.now(tz)
 
+# --- HTTP İSTEMCİSİ ---
+# Trendyol, e-Fatura ve barkod istekleri aynı oturumdan gider; host başına bağlantılar açık tutulduğu için
+# toplu fatura ve etiket işlerinde her istek yeniden TCP/TLS el sıkışması yapmaz.
+@st.cache_resource
+def http_oturumu():
+    """Süreç boyunca paylaşılan, bağlantı havuzlu HTTP oturumu. Bağlantı/okuma hatalarında yalnızca
+    idempotent istekler (GET vb.) tekrar denenir; POST'lar tekrar gönderilmez. HTTP durum kodlarına göre
+    tekrar deneme kararı çağırana bırakılır."""
+    tekrar = Retry(total=HTTP_MAKS_DENEME, connect=HTTP_MAKS_DENEME, read=HTTP_MAKS_DENEME, status=0,
+                   allowed_methods=Retry.DEFAULT_ALLOWED_METHODS, backoff_factor=0.5, raise_on_status=False)
+    adaptor = requests.adapters.HTTPAdapter(pool_connections=HTTP_HAVUZ_BOYUTU,
+                                            pool_maxsize=max(HTTP_HAVUZ_BOYUTU, TRENDYOL_ESZAMANLI_ISTEK),
+                                            max_retries=tekrar)
+    oturum = requests.Session()
+    oturum.mount("https://", adaptor)
+    oturum.mount("http://", adaptor)
+    return oturum
+
+@st.cache_resource
+def http_metrikleri():
+    """Uç nokta adı -> {cagri, hata, toplam_sn, en_uzun_sn}. Kilit ile birlikte süreç boyunca paylaşılır."""
+    return threading.Lock(), {}
+
+def http_istek(uc_nokta, method, url, **kwargs):
+    """Paylaşılan oturumla istek gönderir ve süresini uç nokta adına göre kaydeder.
+    timeout verilmezse varsayılan (bağlantı, okuma) zaman aşımları kullanılır."""
+    kwargs.setdefault("timeout", (HTTP_BAGLANTI_ZAMAN_ASIMI_SN, HTTP_OKUMA_ZAMAN_ASIMI_SN))
+    basla = time.monotonic()
+    hata = True
+    try:
+        response = http_oturumu().request(method, url, **kwargs)
+        hata = response.status_code >= 400
+        return response
+    finally:
+        sure = time.monotonic() - basla
+        kilit, metrik = http_metrikleri()
+        with kilit:
+            m = metrik.setdefault(uc_nokta, {"cagri": 0, "hata": 0, "toplam_sn": 0.0, "en_uzun_sn": 0.0})
+            m["cagri"] += 1
+            m["hata"] += int(hata)
+            m["toplam_sn"] += sure
+            m["en_uzun_sn"] = max(m["en_uzun_sn"], sure)
+
 # --- TRENDYOL E-FATURA API BAĞLANTISI ---
 def trendyol_efatura_login():
     """Trendyol E-Faturam API'sine login olur ve token döner."""
@@ -89,7 +214,7 @@ def trendyol_efatura_login():
             "Accept": "application/json"
         }
 
-        response = requests.post(url, json=payload, headers=headers)
+        response = http_istek("efatura_giris", "POST", url, json=payload, headers=headers)
         if response.status_code == 200:
             # Token header'da dönüyor (Dökümana göre)
             access_token = response.headers.get("x-access-token") or response.headers.get("access-token") or response.headers.get("Authorization")
@@ -103,19 +228,21 @@ def trendyol_efatura_login():
                 if not access_token.startswith("Bearer "):
                     access_token = f"Bearer {access_token}"
 
-                # Tokenı decode edip userId ve companyId değerlerini bulalım
+                # Tokenı decode edip userId, companyId ve geçerlilik sonunu (exp) bulalım
                 user_id, company_id = None, None
+                bitis = time.time() + EFATURA_TOKEN_VARSAYILAN_OMUR_SN
                 try:
                     b64_part = access_token.split(".")[1]
                     b64_part += "=" * ((4 - len(b64_part) % 4) % 4)
-                    payload_dict = json.loads(base64.b64decode(b64_part))
+                    payload_dict = json.loads(base64.urlsafe_b64decode(b64_part))
                     user_id = payload_dict.get("sub")
                     privs = payload_dict.get("privs", {})
                     company_id = list(privs.keys())[0] if privs else None
+                    if payload_dict.get("exp"): bitis = float(payload_dict["exp"])
                 except Exception as e:
                     pass
 
-                return {"token": access_token, "user_id": user_id, "company_id": company_id}, "BAŞARILI"
+                return {"token": access_token, "user_id": user_id, "company_id": company_id, "bitis": bitis}, "BAŞARILI"
             else:
                 debug_info = ""
                 try: debug_info = str(response.json())
@@ -127,8 +254,29 @@ def trendyol_efatura_login():
     except Exception as e:
         return None, f"Sistem Hatası: {str(e)}"
 
+@st.cache_resource
+def efatura_token_onbellegi():
+    """Süreç boyunca paylaşılan e-Fatura token'ı; tüm kullanıcı oturumları ve arka plan işleri aynı login'i kullanır."""
+    return {"kilit": threading.Lock(), "token": None}
+
+def efatura_tokeni_al(reddedilen=None):
+    """Önbellekteki token'ı döner. Süresinin dolmasına az kaldıysa ya da API bu token'ı reddettiyse (reddedilen)
+    yeniden login olur. Başka bir iş parçacığı token'ı zaten yenilediyse ikinci bir login yapılmaz."""
+    onbellek = efatura_token_onbellegi()
+    with onbellek["kilit"]:
+        token = onbellek["token"]
+        if token and token["token"] != reddedilen and token["bitis"] - time.time() > EFATURA_TOKEN_YENILEME_PAYI_SN:
+            return token, "BAŞARILI"
+        token, msg = trendyol_efatura_login()
+        onbellek["token"] = token or None
+        return token, msg
+
 def trendyol_efatura_kes(token, fatura_payload):
-    """Token kullanarak Trendyol eArşiv API'sine fatura oluşturma isteği gönderir."""
+    """Token kullanarak Trendyol eArşiv API'sine fatura oluşturma isteği gönderir.
+    Token 401 ile reddedilirse bir kez yenilenip istek tekrar gönderilir.
+    Dönüş: (cevap, mesaj, günlük durumu). Durum sadece kesin sonuçlarda KESILDI / HATA'dır: 4xx ret faturanın
+    oluşmadığını gösterir. Zaman aşımı, bağlantı hatası, 5xx ve okunamayan 2xx cevabında fatura oluşmuş olabilir;
+    bunlar BEKLIYOR (belirsiz) döner."""
     try:
         url = "https://apigateway.trendyolecozum.com/api/invoice/documents/earchive"
         headers = {
@@ -137,319 +285,702 @@ def trendyol_efatura_kes(token, fatura_payload):
             "Authorization": token
         }
 
-        response = requests.post(url, json=fatura_payload, headers=headers)
-        if response.status_code in [200, 201]:
-            # Dönen yanıtı (Fatura Uuid vb.) okuyalım
-            return response.json(), "BAŞARILI"
-        else:
-            return None, f"Fatura Kesme Hatası: {response.status_code} - {response.text}"
+        response = http_istek("efatura_kes", "POST", url, json=fatura_payload, headers=headers)
+        if response.status_code == 401:
+            yeni_token, msg = efatura_tokeni_al(reddedilen=token)
+            if not yeni_token:
+                return None, msg, "HATA"
+            headers["Authorization"] = yeni_token["token"]
+            response = http_istek("efatura_kes", "POST", url, json=fatura_payload, headers=headers)
     except Exception as e:
-        return None, f"Sistem Hatası: {str(e)}"
+        return None, f"Sistem Hatası: {str(e)}", "BEKLIYOR"
+    if response.status_code in [200, 201]:
+        # Dönen yanıtı (Fatura Uuid vb.) okuyalım
+        try: return response.json(), "BAŞARILI", "KESILDI"
+        except ValueError as e: return None, f"Fatura cevabı okunamadı: {str(e)}", "BEKLIYOR"
+    durum = "HATA" if 400 <= response.status_code < 500 else "BEKLIYOR"
+    return None, f"Fatura Kesme Hatası: {response.status_code} - {response.text}", durum
+
+def _efatura_metin(df, sutun, varsayilan=""):
+    if sutun not in df.columns: return pd.Series(varsayilan, index=df.index, dtype=object)
+    return df[sutun].fillna("").astype(str).str.strip()
+
+def _efatura_satiri(urun, adet, birim_fiyat_kurus, satir_vergisiz, satir_vergi):
+    return {
+      "unitCode": "C62", # Adet
+      "quantity": adet,
+      "totalAmount": satir_vergisiz,
+      "taxAmount": satir_vergi,
+      "taxableAmount": satir_vergisiz,
+      "taxPercent": 20,
+      "totalTax": {
+          "totalTaxAmount": satir_vergi,
+          "subTotalTaxes": [
+              {
+                  "taxableAmount": satir_vergisiz,
+                  "taxAmount": satir_vergi,
+                  "taxType": "KDV",
+                  "percent": 20
+              }
+          ]
+      },
+      "itemName": urun,
+      "unitPriceAmount": birim_fiyat_kurus,
+      "totalDiscountAmount": 0
+    }
 
-def create_efatura_payload(siparis, user_id=None, company_id=None):
-    """Google Sheets'ten gelen siparişi Trendyol eArşiv API formatına çevirir."""
+def _efatura_satirlari(kalemler, birim_fiyat_kurus, vergisiz_kurus, vergi_kurus):
+    """kalemler: [(ürün, adet)]. Birim fiyat ortalama olduğu için satır tutarları yuvarlanır; son satır kalanı alır ki
+    satırların vergisiz tutar ve KDV toplamları fatura toplamlarına kuruşu kuruşuna eşit olsun."""
+    kalemler = [(u, a) for u, a in kalemler if u and a > 0]
+    satirlar = []
+    for i, (u, a) in enumerate(kalemler):
+        if i == len(kalemler) - 1:
+            satir_vergisiz, satir_vergi = vergisiz_kurus, vergi_kurus
+        else:
+            satir_vergisiz = birim_fiyat_kurus * a
+            satir_vergi = int(round(satir_vergisiz * 0.20))
+        vergisiz_kurus -= satir_vergisiz
+        vergi_kurus -= satir_vergi
+        satirlar.append(_efatura_satiri(u, a, birim_fiyat_kurus, satir_vergisiz, satir_vergi))
+    return satirlar
+
+def efatura_siparislerini_dogrula(df):
+    """Faturası kesilemeyecek siparişleri ağa hiç çıkmadan, sütun bazında toplu olarak ayıklar (il/ilçe eksik veya
+    tutar sıfır/okunamıyor; sıfır tutarlı fatura kesilmez).
+    Dönüş: (geçerli siparişler, {sipariş no: hata mesajı})"""
+    tutar = df['Tutar_float'] if 'Tutar_float' in df.columns else _tutar_sutunu(_efatura_metin(df, 'Tutar'))
+    hata = pd.Series("", index=df.index, dtype=object)
+    hata = hata.mask(tutar <= 0, "Tutar sıfır veya geçersiz.")
+    hata = hata.mask((_efatura_metin(df, 'İl') == "") | (_efatura_metin(df, 'İlçe') == ""),
+                     "İl veya İlçe bilgisi eksik! Lütfen siparişi güncelleyip (veya excelden ekleyip) tekrar deneyin.")
+    gecersiz = hata != ""
+    return df[~gecersiz], dict(zip(df.loc[gecersiz, 'Siparis No'], hata[gecersiz]))
+
+def efatura_payloadlarini_olustur(df, user_id=None, company_id=None):
+    """Siparişleri (tablo_getir satırları) Trendyol eArşiv API formatına çevirir; tutar, KDV, telefon ve
+    kimlik no dönüşümleri tüm siparişler için sütun bazında bir kez yapılır. Satır sırasıyla payload listesi döner."""
+    if df.empty: return []
     # API kurallarına göre tutarlar kuruş cinsinden int olmalı (Örn: 100.50 TL -> 10050)
+    tutar_tl = df['Tutar_float'] if 'Tutar_float' in df.columns else _tutar_sutunu(_efatura_metin(df, 'Tutar'))
+    tutar_kurus = (tutar_tl * 100).round().astype('int64')
 
-    tutar_tl = safe_float(siparis.get('Tutar', 0))
-    tutar_kurus = int(round(tutar_tl * 100))
+    # %20 KDV varsayımıyla içyüzde hesaplama, kuruş üzerinden: vergi = tutar - vergisiz (toplamlar kuruşu kuruşuna tutar)
+    vergisiz_kurus = (tutar_kurus / 1.20).round().astype('int64')
+    vergi_kurus = tutar_kurus - vergisiz_kurus
 
-    # %20 KDV varsayımıyla içyüzde hesaplama:
-    # Vergisiz = Tutar / 1.20
-    vergisiz_tl = tutar_tl / 1.20
-    vergi_tl = tutar_tl - vergisiz_tl
+    # Sipariş formatında 2 ürün olabilir
+    adetler = {c: df[c] if c in df.columns and pd.api.types.is_integer_dtype(df[c]) else _adet_sutunu(_efatura_metin(df, c, "0"))
+               for c in ('Adet 1', 'Adet 2')}
+    toplam_adet = adetler['Adet 1'] + adetler['Adet 2']
+    toplam_adet = toplam_adet.where(toplam_adet != 0, 1)
+    # Ortalama birim fiyat (Karmaşık olmaması için toplam tutar ürün adedine bölünüyor)
+    birim_fiyat_kurus = (tutar_kurus / 1.20 / toplam_adet).round().astype('int64')
 
-    vergisiz_kurus = int(round(vergisiz_tl * 100))
-    vergi_kurus = int(round(vergi_tl * 100))
+    ad_soyad = _efatura_metin(df, 'Müşteri')
+    iki_parca = ad_soyad.str.contains(" ", regex=False)
+    parcalar = ad_soyad.str.rsplit(" ", n=1)
+    ad = ad_soyad.where(~iki_parca, parcalar.str[0])
+    soyad = parcalar.str[-1].where(iki_parca, "Müşteri")
 
-    ad_soyad = str(siparis.get('Müşteri', '')).strip()
-    ad_parcalar = ad_soyad.split(" ")
-    if len(ad_parcalar) > 1:
-        ad = " ".join(ad_parcalar[:-1])
-        soyad = ad_parcalar[-1]
-    else:
-        ad = ad_soyad
-        soyad = "Müşteri"
+    # TC Kimlik No 11 hane, VKN (Vergi Kimlik No) 10 hanedir. Sheets'in sayıya çevirdiği değerler önce düzeltilir;
+    # 10 veya 11 hane değilse varsayılan nihai tüketici (11111111111) kabul edilir.
+    tc_no = _efatura_metin(df, 'TC No').map(siparis_no_normalize).str.replace(r'\D', '', regex=True)
+    tc_no = tc_no.where(tc_no.str.len().isin([10, 11]), "11111111111")
 
-    tc_no = str(siparis.get('TC No', '')).strip()
-    # TC Kimlik No 11 hane, VKN (Vergi Kimlik No) 10 hanedir.
-    # Eğer 10 veya 11 hane değilse, varsayılan nihai tüketici (11111111111) kabul edilir.
-    if not tc_no or len(tc_no) not in [10, 11]:
-        tc_no = "11111111111" # Varsayılan Nihai Tüketici
+    # Telefon formatını düzelt (^\+?[0-9]{7,15}$); başındaki 0'ı düşmüş cep numaraları tamamlanır
+    tel = _efatura_metin(df, 'Telefon').str.replace(r'\.0$', '', regex=True).str.replace(r'[^0-9+]', '', regex=True)
+    tel = tel.mask(tel.str.fullmatch(r'5\d{9}'), "0" + tel)
+    tel = tel.where(tel.str.fullmatch(r'\+?[0-9]{7,15}'), "05555555555") # Geçersizse varsayılan değer
 
-    tel = str(siparis.get('Telefon', '')).strip()
-    email = str(siparis.get('Mail', '')).strip()
-    if not email:
-        email = "noreply@minivagon.com"
+    email = _efatura_metin(df, 'Mail').replace("", "noreply@minivagon.com")
 
     efatura_secrets = st.secrets.get("efatura", {})
     # Token'dan gelen company_id varsa onu kullan, yoksa secrets'dan al
     company_id_val = safe_int(company_id) if company_id else safe_int(efatura_secrets.get("company_id", 0))
-    satici_vkn = efatura_secrets.get("tax_id", "11111111111")
-
-    # Telefon formatını düzelt (^\+?[0-9]{7,15}$)
-    tel = re.sub(r'[^0-9+]', '', tel)
-    if not tel or len(tel) < 7:
-        tel = "05555555555" # Geçersizse varsayılan değer
-
-    tam_adres = str(siparis.get('Adres', 'Türkiye')).strip()
-    il = str(siparis.get('İl', '')).strip()
-    ilce = str(siparis.get('İlçe', '')).strip()
-
-    payload = {
-      "autoInvoiceId": True,
-      "companyId": safe_int(company_id_val),
-      "userId": safe_int(user_id),
-      "taxId": str(satici_vkn),
-      "source": "PORTAL",
-      "recipientInfo": {
-        "city": il,
-        "district": ilce,
-        "address": tam_adres,
-        "postalCode": "00000",
-        "phone": tel,
-        "email": email,
-        "taxId": tc_no,
-        "name": ad,
-        "surname": soyad
-      },
-      "invoiceInfo": {
-        "invoiceType": "EARSIVFATURA",
-        "invoiceTypeCode": "SATIS"
-      },
-      "invoiceLines": [],
-      "totalTax": {
-        "totalTaxAmount": vergi_kurus,
-        "subTotalTaxes": [
-          {
-            "taxableAmount": vergisiz_kurus,
-            "taxAmount": vergi_kurus,
-            "taxType": "KDV",
-            "percent": 20
-          }
-        ]
-      },
-      "invoiceTotal": {
-        "lineExtensionAmount": vergisiz_kurus,
-        "taxExclusiveAmount": vergisiz_kurus,
-        "taxInclusiveAmount": tutar_kurus,
-        "allowanceTotalAmount": 0,
-        "payableAmount": tutar_kurus
-      }
-    }
-
-    # Satırları ekle
-    # Sipariş formatında 2 ürün olabilir
-    u1 = siparis.get('Ürün 1', '')
-    a1 = safe_int(siparis.get('Adet 1', 0))
-    u2 = siparis.get('Ürün 2', '')
-    a2 = safe_int(siparis.get('Adet 2', 0))
-
-    toplam_adet = a1 + a2
-    if toplam_adet == 0: toplam_adet = 1
-
-    # Ortalama birim fiyat (Karmaşık olmaması için toplam tutar ürün adedine bölünüyor)
-    birim_fiyat_tl = vergisiz_tl / toplam_adet
-    birim_fiyat_kurus = int(round(birim_fiyat_tl * 100))
-
-    if u1 and a1 > 0:
-        satir_vergisiz = birim_fiyat_kurus * a1
-        satir_vergi = int(round((satir_vergisiz * 0.20)))
-
-        payload["invoiceLines"].append({
-          "unitCode": "C62", # Adet
-          "quantity": a1,
-          "totalAmount": satir_vergisiz,
-          "taxAmount": satir_vergi,
-          "taxableAmount": satir_vergisiz,
-          "taxPercent": 20,
-          "totalTax": {
-              "totalTaxAmount": satir_vergi,
-              "subTotalTaxes": [
-                  {
-                      "taxableAmount": satir_vergisiz,
-                      "taxAmount": satir_vergi,
-                      "taxType": "KDV",
-                      "percent": 20
-                  }
-              ]
+    satici_vkn = str(efatura_secrets.get("tax_id", "11111111111"))
+
+    payloadlar = []
+    for (tutar_k, vergisiz_k, vergi_k, birim_k, a1, a2, u1, u2, adi, soyadi, tc, telefon, mail, adres, il, ilce) in zip(
+            tutar_kurus, vergisiz_kurus, vergi_kurus, birim_fiyat_kurus, adetler['Adet 1'], adetler['Adet 2'],
+            _efatura_metin(df, 'Ürün 1'), _efatura_metin(df, 'Ürün 2'), ad, soyad, tc_no, tel, email,
+            _efatura_metin(df, 'Adres', 'Türkiye'), _efatura_metin(df, 'İl'), _efatura_metin(df, 'İlçe')):
+        tutar_k, vergisiz_k, vergi_k, birim_k, a1, a2 = int(tutar_k), int(vergisiz_k), int(vergi_k), int(birim_k), int(a1), int(a2)
+        payloadlar.append({
+          "autoInvoiceId": True,
+          "companyId": company_id_val,
+          "userId": safe_int(user_id),
+          "taxId": satici_vkn,
+          "source": "PORTAL",
+          "recipientInfo": {
+            "city": il,
+            "district": ilce,
+            "address": adres,
+            "postalCode": "00000",
+            "phone": telefon,
+            "email": mail,
+            "taxId": tc,
+            "name": adi,
+            "surname": soyadi
           },
-          "itemName": u1,
-          "unitPriceAmount": birim_fiyat_kurus,
-          "totalDiscountAmount": 0
-        })
-
-    if u2 and a2 > 0:
-        satir_vergisiz = birim_fiyat_kurus * a2
-        satir_vergi = int(round((satir_vergisiz * 0.20)))
-
-        payload["invoiceLines"].append({
-          "unitCode": "C62", # Adet
-          "quantity": a2,
-          "totalAmount": satir_vergisiz,
-          "taxAmount": satir_vergi,
-          "taxableAmount": satir_vergisiz,
-          "taxPercent": 20,
+          "invoiceInfo": {
+            "invoiceType": "EARSIVFATURA",
+            "invoiceTypeCode": "SATIS"
+          },
+          "invoiceLines": _efatura_satirlari(((u1, a1), (u2, a2)), birim_k, vergisiz_k, vergi_k),
           "totalTax": {
-              "totalTaxAmount": satir_vergi,
-              "subTotalTaxes": [
-                  {
-                      "taxableAmount": satir_vergisiz,
-                      "taxAmount": satir_vergi,
-                      "taxType": "KDV",
-                      "percent": 20
-                  }
-              ]
+            "totalTaxAmount": vergi_k,
+            "subTotalTaxes": [
+              {
+                "taxableAmount": vergisiz_k,
+                "taxAmount": vergi_k,
+                "taxType": "KDV",
+                "percent": 20
+              }
+            ]
           },
-          "itemName": u2,
-          "unitPriceAmount": birim_fiyat_kurus,
-          "totalDiscountAmount": 0
+          "invoiceTotal": {
+            "lineExtensionAmount": vergisiz_k,
+            "taxExclusiveAmount": vergisiz_k,
+            "taxInclusiveAmount": tutar_k,
+            "allowanceTotalAmount": 0,
+            "payableAmount": tutar_k
+          }
         })
+    return payloadlar
+
+# --- E-FATURA İŞ GÜNLÜĞÜ ---
+# Fatura isteği gönderilmeden önce sipariş BEKLIYOR olarak işaretlenir, cevap gelince KESILDI (UUID ile) ya da HATA olur.
+# Sheets'teki "Fatura Durumu" günlükten toplu olarak güncellenir (uzlaştırma); betik yarıda kesilse bile
+# kesilmiş faturalar günlükte kalır ve bir sonraki açılışta sayfaya işlenir.
+def _fatura_gunlugu_baglan():
+    os.makedirs(YEREL_VERI_KLASORU, exist_ok=True)
+    con = sqlite3.connect(FATURA_GUNLUGU_DB, timeout=30)
+    con.execute("CREATE TABLE IF NOT EXISTS fatura_gunlugu (siparis_no TEXT PRIMARY KEY, durum TEXT, uuid TEXT, mesaj TEXT, deneme INTEGER, guncelleme REAL, isaretlendi INTEGER DEFAULT 0)")
+    return con
+
+def fatura_gunlugu(siparis_nolar):
+    """Verilen siparişlerin günlük kayıtları: {normalize sipariş no: {"durum", "uuid", "mesaj", "deneme"}}."""
+    nolar = [siparis_no_normalize(n) for n in siparis_nolar]
+    if not nolar: return {}
+    with closing(_fatura_gunlugu_baglan()) as con:
+        r = con.execute(f"SELECT siparis_no, durum, uuid, mesaj, deneme FROM fatura_gunlugu WHERE siparis_no IN ({','.join('?' * len(nolar))})", nolar).fetchall()
+    return {no: {"durum": d, "uuid": u, "mesaj": m, "deneme": n} for no, d, u, m, n in r}
+
+def _fatura_gonderimini_baslat(siparis_no, belirsizse_de=False):
+    """Siparişi tek bir atomik sorguyla BEKLIYOR yapar. Sipariş zaten kesilmişse ya da önceki bir denemenin
+    sonucu belirsizse (BEKLIYOR; belirsizse_de=True değilse) dokunmaz ve False döner."""
+    with closing(_fatura_gunlugu_baglan()) as con, con:
+        c = con.execute("""INSERT INTO fatura_gunlugu (siparis_no, durum, deneme, guncelleme) VALUES (?, 'BEKLIYOR', 1, ?)
+                          ON CONFLICT(siparis_no) DO UPDATE SET durum='BEKLIYOR', mesaj=NULL, deneme=deneme+1, guncelleme=excluded.guncelleme
+                          WHERE durum='HATA' OR (durum='BEKLIYOR' AND ?)""",
+                        (siparis_no_normalize(siparis_no), time.time(), int(belirsizse_de)))
+        return c.rowcount == 1
+
+def _fatura_sonucunu_yaz(siparis_no, durum, uuid=None, mesaj=None):
+    with closing(_fatura_gunlugu_baglan()) as con, con:
+        con.execute("UPDATE fatura_gunlugu SET durum=?, uuid=?, mesaj=?, guncelleme=? WHERE siparis_no=?",
+                    (durum, uuid, mesaj, time.time(), siparis_no_normalize(siparis_no)))
+
+def _fatura_uuid(cevap):
+    if isinstance(cevap, dict):
+        for k in ("uuid", "documentUuid", "ettn", "id"):
+            if cevap.get(k): return str(cevap[k])
+    return json.dumps(cevap, ensure_ascii=False)[:200] if cevap else None
 
-    return payload
-
-# --- TRENDYOL API BAĞLANTISI ---
-def fetch_trendyol_orders(start_date_ms=None, end_date_ms=None, status=None):
+@st.cache_resource
+def _fatura_uzlastirma_zamani():
+    # Son uzlaştırmanın zamanı (tüm oturumlar için ortak)
+    return {"son": 0.0}
+
+def fatura_gunlugunu_uzlastir(zorla=False):
+    """Günlükte kesilmiş görünüp Sheets'te henüz KESİLDİ işaretlenmemiş tüm siparişleri tek toplu yazma ile işler.
+    zorla=False ise son uzlaştırmadan FATURA_UZLASTIRMA_SN geçmeden tekrar çalışmaz. Siparişler sayfasında
+    bulunamayan kayıtlar işaretlenir (isaretlendi=-1) ve bir daha aranmaz; kuyruktakiler sonraki uzlaştırmaya kalır.
+    Dönüş: (işlenen sipariş sayısı, "BAŞARILI" veya güncellenemeyenleri sayan "HATA: ...")"""
+    zaman = _fatura_uzlastirma_zamani()
+    if not zorla and time.time() - zaman["son"] < FATURA_UZLASTIRMA_SN: return 0, "BAŞARILI"
+    zaman["son"] = time.time()
     try:
-        if "trendyol" not in st.secrets:
-            return None, "st.secrets içinde [trendyol] ayarı bulunamadı."
-
-        trendyol_secrets = st.secrets["trendyol"]
-        supplier_id = trendyol_secrets.get("supplier_id")
-        api_key = trendyol_secrets.get("api_key")
-        api_secret = trendyol_secrets.get("api_secret")
-
-        if not supplier_id or not api_key or not api_secret:
-            return None, "Trendyol API bilgileri (supplier_id, api_key, api_secret) st.secrets içinde eksik!"
-
-        auth_str = f"{api_key}:{api_secret}"
-        b64_auth_str = base64.b64encode(auth_str.encode()).decode()
-
-        url = f"https://api.trendyol.com/sapigw/suppliers/{supplier_id}/orders"
-        params = []
-        if start_date_ms and end_date_ms:
-            params.append(f"startDate={int(start_date_ms)}&endDate={int(end_date_ms)}")
-        if status:
-            params.append(f"status={status}")
-        else:
-            params.append("status=Created,Picking,Invoiced,Shipped,Cancelled,Delivered,UnDelivered,Returned,Repack,UnPacked,UnSupplied")
-
-        if params:
-            url += "?" + "&".join(params)
+        with closing(_fatura_gunlugu_baglan()) as con:
+            nolar = [r[0] for r in con.execute("SELECT siparis_no FROM fatura_gunlugu WHERE durum='KESILDI' AND isaretlendi=0")]
+        if not nolar: return 0, "BAŞARILI"
+        sonuclar = siparis_durumlarini_toplu_guncelle("Siparisler", "Siparis No", "Fatura Durumu", {no: "KESİLDİ" for no in nolar})
+        islenen = [no for no, sonuc in sonuclar.items() if sonuc == "BAŞARILI"]
+        with closing(_fatura_gunlugu_baglan()) as con, con:
+            con.executemany("UPDATE fatura_gunlugu SET isaretlendi=? WHERE siparis_no=?",
+                            [(1 if sonuc == "BAŞARILI" else -1, no) for no, sonuc in sonuclar.items() if sonuc != "KUYRUKTA"])
+        return len(islenen), _guncellenemeyenler_mesaji(sonuclar)
+    except Exception as e: return 0, f"HATA: {e}"
 
-        headers = {
-            "Authorization": f"Basic {b64_auth_str}",
-            "User-Agent": f"{supplier_id} - MiniVagonApp"
-        }
-
-        # Trendyol API can return multiple pages. For simplicity and avoiding timeouts we fetch up to size=200
-        # If the user has thousands of orders in the selected period, this should be paginated,
-        # but 200 per page is the default max, so let's set size=200 to fetch as many as possible per call.
-        if "?" in url:
-            url += "&size=200"
-        else:
-            url += "?size=200"
-
-        response = requests.get(url, headers=headers)
-        if response.status_code == 200:
-            return response.json().get("content", []), "BAŞARILI"
-        else:
-            return None, f"Trendyol Hatası: {response.status_code} - {response.text}"
+@st.cache_resource
+def efatura_zamanlayici():
+    return SheetsZamanlayici(EFATURA_DAKIKA_KOTASI)
+
+def _efatura_siparis_kes(sip_no, payload, token, belirsizse_de=False):
+    """Tek siparişin faturasını günlüğe işleyerek keser; iş havuzunda çalışır. (başarılı mı, mesaj) döner."""
+    if not _fatura_gonderimini_baslat(sip_no, belirsizse_de):
+        kayit = fatura_gunlugu([sip_no]).get(siparis_no_normalize(sip_no), {})
+        if kayit.get("durum") == "KESILDI":
+            return True, f"Fatura daha önce kesilmiş (UUID: {kayit.get('uuid')}), tekrar gönderilmedi."
+        return False, "Önceki denemenin sonucu belirsiz; Trendyol panelinden kontrol edip gerekirse 'yeniden gönder' ile tekrar deneyin."
+    efatura_zamanlayici().jeton_al()
+    try:
+        cevap, mesaj, durum = trendyol_efatura_kes(token.get("token"), payload)
     except Exception as e:
-        return None, f"Sistem Hatası: {str(e)}"
-
-def format_trendyol_orders(orders, existing_db_df):
-    """Trendyol siparişlerini sisteme uygun formata (PazaryeriSiparisleri sayfasına) dönüştürür."""
-    formatted_list = []
-
-    # Mevcut siparişleri kontrol etmek için kaynak sipariş ID'lerini alalım
-    # Pazaryeri Siparis No kolonunda trendyol order numarasını tutacağız.
-    existing_order_notes = []
-    if existing_db_df is not None and not existing_db_df.empty and 'Pazaryeri Siparis No' in existing_db_df.columns:
-        existing_order_notes = existing_db_df['Pazaryeri Siparis No'].astype(str).tolist()
-
-    for order in orders:
-        ty_order_no = str(order.get('orderNumber'))
-
-        if ty_order_no in existing_order_notes:
+        cevap, mesaj, durum = None, f"Sistem Hatası: {str(e)}", "BEKLIYOR"
+    if durum == "KESILDI": _fatura_sonucunu_yaz(sip_no, "KESILDI", uuid=_fatura_uuid(cevap))
+    else: _fatura_sonucunu_yaz(sip_no, durum, mesaj=mesaj)
+    if durum == "BEKLIYOR":
+        # Fatura oluşmuş olabilir: otomatik tekrar gönderilmez, sadece 'yeniden gönder' işaretliyken gönderilir
+        mesaj = f"{mesaj} (sonuç belirsiz; Trendyol panelinden kontrol edip gerekirse 'yeniden gönder' ile tekrar deneyin)"
+    return durum == "KESILDI", mesaj
+
+def efatura_toplu_kes(siparisler, sonuc_bildir=None, belirsizse_de=False):
+    """Seçili siparişlerin (tablo_getir satırları) faturalarını keser. Geçersiz siparişler ağa çıkmadan toplu olarak
+    reddedilir; login ancak gönderilecek sipariş kaldıysa yapılır. Faturalar sınırlı bir iş havuzunda, ağ geçidinin
+    dakikalık kotasını aşmadan gönderilir. Günlükte kesilmiş görünen siparişler tekrar gönderilmez; sonucu belirsiz
+    kalanlar ancak belirsizse_de=True ile gönderilir.
+    sonuc_bildir(sipariş no, başarılı mı, mesaj, biten, toplam) her sonuç geldiğinde çağıran iş parçacığında
+    çağrılır (Streamlit bileşenleri güvenle güncellenebilir). Dönüş: (başarılı sipariş numaraları, "BAŞARILI" veya
+    login hatası); Sheets'teki durum fatura_gunlugunu_uzlastir ile tek toplu yazmada güncellenir."""
+    gecerli, hatalar = efatura_siparislerini_dogrula(siparisler)
+    toplam, biten = len(siparisler), 0
+    for sip_no, mesaj in hatalar.items():
+        biten += 1
+        if sonuc_bildir: sonuc_bildir(sip_no, False, mesaj, biten, toplam)
+    if gecerli.empty: return [], "BAŞARILI"
+
+    # token bir dict: {"token": "...", "user_id": "...", "company_id": "...", "bitis": ...}
+    token, msg = efatura_tokeni_al()
+    if not token: return [], msg
+    payloadlar = efatura_payloadlarini_olustur(gecerli, user_id=token.get("user_id"), company_id=token.get("company_id"))
+
+    basarili_nolar = []
+    with ThreadPoolExecutor(max_workers=EFATURA_ESZAMANLI_ISTEK) as havuz:
+        isler = {havuz.submit(_efatura_siparis_kes, sip_no, payload, token, belirsizse_de): sip_no
+                 for sip_no, payload in zip(gecerli['Siparis No'], payloadlar)}
+        for f in as_completed(isler):
+            sip_no = isler[f]
+            try: basarili, mesaj = f.result()
+            except Exception as e: basarili, mesaj = False, f"Sistem Hatası: {str(e)}"
+            if basarili: basarili_nolar.append(sip_no)
+            biten += 1
+            if sonuc_bildir: sonuc_bildir(sip_no, basarili, mesaj, biten, toplam)
+    return basarili_nolar, "BAŞARILI"
+
+# --- PAZARYERİ SENKRONU ---
+# Trendyol API'si ve adaptörler pazaryeri.py'dedir; secrets bölümü ve paylaşılan HTTP istemcisi onlara buradan verilir.
+def pazaryeri_adaptorleri():
+    """Ayarlı adaptörler. secrets'ta [pazaryeri] kayitli_cevaplar klasörü verilirse istekler oradan okunur
+    (kayit_modu = "kaydet" ise gerçek cevaplar o klasöre kaydedilir)."""
+    ayar = st.secrets.get("pazaryeri", {})
+    istek = http_istek
+    if ayar.get("kayitli_cevaplar"):
+        istek = kayitli_cevap_istegi(ayar["kayitli_cevaplar"], http_istek if ayar.get("kayit_modu") == "kaydet" else None)
+    adaptorler = [sinif(istek, st.secrets.get(sinif.ayar_bolumu)) for sinif in PAZARYERI_ADAPTORLERI]
+    return [a for a in adaptorler if a.ayarli_mi()]
+
+def pazaryeri_siparislerini_ayir(kayitlar):
+    """Normalize edilmiş (ve tekilleştirilmiş) siparişleri kayıtlı PazaryeriSiparisleri satırlarıyla sipariş no indeksi
+    üzerinden karşılaştırır.
+    Dönüş: (yeni satırlar, yeni siparişlerin tüm kalemleri [(sipariş no, [(ürün, adet, isim)])],
+    değişen hücreler [(kanonik sipariş no, sütun, değer)], değişmeyen sipariş sayısı,
+    henüz kuyrukta olduğu için şimdilik karşılaştırılamayan sipariş sayısı)"""
+    sayfa_adi = "PazaryeriSiparisleri"
+    # Kayıtlar ve indeks aynı veri sürümünden okunur ki satır numaraları birbirini tutsun
+    surum = veri_surumu(sayfa_adi)
+    mevcut = _aktarilmis_kayitlar(sayfa_adi, surum)
+    indeks = _siparis_indeksi(sayfa_adi, "Pazaryeri Siparis No", surum)
+    kuyrukta = bekleyen_siparis_nolari(sayfa_adi, "Pazaryeri Siparis No")
+    sutunlar = sutun_haritasi(sayfa_adi) if mevcut else {}
+
+    yeni_satirlar, yeni_kalemler, degisen, degismeyen, bekleyen = [], [], [], 0, 0
+    basliklar = SAYFA_BASLIKLARI[sayfa_adi]
+    for k in kayitlar:
+        no = siparis_no_normalize(k["no"])
+        satir_nolari = indeks.get(no)
+        # Kuyruktaki satırın Sheets'teki yeri henüz belli değil
+        if (not satir_nolari and no in kuyrukta) or (satir_nolari and satir_nolari[0] - 2 >= len(mevcut)):
+            bekleyen += 1
             continue
+        if not satir_nolari:
+            yeni_satirlar.append(k["satir"])
+            yeni_kalemler.append((str(k["no"]), k["kalemler"]))
+            continue
+        row = satir_nolari[0]
+        kayit, gelen_degerler = mevcut[row - 2], dict(zip(basliklar, k["satir"]))
+        farklar = []
+        for c in PAZARYERI_GUNCELLENEN_SUTUNLAR:
+            deger = str(gelen_degerler[c]).strip()
+            # Pazaryerinden boş gelen alan kayıttaki değeri silmez; kargo no sayıya çevrilmiş olabileceği için normalize edilir
+            if c in sutunlar and deger and siparis_no_normalize(kayit.get(c)) != siparis_no_normalize(deger):
+                farklar.append((no, sutunlar[c], deger))
+        if farklar: degisen.extend(farklar)
+        else: degismeyen += 1
+    return yeni_satirlar, yeni_kalemler, degisen, degismeyen, bekleyen
+
+def trendyol_siparislerini_ayir(orders):
+    """Ham Trendyol siparişleri için pazaryeri_siparislerini_ayir."""
+    adaptor = TrendyolAdaptoru(http_istek)
+    return pazaryeri_siparislerini_ayir(adaptor.tekillestir(adaptor.normalize(orders)))
+
+def pazaryeri_degisikliklerini_kaydet(yeni_satirlar, yeni_kalemler, degisen_hucreler):
+    """Yeni siparişleri ve kalemlerini toplu ekleme olarak kuyruğa alır, değişen hücreleri tek batch update ile yazar.
+    Değişen hücrelerin satırları yazmadan hemen önce anahtar sütunu okunarak bulunur; Sheets'te silinmiş siparişler atlanır."""
+    pazaryeri_siparis_toplu_ekle(yeni_satirlar)
+    kuyruga_ekle("SiparisSatirlari", [[no, "Pazaryeri", i + 1, u, a, isim] for no, kalemler in yeni_kalemler
+                                      for i, (u, a, isim) in enumerate(kalemler)])
+    if not degisen_hucreler: return
+    sayfa_adi = "PazaryeriSiparisleri"
+    satirlar, uyumlu = canli_satir_haritasi(sayfa_adi, sutun_haritasi(sayfa_adi)["Pazaryeri Siparis No"])
+    hucreler = [(satirlar[no], sutun, deger) for no, sutun, deger in degisen_hucreler if no in satirlar]
+    if hucreler:
+        # RAW: kargo takip numaraları sayıya (ve bilimsel gösterime) çevrilmesin
+        depo().hucreleri_guncelle(sayfa_adi, hucreler, value_input_option='RAW')
+        snapshot_hucrelerini_isle(sayfa_adi, hucreler, uyumlu)
 
-        ship_addr = order.get('shipmentAddress', {})
-        musteri_adi = f"{ship_addr.get('firstName', '')} {ship_addr.get('lastName', '')}".strip()
-        tel = ship_addr.get('phone', '')
-        adres = ship_addr.get('fullAddress', '')
-        tc = order.get('invoiceAddress', {}).get('tcIdentityNumber', '')
-        mail = order.get('customerEmail', '')
-
-        tarih_ms = order.get('orderDate', 0)
-        tarih = simdi().strftime("%d.%m.%Y %H:%M")
-        if tarih_ms > 0:
+# --- GOOGLE SHEETS BAĞLANTISI ---
+class SheetsZamanlayici:
+    """Tüm Sheets isteklerinin (ve ayrı bir örnekle e-fatura isteklerinin) geçtiği token bucket. Kova dakikalık kota kadar jeton tutar ve saniyede
+    kota/60 hızla dolar. Etkileşimli (kullanıcı) istekleri bekliyorken arka plan istekleri jeton alamaz."""
+
+    def __init__(self, dakika_kotasi):
+        self.kapasite = float(dakika_kotasi)
+        self.jeton = float(dakika_kotasi)
+        self.dolum_hizi = dakika_kotasi / 60.0
+        self.son_dolum = time.monotonic()
+        self.kosul = threading.Condition()
+        self.bekleyen_oncelikli = 0
+        self.yerel = threading.local()
+        self.metrik = {"cagri": 0, "kisitlanan": 0, "yeniden_deneme": 0}
+
+    def arka_plan_olarak_isaretle(self):
+        """Çağıran iş parçacığının isteklerini düşük öncelikli (toplu arka plan yazması) yapar."""
+        self.yerel.arka_plan = True
+
+    def _doldur(self):
+        t = time.monotonic()
+        self.jeton = min(self.kapasite, self.jeton + (t - self.son_dolum) * self.dolum_hizi)
+        self.son_dolum = t
+
+    def jeton_al(self):
+        arka_plan = getattr(self.yerel, "arka_plan", False)
+        with self.kosul:
+            kisitlandi = False
+            if not arka_plan: self.bekleyen_oncelikli += 1
             try:
-                tarih = datetime.fromtimestamp(tarih_ms/1000).strftime("%d.%m.%Y %H:%M")
-            except: pass
-
-        lines = order.get('lines', [])
-
-        u1, a1, i1 = "", 0, ""
-        u2, a2, i2 = "", 0, ""
-        toplam_tutar = order.get('totalPrice', 0)
-
-        if len(lines) > 0:
-            u1 = lines[0].get('productName', '')
-            a1 = lines[0].get('quantity', 0)
-        if len(lines) > 1:
-            u2 = lines[1].get('productName', '')
-            a2 = lines[1].get('quantity', 0)
-        if len(lines) > 2:
-            i1 = "Trendyol panelinden kontrol ediniz (3+ ürün)"
-
-        # Trendyol API'deki statüye göre bizim sistem statüsünü eşleştirme
-        ty_status = order.get('status', '')
-        durum_map = {
-            "Created": "YENİ SİPARİŞ",
-            "Picking": "YENİ SİPARİŞ",
-            "Shipped": "KARGOLANDI",
-            "Delivered": "TESLİM EDİLDİ",
-            "Cancelled": "İPTAL",
-            "Returned": "İADE",
-            "UnDelivered": "TESLİM EDİLEMEDİ"
-        }
-        durum = durum_map.get(ty_status, "YENİ SİPARİŞ")
-
-        odeme = "TRENDYOL"
-        kaynak = "Trendyol"
-        fatura = "KESİLMEDİ"
-        tedarik = "BEKLİYOR"
-        kargo_takip = str(order.get('cargoTrackingNumber', '')).strip()
-        kargo_firmasi = str(order.get('cargoProviderName', '')).strip()
-
-        # ["Pazaryeri Siparis No","Tarih","Durum","Müşteri","Telefon","TC No","Mail","Ürün 1","Adet 1","İsim 1","Ürün 2","Adet 2","İsim 2","Tutar","Ödeme","Kaynak","Adres","Kargo Takip No","Fatura Durumu","Tedarik Durumu", "İl", "İlçe", "Kargo Firması", "Yazdırıldı Durumu"]
-        il = ship_addr.get('city','')
-        ilce = ship_addr.get('district','')
-        yazdirildi = "YAZDIRILMADI"
-        satir = [
-            ty_order_no, tarih, durum, musteri_adi, tel, tc, mail,
-            u1, a1, i1, u2, a2, i2, toplam_tutar, odeme, kaynak,
-            adres, kargo_takip, fatura, tedarik, il, ilce, kargo_firmasi, yazdirildi
-        ]
-
-        formatted_list.append(satir)
-
-    return formatted_list
+                while True:
+                    self._doldur()
+                    if self.jeton >= 1 and (not arka_plan or self.bekleyen_oncelikli == 0):
+                        self.jeton -= 1
+                        break
+                    kisitlandi = True
+                    self.kosul.wait(timeout=max(0.05, (1 - self.jeton) / self.dolum_hizi))
+            finally:
+                if not arka_plan:
+                    self.bekleyen_oncelikli -= 1
+                    self.kosul.notify_all()
+            self.metrik["cagri"] += 1
+            if kisitlandi: self.metrik["kisitlanan"] += 1
+
+    def yeniden_deneme_say(self):
+        with self.kosul:
+            self.metrik["yeniden_deneme"] += 1
 
-# --- GOOGLE SHEETS BAĞLANTISI ---
 @st.cache_resource
+def sheets_zamanlayici():
+    return SheetsZamanlayici(SHEETS_DAKIKA_KOTASI)
+
+# gspread 6 istekleri Client.http_client.request üzerinden gönderir (authorize http_client= alır); gspread 5'te
+# istekler Client.request'ten geçer (authorize client_factory= alır). Kota/tekrar deneme katmanı hangisi yüklüyse ona oturur.
+try:
+    from gspread.http_client import HTTPClient as _SheetsIstekTemeli
+except ImportError:
+    _SheetsIstekTemeli = gspread.Client
+
+def _sheets_istegi_tekrarlanabilir(method, endpoint):
+    """Tekrar gönderilince sonucu değişmeyen Sheets istekleri. Satır ekleyen (values/...:append) ve yapı değiştiren
+    (spreadsheet :batchUpdate) POST'lar Sheets'te uygulanmış olabilir; sabit aralıkları okuyan/yazan values:batch* tekrarlanabilir."""
+    return str(method).upper() != "POST" or "/values:batch" in str(endpoint)
+
+class KotaliClient(_SheetsIstekTemeli):
+    """Her isteği zamanlayıcıdan jeton alarak gönderir; 429 ve 5xx cevaplarında jitter'lı üstel bekleme ile tekrar dener.
+    Tekrarlanamayan istekler (bkz. _sheets_istegi_tekrarlanabilir) sadece 429'da (istek uygulanmadan reddedildi) tekrar
+    denenir; diğer hatalar çağırana (ör. yazma kuyruğu, satırları saklayıp sonra tekrar dener) iletilir."""
+
+    def request(self, *args, **kwargs):
+        zamanlayici = sheets_zamanlayici()
+        tekrarlanabilir = _sheets_istegi_tekrarlanabilir(args[0] if args else kwargs.get("method"),
+                                                          args[1] if len(args) > 1 else kwargs.get("endpoint"))
+        deneme = 0
+        while True:
+            zamanlayici.jeton_al()
+            try:
+                return super().request(*args, **kwargs)
+            except (gspread.exceptions.APIError, requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                durum = e.response.status_code if isinstance(e, gspread.exceptions.APIError) else None
+                if isinstance(e, gspread.exceptions.APIError) and durum not in (429, 500, 502, 503, 504):
+                    raise
+                if durum != 429 and not tekrarlanabilir:
+                    raise
+                if deneme >= SHEETS_MAKS_DENEME:
+                    raise
+                deneme += 1
+                zamanlayici.yeniden_deneme_say()
+                time.sleep(random.uniform(0, min(SHEETS_MAKS_BEKLEME_SN, 2 ** deneme)))
+
 @st.cache_resource(ttl=3600)
 def get_client():
     scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
     creds_dict = dict(st.secrets["gcp_service_account"])
     creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-    return gspread.authorize(creds)
+    if _SheetsIstekTemeli is gspread.Client:
+        return gspread.authorize(creds, client_factory=KotaliClient)
+    return gspread.authorize(creds, http_client=KotaliClient)
 
 @st.cache_resource(ttl=3600)
 def get_sheet():
     client = get_client()
     return client.open(SHEET_ADI)
 
+# --- DEPOLAMA KATMANI ---
+# Uygulama çalışma sayfası verisine sadece VeriDeposu arayüzü üzerinden erişir. Varsayılan depo Google Sheets'tir;
+# secrets'ta [depolama] tur = "sqlite" verilirse aynı sayfa şemalarını taşıyan yerel bir SQLite dosyası kullanılır
+# (Google'a bağlanmadan çalışma ve performans testleri için).
+class VeriDeposu(ABC):
+    """Depo arayüzü. Satır ve sütun numaraları Sheets'teki gibi 1 tabanlıdır, 1. satır başlıktır."""
+
+    @abstractmethod
+    def sayfalar(self, yenile=False):
+        """Sayfa adı -> sütun sayısı."""
+
+    def sayfa_listesi_yasi(self):
+        """sayfalar() sonucunun kaç saniye önce yüklendiği. Listeyi önbelleğe almayan depolar için 0."""
+        return 0
+
+    @abstractmethod
+    def araliklari_oku(self, araliklar):
+        """A1 notasyonundaki aralıkları ('Sayfa', 'Sayfa'!1:1, 'Sayfa'!A5:N gibi) tek seferde okur.
+        Her aralık için sondaki boş hücre ve satırları kırpılmış bir satır listesi döner."""
+
+    @abstractmethod
+    def sayfa_olustur(self, sayfa_adi, basliklar, rows=100):
+        """Başlık satırıyla yeni bir sayfa açar."""
+
+    @abstractmethod
+    def satir_ekle(self, sayfa_adi, satirlar, value_input_option='RAW'):
+        """Satırları sayfanın sonuna tek seferde ekler."""
+
+    @abstractmethod
+    def hucreleri_guncelle(self, sayfa_adi, hucreler, value_input_option='USER_ENTERED'):
+        """hucreler: [(satır, sütun, değer)]. Hepsi tek seferde yazılır, gerekirse sayfa genişletilir."""
+
+    @abstractmethod
+    def sutun_degerleri(self, sayfa_adi, sutun):
+        """Bir sütunun başlık dahil tüm değerleri (col_values ile aynı biçimde)."""
+
+    def yapi_degisti(self):
+        """Sayfa eklendi/silindi veya sütun sayısı değişti; önbelleğe alınmış yapı bilgisi bırakılır."""
+        pass
+
+    def sutun_sayisi(self, sayfa_adi):
+        """Sayfanın sütun sayısı; sayfa listede yoksa liste bir kez yenilenir, yine yoksa WorksheetNotFound."""
+        mevcut = self.sayfalar()
+        if sayfa_adi not in mevcut:
+            mevcut = self.sayfalar(yenile=True)
+        if sayfa_adi not in mevcut:
+            raise gspread.exceptions.WorksheetNotFound(sayfa_adi)
+        return mevcut[sayfa_adi]
+
+    def tum_degerler(self, sayfa_adi):
+        """Sayfanın tamamı (get_all_values formatında)."""
+        self.sutun_sayisi(sayfa_adi)
+        return self.araliklari_oku([_a1_sayfa(sayfa_adi)])[0]
+
+class SheetsDeposu(VeriDeposu):
+    """MiniVagonDB spreadsheet'i. sh.worksheet() her çağrıda metadata'yı yeniden çektiği için Worksheet
+    nesneleri tek bir metadata isteğiyle yüklenip süreç boyunca paylaşılır; yapı değişince yeniden yüklenir."""
+
+    def __init__(self):
+        self.kayit = {}
+        self.yuklenme = 0
+
+    def _calisma_sayfasi(self, sayfa_adi):
+        self.sutun_sayisi(sayfa_adi)
+        return self.kayit[sayfa_adi]
+
+    def sayfalar(self, yenile=False):
+        if yenile or not self.kayit:
+            self.kayit = {w.title: w for w in get_sheet().worksheets()}
+            self.yuklenme = time.time()
+        return {ad: w.col_count for ad, w in self.kayit.items()}
+
+    def sayfa_listesi_yasi(self):
+        return time.time() - self.yuklenme
+
+    def araliklari_oku(self, araliklar):
+        cevap = get_sheet().values_batch_get(araliklar)
+        return [r.get("values", []) for r in cevap.get("valueRanges", [])]
+
+    def sayfa_olustur(self, sayfa_adi, basliklar, rows=100):
+        w = get_sheet().add_worksheet(title=sayfa_adi, rows=rows, cols=len(basliklar))
+        w.append_row(basliklar)
+        self.kayit[sayfa_adi] = w
+
+    def satir_ekle(self, sayfa_adi, satirlar, value_input_option='RAW'):
+        self._calisma_sayfasi(sayfa_adi).append_rows(satirlar, value_input_option=value_input_option)
+
+    def hucreleri_guncelle(self, sayfa_adi, hucreler, value_input_option='USER_ENTERED'):
+        if not hucreler: return
+        w = self._calisma_sayfasi(sayfa_adi)
+        son_sutun = max(c for _, c, _ in hucreler)
+        # Izgaranın dışına yazılamaz; yeni sütun gerekiyorsa önce sayfa genişletilir
+        if w.col_count < son_sutun:
+            w.add_cols(son_sutun - w.col_count)
+        w.batch_update([{"range": gspread.utils.rowcol_to_a1(r, c), "values": [[d]]} for r, c, d in hucreler],
+                       value_input_option=value_input_option)
+
+    def sutun_degerleri(self, sayfa_adi, sutun):
+        return self._calisma_sayfasi(sayfa_adi).col_values(sutun)
+
+    def yapi_degisti(self):
+        self.kayit = {}
+
+def _hucre_metni(deger):
+    # Sheets'in hücreyi okurken döndüğü metin biçimi
+    if deger is None: return ""
+    if isinstance(deger, bool): return "TRUE" if deger else "FALSE"
+    if isinstance(deger, float) and deger.is_integer(): return str(int(deger))
+    return str(deger)
+
+def _a1_ayristir(aralik):
+    """A1 aralığını (sayfa, ilk satır, ilk sütun, son satır, son sütun) olarak döner; açık uçlar None."""
+    m = re.fullmatch(r"'((?:[^']|'')*)'(?:!(.*))?", aralik) or re.fullmatch(r"([^!]*)(?:!(.*))?", aralik)
+    sayfa, hucreler = m.group(1).replace("''", "'"), m.group(2)
+    if not hucreler: return sayfa, 1, 1, None, None
+    m = re.fullmatch(r"([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?", hucreler.upper())
+    if not m: raise ValueError(f"Geçersiz aralık: {aralik}")
+    sutun1, satir1, sutun2, satir2 = m.groups()
+    if sutun2 is None and satir2 is None: sutun2, satir2 = sutun1, satir1
+    sutun_no = lambda harfler: sum((ord(h) - 64) * 26 ** i for i, h in enumerate(reversed(harfler)))
+    return (sayfa, int(satir1) if satir1 else 1, sutun_no(sutun1) if sutun1 else 1,
+            int(satir2) if satir2 else None, sutun_no(sutun2) if sutun2 else None)
+
+class SqliteDeposu(VeriDeposu):
+    """Sheets veritabanının yerel SQLite karşılığı. Her sayfanın satırları Sheets'teki satır numarasıyla,
+    hücre metinleri JSON listesi olarak tutulur; ilk açılışta SAYFA_BASLIKLARI'ndaki sayfalar oluşturulur."""
+
+    def __init__(self, dosya):
+        self.dosya = dosya
+        self.kilit = threading.Lock()
+        with closing(self._baglan()) as con, con:
+            for sayfa_adi, basliklar in SAYFA_BASLIKLARI.items():
+                if not con.execute("SELECT 1 FROM sayfalar WHERE ad=?", (sayfa_adi,)).fetchone():
+                    self._olustur(con, sayfa_adi, basliklar)
+
+    def _baglan(self):
+        klasor = os.path.dirname(self.dosya)
+        if klasor: os.makedirs(klasor, exist_ok=True)
+        con = sqlite3.connect(self.dosya, timeout=30)
+        con.execute("CREATE TABLE IF NOT EXISTS sayfalar (ad TEXT PRIMARY KEY, sutun_sayisi INTEGER)")
+        con.execute("CREATE TABLE IF NOT EXISTS satirlar (sayfa TEXT, satir_no INTEGER, veri TEXT, PRIMARY KEY (sayfa, satir_no))")
+        return con
+
+    def _olustur(self, con, sayfa_adi, basliklar):
+        con.execute("INSERT INTO sayfalar VALUES (?,?)", (sayfa_adi, len(basliklar)))
+        con.execute("INSERT INTO satirlar VALUES (?,?,?)", (sayfa_adi, 1, json.dumps([_hucre_metni(v) for v in basliklar], ensure_ascii=False)))
+
+    def _genislet(self, con, sayfa_adi, sutun):
+        con.execute("UPDATE sayfalar SET sutun_sayisi=MAX(sutun_sayisi, ?) WHERE ad=?", (sutun, sayfa_adi))
+
+    def sayfalar(self, yenile=False):
+        with closing(self._baglan()) as con:
+            return dict(con.execute("SELECT ad, sutun_sayisi FROM sayfalar").fetchall())
+
+    def araliklari_oku(self, araliklar):
+        mevcut = self.sayfalar()
+        sonuc = []
+        with closing(self._baglan()) as con:
+            for aralik in araliklar:
+                sayfa_adi, satir1, sutun1, satir2, sutun2 = _a1_ayristir(aralik)
+                if sayfa_adi not in mevcut: raise gspread.exceptions.WorksheetNotFound(sayfa_adi)
+                degerler, siradaki = [], satir1
+                for no, veri in con.execute("SELECT satir_no, veri FROM satirlar WHERE sayfa=? AND satir_no>=? ORDER BY satir_no", (sayfa_adi, satir1)):
+                    if satir2 is not None and no > satir2: break
+                    # Aradaki boş satırlar Sheets'teki gibi boş liste olarak döner
+                    degerler.extend([] for _ in range(no - siradaki))
+                    degerler.append(_satir_kirp(json.loads(veri)[sutun1 - 1:sutun2]))
+                    siradaki = no + 1
+                while degerler and not degerler[-1]: degerler.pop()
+                sonuc.append(degerler)
+        return sonuc
+
+    def sayfa_olustur(self, sayfa_adi, basliklar, rows=100):
+        with closing(self._baglan()) as con, con:
+            self._olustur(con, sayfa_adi, basliklar)
+
+    def satir_ekle(self, sayfa_adi, satirlar, value_input_option='RAW'):
+        if not satirlar: return
+        self.sutun_sayisi(sayfa_adi)
+        with self.kilit, closing(self._baglan()) as con, con:
+            son = con.execute("SELECT COALESCE(MAX(satir_no), 0) FROM satirlar WHERE sayfa=?", (sayfa_adi,)).fetchone()[0]
+            con.executemany("INSERT INTO satirlar VALUES (?,?,?)",
+                            [(sayfa_adi, son + 1 + i, json.dumps([_hucre_metni(v) for v in r], ensure_ascii=False)) for i, r in enumerate(satirlar)])
+            self._genislet(con, sayfa_adi, max(len(r) for r in satirlar))
+
+    def hucreleri_guncelle(self, sayfa_adi, hucreler, value_input_option='USER_ENTERED'):
+        if not hucreler: return
+        self.sutun_sayisi(sayfa_adi)
+        with self.kilit, closing(self._baglan()) as con, con:
+            satirlar = {}
+            for row, col, deger in hucreler:
+                if row not in satirlar:
+                    r = con.execute("SELECT veri FROM satirlar WHERE sayfa=? AND satir_no=?", (sayfa_adi, row)).fetchone()
+                    satirlar[row] = json.loads(r[0]) if r else []
+                satir = satirlar[row]
+                satir.extend([""] * (col - len(satir)))
+                satir[col - 1] = _hucre_metni(deger)
+            con.executemany("INSERT OR REPLACE INTO satirlar VALUES (?,?,?)",
+                            [(sayfa_adi, row, json.dumps(s, ensure_ascii=False)) for row, s in satirlar.items()])
+            self._genislet(con, sayfa_adi, max(c for _, c, _ in hucreler))
+
+    def sutun_degerleri(self, sayfa_adi, sutun):
+        self.sutun_sayisi(sayfa_adi)
+        degerler = []
+        with closing(self._baglan()) as con:
+            for no, veri in con.execute("SELECT satir_no, veri FROM satirlar WHERE sayfa=? ORDER BY satir_no", (sayfa_adi,)):
+                satir = json.loads(veri)
+                degerler.extend([""] * (no - 1 - len(degerler)))
+                degerler.append(satir[sutun - 1] if sutun <= len(satir) else "")
+        while degerler and degerler[-1] == "": degerler.pop()
+        return degerler
+
+@st.cache_resource
+def depo():
+    """secrets'taki [depolama] ayarına göre süreç boyunca paylaşılan depo. Ayar yoksa Google Sheets."""
+    ayar = st.secrets.get("depolama", {})
+    if ayar.get("tur", "sheets") == "sqlite":
+        return SqliteDeposu(ayar.get("dosya", YEREL_DEPO_DB))
+    return SheetsDeposu()
+
+def sayfa_basliklari(sayfa_adi):
+    """Sayfanın başlık satırı. Snapshot her senkronda başlığı kontrol ettiği için oradan okunur;
+    snapshot yoksa depodan çekilir."""
+    ozet = snapshot_ozet(sayfa_adi)
+    if ozet and ozet["basliklar"]:
+        return ozet["basliklar"]
+    depo().sutun_sayisi(sayfa_adi)
+    degerler = depo().araliklari_oku([f"{_a1_sayfa(sayfa_adi)}!1:1"])[0]
+    return degerler[0] if degerler else []
+
+def sutun_haritasi(sayfa_adi):
+    """Başlık -> 1 tabanlı sütun numarası (aynı başlık birden fazlaysa ilki)."""
+    harita = {}
+    for i, h in enumerate(sayfa_basliklari(sayfa_adi)):
+        harita.setdefault(h, i + 1)
+    return harita
+
 # --- GÜVENLİ SAYI DÖNÜŞTÜRME (ULTRA GÜVENLİ) ---
 def safe_int(val):
     try:
@@ -480,263 +1011,648 @@ def safe_float(val):
         except:
             return 0.0
 
-# --- VERİ İŞLEMLERİ (CACHING) ---
-@st.cache_data(ttl=5)
-def verileri_getir(sayfa_adi):
-    sh = get_sheet()
+# --- YEREL SNAPSHOT (SQLite) ---
+# Her çalışma sayfasının son bilinen hali yerel bir SQLite dosyasında tutulur.
+# Okumalar snapshot'tan yapılır, Sheets'ten sadece son senkrondan sonra eklenen satırlar çekilir.
+def _snapshot_baglan():
+    os.makedirs(YEREL_VERI_KLASORU, exist_ok=True)
+    con = sqlite3.connect(SNAPSHOT_DB, timeout=30)
+    con.execute("CREATE TABLE IF NOT EXISTS sayfa_ozet (sayfa TEXT PRIMARY KEY, basliklar TEXT, satir_sayisi INTEGER, son_tam_senkron REAL)")
+    con.execute("CREATE TABLE IF NOT EXISTS sayfa_satirlari (sayfa TEXT, satir_no INTEGER, veri TEXT, PRIMARY KEY (sayfa, satir_no))")
+    return con
+
+def snapshot_ozet(sayfa_adi):
+    """Snapshot'taki başlıkları, satır sayısını ve son tam senkron zamanını döner. Kayıt yoksa None."""
+    with closing(_snapshot_baglan()) as con:
+        r = con.execute("SELECT basliklar, satir_sayisi, son_tam_senkron FROM sayfa_ozet WHERE sayfa=?", (sayfa_adi,)).fetchone()
+    if not r: return None
+    return {"basliklar": json.loads(r[0]), "satir_sayisi": r[1], "son_tam_senkron": r[2]}
+
+def snapshot_degerleri(sayfa_adi):
+    """Snapshot'ı get_all_values() formatında ([başlık] + satırlar) döner. Kayıt yoksa None."""
+    ozet = snapshot_ozet(sayfa_adi)
+    if ozet is None: return None
+    with closing(_snapshot_baglan()) as con:
+        satirlar = [json.loads(r[0]) for r in con.execute("SELECT veri FROM sayfa_satirlari WHERE sayfa=? ORDER BY satir_no", (sayfa_adi,))]
+    return [ozet["basliklar"]] + satirlar
+
+def snapshot_tam_yaz(sayfa_adi, values):
+    """Sayfanın tamamını (başlık + satırlar) snapshot'a yazar, eski kaydı siler."""
+    basliklar = values[0] if values else []
+    satirlar = values[1:] if values else []
+    with closing(_snapshot_baglan()) as con, con:
+        con.execute("DELETE FROM sayfa_satirlari WHERE sayfa=?", (sayfa_adi,))
+        con.executemany("INSERT INTO sayfa_satirlari VALUES (?,?,?)",
+                        [(sayfa_adi, i, json.dumps(r, ensure_ascii=False)) for i, r in enumerate(satirlar)])
+        con.execute("INSERT OR REPLACE INTO sayfa_ozet VALUES (?,?,?,?)",
+                    (sayfa_adi, json.dumps(basliklar, ensure_ascii=False), len(satirlar), time.time()))
+
+def snapshot_satir_ekle(sayfa_adi, satirlar):
+    """Snapshot'ın sonuna yeni satırlar ekler (tam senkron zamanına dokunmaz)."""
+    if not satirlar: return
+    with closing(_snapshot_baglan()) as con, con:
+        n = con.execute("SELECT satir_sayisi FROM sayfa_ozet WHERE sayfa=?", (sayfa_adi,)).fetchone()
+        if not n: return
+        con.executemany("INSERT OR REPLACE INTO sayfa_satirlari VALUES (?,?,?)",
+                        [(sayfa_adi, n[0] + i, json.dumps(r, ensure_ascii=False)) for i, r in enumerate(satirlar)])
+        con.execute("UPDATE sayfa_ozet SET satir_sayisi=? WHERE sayfa=?", (n[0] + len(satirlar), sayfa_adi))
+
+def snapshot_hucreleri_guncelle(sayfa_adi, hucreler):
+    """Snapshot'taki hücreleri yerinde günceller. hucreler: [(satır, sütun, değer)], Sheets numaralandırmasıyla (1 tabanlı, 1. satır başlık)."""
+    if not hucreler: return
+    with closing(_snapshot_baglan()) as con, con:
+        ozet = con.execute("SELECT basliklar FROM sayfa_ozet WHERE sayfa=?", (sayfa_adi,)).fetchone()
+        if not ozet: return
+        satirlar = {}
+        for row, col, deger in hucreler:
+            if row not in satirlar:
+                if row == 1: satirlar[row] = json.loads(ozet[0])
+                else:
+                    r = con.execute("SELECT veri FROM sayfa_satirlari WHERE sayfa=? AND satir_no=?", (sayfa_adi, row - 2)).fetchone()
+                    if not r: continue
+                    satirlar[row] = json.loads(r[0])
+            satir = satirlar[row]
+            satir.extend([""] * (col - len(satir)))
+            satir[col - 1] = str(deger)
+        for row, satir in satirlar.items():
+            veri = json.dumps(satir, ensure_ascii=False)
+            if row == 1: con.execute("UPDATE sayfa_ozet SET basliklar=? WHERE sayfa=?", (veri, sayfa_adi))
+            else: con.execute("UPDATE sayfa_satirlari SET veri=? WHERE sayfa=? AND satir_no=?", (veri, sayfa_adi, row - 2))
+
+def snapshot_tam_senkron_iste(sayfa_adi):
+    """Snapshot'ın satır sırası Sheets'le uyuşmuyor; sayfa bir sonraki okumada baştan çekilir."""
+    with closing(_snapshot_baglan()) as con, con:
+        con.execute("UPDATE sayfa_ozet SET son_tam_senkron=0 WHERE sayfa=?", (sayfa_adi,))
+    _son_kontrol_zamanlari().pop(sayfa_adi, None)
+
+def _satir_kirp(row):
+    # Sheets API sondaki boş hücreleri döndürmez; karşılaştırmadan önce iki tarafı da eşitliyoruz
+    row = [str(v) for v in row]
+    while row and row[-1] == "": row.pop()
+    return row
+
+def _a1_sayfa(sayfa_adi):
+    return "'" + sayfa_adi.replace("'", "''") + "'"
+
+def _senkron_araliklari(sayfa_adi, col_count):
+    """Snapshot'ı güncellemek için Sheets'ten okunması gereken aralıkları döner.
+    Tam senkron gerekiyorsa sadece sayfanın kendisi, değilse başlık satırı + kuyruk."""
+    ozet = snapshot_ozet(sayfa_adi)
+    if ozet is None or time.time() - ozet["son_tam_senkron"] > SNAPSHOT_TAM_SENKRON_SN:
+        return [_a1_sayfa(sayfa_adi)]
+    n = ozet["satir_sayisi"]
+    son_sutun = re.sub(r"\d", "", gspread.utils.rowcol_to_a1(1, col_count))
+    # Başlık satırı + snapshot'taki son satırdan itibaren kuyruk (n == 0 ise kuyruk başlıktan başlar)
+    return [f"{_a1_sayfa(sayfa_adi)}!1:1", f"{_a1_sayfa(sayfa_adi)}!A{n + 1}:{son_sutun}"]
+
+def _senkron_uygula(sayfa_adi, degerler):
+    """_senkron_araliklari ile çekilen değerleri snapshot'a işler.
+    Başlık değiştiyse veya son bilinen satır yerinde değilse False döner (tam senkron gerekir)."""
+    if len(degerler) == 1:
+        snapshot_tam_yaz(sayfa_adi, degerler[0])
+        return True
+
+    baslik_araligi, kuyruk = degerler
+    ozet = snapshot_ozet(sayfa_adi)
+    uzak_baslik = baslik_araligi[0] if baslik_araligi else []
+    if _satir_kirp(uzak_baslik) != _satir_kirp(ozet["basliklar"]):
+        return False
+
+    # Kuyruğun ilk satırı snapshot'taki son satır (n == 0 ise başlık) olmalı; değilse satırlar silinmiş/kaymıştır
+    n = ozet["satir_sayisi"]
+    if n == 0:
+        referans = ozet["basliklar"]
+    else:
+        with closing(_snapshot_baglan()) as con:
+            referans = json.loads(con.execute("SELECT veri FROM sayfa_satirlari WHERE sayfa=? AND satir_no=?", (sayfa_adi, n - 1)).fetchone()[0])
+    if not kuyruk or _satir_kirp(kuyruk[0]) != _satir_kirp(referans):
+        return False
+
+    snapshot_satir_ekle(sayfa_adi, [list(r) for r in kuyruk[1:]])
+    return True
+
+@st.cache_resource
+def _son_kontrol_zamanlari():
+    # Sayfa -> Sheets ile en son ne zaman eşitlendiği (tüm oturumlar için ortak)
+    return {}
+
+@st.cache_resource
+def _son_aktarim_zamanlari():
+    # Sayfa -> kuyruktan en son ne zaman satır aktarıldığı
+    return {}
+
+def _eslendi_isaretle(sayfa_adi, baslangic):
+    # Okuma başladıktan sonra kuyruktan satır aktarıldıysa okunan veri eksik olabilir; sayfa taze sayılmaz
+    if baslangic > _son_aktarim_zamanlari().get(sayfa_adi, 0):
+        _son_kontrol_zamanlari()[sayfa_adi] = baslangic
+
+@st.cache_resource
+def _sayfa_kilitleri():
+    return {}
+
+def _sayfa_kilidi(sayfa_adi):
+    """Okumaların (eşitle + snapshot/kuyruk okuma) ve kuyruk aktarımının snapshot'a işlenmesinin sayfa başına kilidi."""
+    return _sayfa_kilitleri().setdefault(sayfa_adi, threading.Lock())
+
+def _snapshot_senkronize(sayfa_adi, col_count):
+    """Snapshot'ı depo ile eşitler. Başlık değişmediyse ve son bilinen satır yerindeyse sadece
+    yeni eklenen satırları çeker; başlık değiştiyse veya satır sayısı azaldıysa tam senkron yapar."""
+    baslangic = time.time()
+    if not _senkron_uygula(sayfa_adi, depo().araliklari_oku(_senkron_araliklari(sayfa_adi, col_count))):
+        depo().yapi_degisti()
+        _senkron_uygula(sayfa_adi, depo().araliklari_oku([_a1_sayfa(sayfa_adi)]))
+    _eslendi_isaretle(sayfa_adi, baslangic)
+
+def verileri_toplu_getir(sayfa_adlari):
+    """Bir ekranın ihtiyaç duyduğu tüm çalışma sayfalarını tek values_batch_get isteğiyle senkronlar.
+    Sonrasındaki verileri_getir çağrıları Sheets'e gitmeden snapshot'tan okur. Son SNAPSHOT_KONTROL_SN içinde
+    eşitlenmiş sayfalar atlanır; hepsi tazeyse istek gönderilmez (widget tıklamaları kota harcamaz)."""
+    baslangic = time.time()
+    kontroller = _son_kontrol_zamanlari()
+    sayfa_adlari = [s for s in dict.fromkeys(sayfa_adlari) if baslangic - kontroller.get(s, 0) > SNAPSHOT_KONTROL_SN]
+    if not sayfa_adlari: return
     try:
-        w = sh.worksheet(sayfa_adi)
-        # get_all_records fails if headers are missing or data length > header length
-        # Using get_all_values provides resilience against data schema changes
-        values = w.get_all_values()
-        if not values or len(values) < 2:
-            return []
-
-        headers = values[0]
-        data = values[1:]
-
-        # Pad headers if there's more data columns than header columns
-        max_cols = max(len(headers), max((len(row) for row in data), default=0))
-        if len(headers) < max_cols:
-            headers.extend([f"Sutun_{i+1}" for i in range(len(headers), max_cols)])
-
-        # Ensure unique headers
-        unique_headers = []
-        for h in headers:
-            base_h = h if str(h).strip() else "BilinmeyenSutun"
-            new_h = base_h
-            counter = 1
-            while new_h in unique_headers:
-                new_h = f"{base_h}_{counter}"
-                counter += 1
-            unique_headers.append(new_h)
-
-        import pandas as pd
-        df = pd.DataFrame(data, columns=unique_headers)
-        return df.to_dict('records')
+        d = depo()
+        mevcut = d.sayfalar()
+        # Sheets arayüzünden yeni açılmış bir sayfa olabilir; kaydı arada bir yeniliyoruz
+        if any(s not in mevcut for s in sayfa_adlari) and d.sayfa_listesi_yasi() > SNAPSHOT_TAM_SENKRON_SN:
+            mevcut = d.sayfalar(yenile=True)
+        sayfalar = [s for s in sayfa_adlari if s in mevcut]
+        plan = {s: _senkron_araliklari(s, mevcut[s]) for s in sayfalar}
+        araliklar = [a for s in sayfalar for a in plan[s]]
+        degerler = d.araliklari_oku(araliklar) if araliklar else []
+
+        tam_gerekenler = []
+        i = 0
+        for s in sayfalar:
+            k = len(plan[s])
+            if not _senkron_uygula(s, degerler[i:i + k]): tam_gerekenler.append(s)
+            i += k
+
+        # Delta tutarsız çıkan sayfalar için (nadir) ikinci bir toplu istek
+        if tam_gerekenler:
+            d.yapi_degisti()
+            for s, v in zip(tam_gerekenler, d.araliklari_oku([_a1_sayfa(s) for s in tam_gerekenler])):
+                snapshot_tam_yaz(s, v)
+
+        # Sheets'te olmayan sayfalar boş kabul edilir
+        for s in sayfa_adlari:
+            if s not in mevcut: snapshot_tam_yaz(s, [])
+            _eslendi_isaretle(s, baslangic)
+    except Exception as e:
+        # Toplu okuma başarısız olursa verileri_getir sayfaları tek tek çekmeye devam eder
+        depo().yapi_degisti()
+        print("Toplu veri çekme hatası:", e)
+
+def _tabloya_cevir(values):
+    """get_all_values() formatındaki veriyi DataFrame'e çevirir (hücreler metin olarak kalır).
+    Sadece başlık satırı varsa sütunları belli boş bir tablo döner."""
+    if not values:
+        return pd.DataFrame()
+
+    headers = list(values[0])
+    data = values[1:]
+
+    # Pad headers if there's more data columns than header columns
+    max_cols = max(len(headers), max((len(row) for row in data), default=0))
+    if len(headers) < max_cols:
+        headers.extend([f"Sutun_{i+1}" for i in range(len(headers), max_cols)])
+    # Sheets API sondaki boş hücreleri kırptığı için satırları da başlık genişliğine tamamlıyoruz
+    data = [list(row) + [""] * (max_cols - len(row)) for row in data]
+
+    # Ensure unique headers
+    unique_headers = []
+    for h in headers:
+        base_h = h if str(h).strip() else "BilinmeyenSutun"
+        new_h = base_h
+        counter = 1
+        while new_h in unique_headers:
+            new_h = f"{base_h}_{counter}"
+            counter += 1
+        unique_headers.append(new_h)
+
+    return pd.DataFrame(data, columns=unique_headers)
+
+def _kayitlara_cevir(values):
+    """get_all_values() formatındaki veriyi sütun adlı sözlük listesine çevirir."""
+    return _tabloya_cevir(values).to_dict('records')
+
+def _tutar_sutunu(seri):
+    # safe_float'ın vektörel karşılığı: olduğu gibi, olmazsa virgül noktaya çevrilerek sayıya çevrilir; geçersizler 0
+    metin = seri.astype(str).str.strip()
+    sayi = pd.to_numeric(metin, errors='coerce')
+    sayi = sayi.fillna(pd.to_numeric(metin.str.replace(",", ".", regex=False), errors='coerce'))
+    return sayi.fillna(0.0).astype(float)
+
+def _adet_sutunu(seri):
+    # safe_int'in vektörel karşılığı
+    sayi = pd.to_numeric(seri.astype(str).str.strip().str.replace(",", ".", regex=False), errors='coerce')
+    return sayi.fillna(0).astype(float).astype(int)
+
+def _tarih_sutunu(seri):
+    tarih = pd.to_datetime(seri, format=TARIH_BICIMLERI[0], errors='coerce')
+    for bicim in TARIH_BICIMLERI[1:]:
+        tarih = tarih.fillna(pd.to_datetime(seri, format=bicim, errors='coerce'))
+    return tarih
+
+def _tipli_tabloya_cevir(values):
+    """_tabloya_cevir + tip dönüşümleri: Tutar -> Tutar_float, Tarih -> Tarih_dt (asıl metin sütunları
+    ekranda gösterildiği için korunur), adetler tamsayı, durum/kaynak sütunları kategorik, sipariş no'nun
+    kanonik biçimi Sipariş Anahtarı."""
+    df = _tabloya_cevir(values)
+    if "Tutar" in df.columns: df["Tutar_float"] = _tutar_sutunu(df["Tutar"])
+    if "Tarih" in df.columns: df["Tarih_dt"] = _tarih_sutunu(df["Tarih"])
+    for c in ADET_SUTUNLARI:
+        if c in df.columns: df[c] = _adet_sutunu(df[c])
+    for c in KATEGORI_SUTUNLARI:
+        if c in df.columns: df[c] = df[c].astype("category")
+    for c in SIPARIS_NO_SUTUNLARI:
+        if c in df.columns:
+            df["Sipariş Anahtarı"] = df[c].map(siparis_no_normalize)
+            break
+    return df
+
+# --- YAZMA KUYRUĞU (WRITE-BEHIND) ---
+# Yeni satırlar önce yerel bir SQLite günlüğüne yazılır ve kullanıcıya hemen "sıraya alındı" denir.
+# Arka plandaki işleyici bekleyen satırları sayfa başına tek append_rows isteğinde birleştirip Sheets'e aktarır;
+# süreç kapansa bile günlükteki satırlar bir sonraki açılışta gönderilir.
+def _kuyruk_baglan():
+    os.makedirs(YEREL_VERI_KLASORU, exist_ok=True)
+    con = sqlite3.connect(KUYRUK_DB, timeout=30)
+    con.execute("CREATE TABLE IF NOT EXISTS bekleyen_satirlar (id INTEGER PRIMARY KEY AUTOINCREMENT, sayfa TEXT, veri TEXT, secenek TEXT, eklenme REAL, deneme INTEGER DEFAULT 0, sonraki_deneme REAL DEFAULT 0)")
+    return con
+
+def kuyruga_ekle(sayfa_adi, satirlar, value_input_option='RAW'):
+    """Satırları Sheets'e aktarılmak üzere kalıcı kuyruğa yazar. Okumalar bekleyen satırları da görür."""
+    if not satirlar: return
+    simdi_ts = time.time()
+    with closing(_kuyruk_baglan()) as con, con:
+        con.executemany("INSERT INTO bekleyen_satirlar (sayfa, veri, secenek, eklenme) VALUES (?,?,?,?)",
+                        [(sayfa_adi, json.dumps(r, ensure_ascii=False, default=str), value_input_option, simdi_ts) for r in satirlar])
+    cache_temizle(sayfa_adi)
+    _yazma_kuyrugu_isleyicisi()
+
+def kuyruktaki_satirlar(sayfa_adi=None):
+    """Henüz Sheets'e aktarılmamış satırlar. sayfa_adi verilmezse tüm sayfalar için (sayfa, satır) listesi."""
+    with closing(_kuyruk_baglan()) as con:
+        if sayfa_adi is None:
+            return [(r[0], json.loads(r[1])) for r in con.execute("SELECT sayfa, veri FROM bekleyen_satirlar ORDER BY id")]
+        return [json.loads(r[0]) for r in con.execute("SELECT veri FROM bekleyen_satirlar WHERE sayfa=? ORDER BY id", (sayfa_adi,))]
+
+@st.cache_resource
+def _kuyruk_kilidi():
+    return threading.Lock()
+
+def yazma_kuyrugunu_bosalt():
+    """Vakti gelmiş bekleyen satırları sayfa başına tek append_rows isteğiyle Sheets'e aktarır.
+    Başarısız gruplar üstel bekleme (jitter'lı) ile sonra tekrar denenir."""
+    with _kuyruk_kilidi():
+        with closing(_kuyruk_baglan()) as con:
+            kayitlar = con.execute("SELECT id, sayfa, veri, secenek, deneme FROM bekleyen_satirlar WHERE sonraki_deneme <= ? ORDER BY id", (time.time(),)).fetchall()
+        if not kayitlar: return
+
+        gruplar = {}
+        for id_, sayfa, veri, secenek, deneme in kayitlar:
+            gruplar.setdefault((sayfa, secenek), []).append((id_, json.loads(veri), deneme))
+
+        for (sayfa, secenek), grup in gruplar.items():
+            idler = [g[0] for g in grup]
+            try:
+                _sayfayi_hazirla(sayfa, rows=max(100, len(grup) + 1))
+                depo().satir_ekle(sayfa, [g[1] for g in grup], value_input_option=secenek)
+            except Exception as e:
+                print(f"Kuyruk aktarım hatası ({sayfa}):", e)
+                depo().yapi_degisti()
+                deneme = max(g[2] for g in grup) + 1
+                bekleme = min(KUYRUK_MAKS_BEKLEME_SN, 2 ** deneme) * random.uniform(0.5, 1.0)
+                with closing(_kuyruk_baglan()) as con, con:
+                    con.executemany("UPDATE bekleyen_satirlar SET deneme=?, sonraki_deneme=? WHERE id=?",
+                                    [(deneme, time.time() + bekleme, i) for i in idler])
+                continue
+
+            # Satırlar aynı kilit altında snapshot'a işlenip günlükten silinir; arada okuyan bir oturum onları
+            # ne kaybeder ne de iki kez görür (artımlı senkronun tekilleştirmesi buna dayanır)
+            with _sayfa_kilidi(sayfa):
+                snapshot_satir_ekle(sayfa, [[_hucre_metni(v) for v in g[1]] for g in grup])
+                with closing(_kuyruk_baglan()) as con, con:
+                    con.executemany("DELETE FROM bekleyen_satirlar WHERE id=?", [(i,) for i in idler])
+                # O sırada süren okumalar sayfayı taze işaretlemez; bir sonraki okuma delta senkronla doğrular
+                _son_aktarim_zamanlari()[sayfa] = time.time()
+                _son_kontrol_zamanlari()[sayfa] = 0
+            cache_temizle(sayfa)
+
+@st.cache_resource
+def _yazma_kuyrugu_isleyicisi():
+    """Kuyruğu periyodik olarak boşaltan arka plan iş parçacığını (süreç başına bir tane) başlatır."""
+    def calis():
+        # Kuyruk aktarımları etkileşimli okumalara öncelik verir
+        sheets_zamanlayici().arka_plan_olarak_isaretle()
+        while True:
+            try: yazma_kuyrugunu_bosalt()
+            except Exception as e: print("Kuyruk işleyici hatası:", e)
+            time.sleep(KUYRUK_BOSALTMA_SN)
+    t = threading.Thread(target=calis, name="yazma-kuyrugu", daemon=True)
+    t.start()
+    return t
+
+def _yerel_degerler(sayfa_adi):
+    """Snapshot + henüz Sheets'e aktarılmamış kuyruk satırları (get_all_values formatında)."""
+    values = snapshot_degerleri(sayfa_adi)
+    bekleyen = kuyruktaki_satirlar(sayfa_adi)
+    if not bekleyen: return values
+    if not values or not values[0]:
+        values = [SAYFA_BASLIKLARI.get(sayfa_adi, [])]
+    return values + [["" if v is None else str(v) for v in r] for r in bekleyen]
 
+# --- VERİ İŞLEMLERİ (CACHING) ---
+def _sayfayi_esitle(sayfa_adi):
+    """Snapshot'ı gerekiyorsa depo ile eşitler. Depoya ulaşılamazsa elimizdeki son snapshot ile devam edilir."""
+    try:
+        # Toplu okuma (verileri_toplu_getir) bu sayfayı az önce eşitlediyse Sheets'e tekrar gitmiyoruz
+        if time.time() - _son_kontrol_zamanlari().get(sayfa_adi, 0) > SNAPSHOT_KONTROL_SN:
+            _snapshot_senkronize(sayfa_adi, depo().sutun_sayisi(sayfa_adi))
     except gspread.exceptions.WorksheetNotFound:
-        return []
+        pass
     except Exception as e:
-        import streamlit as st
         # Hatanın sebebini konsola veya uyarıya yazdıralım ki bir daha sorun yaşanmasın
         st.error(f"Veri çekme hatası: {e}")
-        return []
+        depo().yapi_degisti()
 
-def cache_temizle():
-    st.cache_data.clear()
+def _guncel_degerler(sayfa_adi):
+    """Gerekirse eşitleyip snapshot + kuyruk değerlerini döner (kuyruk aktarımıyla aynı sayfa kilidi altında)."""
+    with _sayfa_kilidi(sayfa_adi):
+        _sayfayi_esitle(sayfa_adi)
+        return _yerel_degerler(sayfa_adi)
+
+@st.cache_data(ttl=5)
+def _verileri_getir(sayfa_adi, surum):
+    return _kayitlara_cevir(_guncel_degerler(sayfa_adi))
+
+def verileri_getir(sayfa_adi):
+    """Sayfanın kayıtlarını döner. Önbellek (sayfa, sürüm) ile anahtarlanır; bir yazma işlemi sadece
+    kendi sayfasının sürümünü artırdığı için diğer sayfalar önbellekten gelmeye devam eder."""
+    return _verileri_getir(sayfa_adi, veri_surumu(sayfa_adi))
+
+@st.cache_resource(ttl=SNAPSHOT_KONTROL_SN)
+def _tablo_getir(sayfa_adi, surum):
+    return _tipli_tabloya_cevir(_guncel_degerler(sayfa_adi))
+
+def tablo_getir(sayfa_adi):
+    """Sayfanın tipleri çözülmüş DataFrame'i (bkz. _tipli_tabloya_cevir). Veri sürümü başına bir kez kurulur ve
+    tüm oturumlar aynı nesneyi paylaşır; ekranlar tabloyu değiştirmeden sadece filtreleyip toplamalıdır."""
+    return _tablo_getir(sayfa_adi, veri_surumu(sayfa_adi))
+
+@st.cache_resource(ttl=SNAPSHOT_KONTROL_SN)
+def _kalem_tablosu(surumler):
+    kayitli = tablo_getir("SiparisSatirlari")
+    parcalar = [kayitli[KALEM_SUTUNLARI]] if not kayitli.empty else []
+    # Kalem kaydı olmayan (eski) siparişlerin kalemleri düz Ürün/Adet/İsim 1-2 sütunlarından türetilir
+    for sayfa_adi, tur in (("Siparisler", "Manuel"), ("PazaryeriSiparisleri", "Pazaryeri")):
+        df = tablo_getir(sayfa_adi)
+        if df.empty: continue
+        if not kayitli.empty:
+            df = df[~df["Sipariş Anahtarı"].isin(kayitli.loc[kayitli["Sipariş Türü"] == tur, "Sipariş Anahtarı"])]
+        for i in (1, 2):
+            if f"Ürün {i}" not in df.columns: continue
+            parcalar.append(pd.DataFrame({
+                "Sipariş Türü": tur, "Sipariş Anahtarı": df["Sipariş Anahtarı"], "Ürün": df[f"Ürün {i}"],
+                "Adet": df[f"Adet {i}"] if f"Adet {i}" in df.columns else 0,
+                "İsim": df[f"İsim {i}"] if f"İsim {i}" in df.columns else "",
+            }))
+    if not parcalar: return pd.DataFrame(columns=KALEM_SUTUNLARI)
+    kalemler = pd.concat(parcalar, ignore_index=True)
+    return kalemler[kalemler["Ürün"].astype(str).str.strip() != ""].reset_index(drop=True)
+
+def kalem_tablosu():
+    """Tüm siparişlerin kalemleri uzun formatta: Sipariş Türü, Sipariş Anahtarı, Ürün, Adet, İsim.
+    Ürün bazlı raporlar bu tablo üzerinde tek groupby ile çalışır; tablo paylaşıldığı için değiştirilmemelidir."""
+    return _kalem_tablosu(tuple(veri_surumu(s) for s in ("SiparisSatirlari", "Siparisler", "PazaryeriSiparisleri")))
+
+@st.cache_resource
+def _veri_surumleri():
+    # Sayfa -> sürüm sayacı. Yazma işlemleri sadece dokundukları sayfanın sürümünü artırır (tüm oturumlar için ortak)
+    return {}
+
+def veri_surumu(sayfa_adi):
+    return _veri_surumleri().get(sayfa_adi, 0)
+
+@st.cache_data(ttl=5)
+def _aktarilmis_kayitlar(sayfa_adi, surum):
+    """Sadece Sheets'e aktarılmış (snapshot'taki) kayıtlar; i. kaydın Sheets satır numarası i + 2'dir."""
+    with _sayfa_kilidi(sayfa_adi):
+        _sayfayi_esitle(sayfa_adi)
+        return _kayitlara_cevir(snapshot_degerleri(sayfa_adi))
+
+@st.cache_data(ttl=5)
+def _siparis_indeksi(sayfa_adi, anahtar_sutun, surum):
+    indeks = {}
+    for i, kayit in enumerate(_aktarilmis_kayitlar(sayfa_adi, surum)):
+        k = siparis_no_normalize(kayit.get(anahtar_sutun))
+        if k: indeks.setdefault(k, []).append(i + 2)
+    return indeks
+
+def siparis_indeksi(sayfa_adi, anahtar_sutun):
+    """Kanonik sipariş no -> Sheets satır numaraları sözlüğü. Veri sürümü başına bir kez kurulur.
+    Kuyruktaki satırların Sheets'te henüz satır numarası olmadığı için indekste yer almazlar
+    (bkz. bekleyen_siparis_nolari)."""
+    return _siparis_indeksi(sayfa_adi, anahtar_sutun, veri_surumu(sayfa_adi))
+
+def bekleyen_siparis_nolari(sayfa_adi, anahtar_sutun):
+    """Yazma kuyruğunda bekleyen (Sheets'e henüz aktarılmamış) satırların kanonik sipariş numaraları."""
+    ozet = snapshot_ozet(sayfa_adi)
+    basliklar = ozet["basliklar"] if ozet and ozet["basliklar"] else SAYFA_BASLIKLARI.get(sayfa_adi, [])
+    if anahtar_sutun not in basliklar: return set()
+    i = basliklar.index(anahtar_sutun)
+    return {siparis_no_normalize(r[i]) for r in kuyruktaki_satirlar(sayfa_adi) if len(r) > i} - {""}
+
+def _bekleyenleri_aktar(sayfa_adi, anahtar_sutun, siparis_nolar):
+    """Durumu yazılacak siparişlerden kuyrukta bekleyen varsa kuyruğu hemen boşaltmayı dener; satır numarası ancak
+    Sheets'e aktarılmış satırlar için bilinir. Hâlâ kuyrukta olanların kanonik numaralarını döner."""
+    istenen = {siparis_no_normalize(n) for n in siparis_nolar}
+    if not istenen & bekleyen_siparis_nolari(sayfa_adi, anahtar_sutun): return set()
+    yazma_kuyrugunu_bosalt()
+    return istenen & bekleyen_siparis_nolari(sayfa_adi, anahtar_sutun)
+
+def _guncellenemeyenler_mesaji(sonuclar):
+    """siparis_durumlarini_toplu_guncelle sonuçlarından "BAŞARILI" veya güncellenemeyen siparişleri sayan hata mesajı."""
+    kuyrukta = [str(n) for n, s in sonuclar.items() if s == "KUYRUKTA"]
+    bulunamayan = [str(n) for n, s in sonuclar.items() if s == "BULUNAMADI"]
+    if not kuyrukta and not bulunamayan: return "BAŞARILI"
+    mesaj = []
+    if kuyrukta: mesaj.append(f"henüz Sheets'e aktarılmadığı için güncellenemedi, birazdan tekrar deneyin: {', '.join(kuyrukta)}")
+    if bulunamayan: mesaj.append(f"bulunamadı: {', '.join(bulunamayan)}")
+    return "HATA: " + "; ".join(mesaj)
+
+def cache_temizle(*sayfa_adlari):
+    """Verilen sayfaların önbelleğini geçersiz kılar; diğer sayfaların önbelleği sıcak kalır."""
+    surumler = _veri_surumleri()
+    for sayfa_adi in sayfa_adlari:
+        surumler[sayfa_adi] = surumler.get(sayfa_adi, 0) + 1
+
+def _sayfayi_hazirla(sayfa_adi, rows=100):
+    """Çalışma sayfası depoda yoksa başlık satırıyla oluşturur."""
+    try: depo().sutun_sayisi(sayfa_adi)
+    except gspread.exceptions.WorksheetNotFound:
+        basliklar = SAYFA_BASLIKLARI[sayfa_adi]
+        depo().sayfa_olustur(sayfa_adi, basliklar, rows=rows)
+        snapshot_tam_yaz(sayfa_adi, [basliklar])
 
 def siparis_ekle(satir):
-    sh = get_sheet()
-    try: w = sh.worksheet("Siparisler")
-    except:
-        w = sh.add_worksheet(title="Siparisler", rows=100, cols=20)
-        w.append_row(["Siparis No","Tarih","Durum","Müşteri","Telefon","TC No","Mail","Ürün 1","Adet 1","İsim 1","Ürün 2","Adet 2","İsim 2","Tutar","Ödeme","Kaynak","Adres","Not","Fatura Durumu","Tedarik Durumu"])
-    w.append_row(satir)
-    cache_temizle()
+    kuyruga_ekle("Siparisler", [satir])
+    kayit = dict(zip(SAYFA_BASLIKLARI["Siparisler"], satir))
+    kalemler = [(kayit.get(f"Ürün {i}"), kayit.get(f"Adet {i}"), kayit.get(f"İsim {i}")) for i in (1, 2)]
+    siparis_kalemleri_ekle(kayit["Siparis No"], "Manuel", [k for k in kalemler if k[0]])
+
+def siparis_kalemleri_ekle(siparis_no, siparis_turu, kalemler):
+    """kalemler: [(ürün, adet, isim)]. Sıra 1'den başlar."""
+    kuyruga_ekle("SiparisSatirlari", [[str(siparis_no), siparis_turu, i + 1, u, a, isim or ""] for i, (u, a, isim) in enumerate(kalemler)])
+
 def pazaryeri_siparis_ekle(satir):
-    sh = get_sheet()
-    try: w = sh.worksheet("PazaryeriSiparisleri")
-    except:
-        w = sh.add_worksheet(title="PazaryeriSiparisleri", rows=100, cols=20)
-        w.append_row(["Pazaryeri Siparis No","Tarih","Durum","Müşteri","Telefon","TC No","Mail","Ürün 1","Adet 1","İsim 1","Ürün 2","Adet 2","İsim 2","Tutar","Ödeme","Kaynak","Adres","Kargo Takip No","Fatura Durumu","Tedarik Durumu", "İl", "İlçe", "Kargo Firması", "Yazdırıldı Durumu"])
-    w.append_row(satir)
-    cache_temizle()
+    kuyruga_ekle("PazaryeriSiparisleri", [satir])
 
 def pazaryeri_siparis_toplu_ekle(satirlar):
     if not satirlar: return
-    sh = get_sheet()
-    try: w = sh.worksheet("PazaryeriSiparisleri")
-    except:
-        w = sh.add_worksheet(title="PazaryeriSiparisleri", rows=max(100, len(satirlar) + 1), cols=20)
-        w.append_row(["Pazaryeri Siparis No","Tarih","Durum","Müşteri","Telefon","TC No","Mail","Ürün 1","Adet 1","İsim 1","Ürün 2","Adet 2","İsim 2","Tutar","Ödeme","Kaynak","Adres","Kargo Takip No","Fatura Durumu","Tedarik Durumu", "İl", "İlçe", "Kargo Firması", "Yazdırıldı Durumu"])
-
-    # Tüm satırları tek bir API isteğiyle (bulk) ekliyoruz. (value_input_option='USER_ENTERED' formatı korur)
-    w.append_rows(satirlar, value_input_option='USER_ENTERED')
-    cache_temizle()
-
+    # Tüm satırlar kuyrukta tek bir API isteğinde (bulk) birleşir. (value_input_option='USER_ENTERED' formatı korur)
+    kuyruga_ekle("PazaryeriSiparisleri", satirlar, value_input_option='USER_ENTERED')
 
 
-from tenacity import retry, wait_exponential, stop_after_attempt
-
-@retry(wait=wait_exponential(multiplier=1, min=2, max=10), stop=stop_after_attempt(3))
 def _do_update_yazdirildi(siparis_nolar):
-    sh = get_sheet()
-    w = sh.worksheet("PazaryeriSiparisleri")
-    values = w.get_all_values()
-    if len(values) < 2: return
-    headers = values[0]
-    
-    # Sütun endekslerini bul
-    try: sip_idx = headers.index("Pazaryeri Siparis No")
-    except: return
-    
-    yazdir_idx = -1
-    try: 
-        yazdir_idx = headers.index("Yazdırıldı Durumu")
-    except ValueError:
-        yazdir_idx = len(headers)
-        w.update_cell(1, yazdir_idx + 1, "Yazdırıldı Durumu")
-        
-        # Tabloya yeni sütun eklediğimiz için row/col sayısını kontrol edelim ve gerekirse genişletelim
-        try:
-            if w.col_count < yazdir_idx + 1:
-                w.add_cols(1)
-        except: pass
-    
-    cells_to_update = []
-    for i, row in enumerate(values):
-        if i == 0: continue
-        if len(row) > sip_idx:
-            sip_no = str(row[sip_idx]).strip()
-            clean_sip_no = sip_no
-            if '.' in clean_sip_no and clean_sip_no.endswith('0'):
-                clean_sip_no = clean_sip_no.split('.')[0]
-            
-            match = False
-            for s_no in siparis_nolar:
-                clean_s_no = str(s_no).strip()
-                if '.' in clean_s_no and clean_s_no.endswith('0'):
-                    clean_s_no = clean_s_no.split('.')[0]
-                if clean_s_no == clean_sip_no or s_no == sip_no:
-                    match = True
-                    break
-
-            if match:
-                cells_to_update.append(gspread.Cell(row=i+1, col=yazdir_idx+1, value="YAZDIRILDI"))
-    
-    if cells_to_update:
-        try:
-            w.update_cells(cells_to_update)
-        except Exception as e:
-            for cell in cells_to_update:
-                w.update_cell(cell.row, cell.col, cell.value)
-        cache_temizle()
+    """Dönüş: {sipariş no: "BAŞARILI" | "KUYRUKTA" | "BULUNAMADI"}. Satır numaraları yazmadan hemen önce anahtar
+    sütunu okunarak bulunur (snapshot indeksi Sheets'te sıralama/silme sonrası bayat olabilir)."""
+    return siparis_durumlarini_toplu_guncelle("PazaryeriSiparisleri", "Pazaryeri Siparis No", "Yazdırıldı Durumu",
+                                              {s_no: "YAZDIRILDI" for s_no in siparis_nolar}, basligi_ekle=True)
 
 def update_yazdirildi_durumu(siparis_nolar):
-    if not siparis_nolar: return
+    if not siparis_nolar: return "BAŞARILI"
     try:
-        _do_update_yazdirildi(siparis_nolar)
+        return _guncellenemeyenler_mesaji(_do_update_yazdirildi(siparis_nolar))
     except Exception as e:
         import traceback
         traceback.print_exc()
-        print("Hata:", e)
+        return f"HATA: {e}"
 
 def cari_islem_ekle(satir):
     # satir formatı: [Cari Adı, Tarih, Fatura No, Not, Tutar, Tip]
-    sh = get_sheet()
-    try: w = sh.worksheet("Cariler")
-    except:
-        w = sh.add_worksheet(title="Cariler", rows=100, cols=6)
-        w.append_row(["Cari Adı", "Tarih", "Fatura No", "Not", "Tutar", "Tip"])
-    w.append_row(satir)
-    cache_temizle()
+    kuyruga_ekle("Cariler", [satir])
 
 def alis_faturasi_ekle(satir):
-    sh = get_sheet()
-    try: w = sh.worksheet("Alislar")
-    except:
-        w = sh.add_worksheet(title="Alislar", rows=100, cols=9)
-        w.append_row(["Tarih", "Bağlı Sipariş", "Cari Hesap", "Ürün", "Adet", "Birim Fiyat", "Toplam", "Durum", "Not"])
-    w.append_row(satir)
-    cache_temizle()
+    kuyruga_ekle("Alislar", [satir])
 
 def yeni_urun_resim_ekle(ad, resim_adi):
-    sh = get_sheet()
-    try: w = sh.worksheet("Urunler")
-    except:
-        w = sh.add_worksheet(title="Urunler", rows=100, cols=2)
-        w.append_row(["Urun Adi", "Resim Dosya Adi"])
-    w.append_row([ad, resim_adi])
-    cache_temizle()
+    kuyruga_ekle("Urunler", [[ad, resim_adi]])
 
 # --- ÖZEL FONKSİYONLAR ---
+def canli_satir_haritasi(sayfa_adi, anahtar_col):
+    """Hücre yazmadan önce anahtar sütununu depodan tek istekte okur: kanonik sipariş no -> satır numarası
+    (w.find ile aynı davranış: aynı numara birden fazla satırda varsa ilki). Snapshot'taki satır numaraları Sheets'te
+    sıralama/silme sonrası bayat olabilir. İkinci değer snapshot'taki sütunun hâlâ canlı sütunun başı olup olmadığıdır."""
+    canli = [str(v) for v in depo().sutun_degerleri(sayfa_adi, anahtar_col)[1:]]
+    harita = {}
+    for i, v in enumerate(canli):
+        harita.setdefault(siparis_no_normalize(v), i + 2)
+    harita.pop("", None)
+    yerel = _satir_kirp([r[anahtar_col - 1] if len(r) >= anahtar_col else "" for r in (snapshot_degerleri(sayfa_adi) or [[]])[1:]])
+    return harita, canli[:len(yerel)] == yerel
+
+def snapshot_hucrelerini_isle(sayfa_adi, hucreler, uyumlu):
+    """Depoya yazılan hücreleri snapshot'a işler. Snapshot'ın satır sırası bayatsa (uyumlu=False) hücreler yanlış
+    satıra gideceği için bunun yerine tam senkron istenir."""
+    if uyumlu: snapshot_hucreleri_guncelle(sayfa_adi, hucreler)
+    else: snapshot_tam_senkron_iste(sayfa_adi)
+    cache_temizle(sayfa_adi)
+
+def siparis_durumlarini_toplu_guncelle(sayfa_adi, anahtar_sutun, hedef_sutun, degerler, basligi_ekle=False):
+    """Birden çok siparişin durum hücresini tek seferde günceller.
+    Anahtar sütunu bir kez okunur, sipariş no -> satır eşlemesi sözlükle yapılır ve
+    tüm hücreler tek batch_update isteğiyle yazılır. Kuyrukta bekleyen siparişler için önce kuyruk boşaltılır.
+    basligi_ekle=True ise hedef sütun yoksa başlığı aynı istekte sayfanın sonuna yazılır.
+    degerler: {sipariş no: yeni değer}. Dönüş: {sipariş no: "BAŞARILI" | "KUYRUKTA" | "BULUNAMADI"}"""
+    if not degerler: return {}
+    kuyrukta = _bekleyenleri_aktar(sayfa_adi, anahtar_sutun, degerler)
+    sutunlar = sutun_haritasi(sayfa_adi)
+    if anahtar_sutun not in sutunlar: raise ValueError(f"'{sayfa_adi}' sayfasında '{anahtar_sutun}' sütunu yok.")
+    guncellenen = []
+    if hedef_sutun not in sutunlar:
+        if not basligi_ekle: raise ValueError(f"'{sayfa_adi}' sayfasında '{hedef_sutun}' sütunu yok.")
+        # Depo gerekirse sayfayı genişletir
+        sutunlar[hedef_sutun] = len(sayfa_basliklari(sayfa_adi)) + 1
+        guncellenen.append((1, sutunlar[hedef_sutun], hedef_sutun))
+    anahtar_col = sutunlar[anahtar_sutun]
+    hedef_col = sutunlar[hedef_sutun]
+
+    satir_haritasi, uyumlu = canli_satir_haritasi(sayfa_adi, anahtar_col)
+
+    sonuclar = {}
+    for sip_no, deger in degerler.items():
+        row = satir_haritasi.get(siparis_no_normalize(sip_no))
+        if row is None:
+            sonuclar[sip_no] = "KUYRUKTA" if siparis_no_normalize(sip_no) in kuyrukta else "BULUNAMADI"
+            continue
+        guncellenen.append((row, hedef_col, deger))
+        sonuclar[sip_no] = "BAŞARILI"
+
+    if guncellenen:
+        depo().hucreleri_guncelle(sayfa_adi, guncellenen)
+        snapshot_hucrelerini_isle(sayfa_adi, guncellenen, uyumlu)
+    return sonuclar
+
 def fatura_durumunu_kesildi_yap(siparis_nolar):
-    sh = get_sheet()
-    w = sh.worksheet("Siparisler")
     try:
-        headers = w.row_values(1)
-        sip_no_col = headers.index("Siparis No") + 1
-        fatura_col = headers.index("Fatura Durumu") + 1
-        for sip_no in siparis_nolar:
-            cell = w.find(str(sip_no), in_column=sip_no_col)
-            if cell: w.update_cell(cell.row, fatura_col, "KESİLDİ")
-        cache_temizle()
-        return "BAŞARILI"
+        sonuclar = siparis_durumlarini_toplu_guncelle("Siparisler", "Siparis No", "Fatura Durumu", {sip_no: "KESİLDİ" for sip_no in siparis_nolar})
+        return _guncellenemeyenler_mesaji(sonuclar)
     except Exception as e: return f"HATA: {e}"
 
 def tedarik_durumunu_guncelle_ve_cariye_isle(siparis_bilgileri, cari_hesap, maliyet_sozlugu):
-    sh = get_sheet()
-    ws_siparis = sh.worksheet("Siparisler")
-    ws_cari = sh.worksheet("Cariler")
     tarih_str = simdi().strftime("%d.%m.%Y")
 
     try:
-        headers = ws_siparis.row_values(1)
-        sip_no_col = headers.index("Siparis No") + 1
-        try: tedarik_col = headers.index("Tedarik Durumu") + 1
-        except: return "HATA: 'Siparisler' sayfasında 'Tedarik Durumu' sütunu yok."
-
-        toplam_maliyet = 0
-        islenen_nolar = []
-
-        for sip in siparis_bilgileri:
-            sip_no = sip['Siparis No']
-            u1 = sip.get('Ürün 1', '')
-            a1 = safe_int(sip.get('Adet 1', 0))
-            u2 = sip.get('Ürün 2', '')
-            a2 = safe_int(sip.get('Adet 2', 0))
-
-            m1 = maliyet_sozlugu.get(u1, 0) * a1
-            m2 = maliyet_sozlugu.get(u2, 0) * a2
-            toplam_maliyet += (m1 + m2)
+        secilen_nolar = [str(sip['Siparis No']) for sip in siparis_bilgileri]
+        sonuclar = siparis_durumlarini_toplu_guncelle("Siparisler", "Siparis No", "Tedarik Durumu", {sip_no: "TEDARİKÇİ KESTİ" for sip_no in secilen_nolar})
+        # Durumu yazılamayan siparişlerin maliyeti cariye işlenmez; tekrar onaylandıklarında işlenir
+        islenen_nolar = [n for n in secilen_nolar if sonuclar.get(n) == "BAŞARILI"]
+        if not islenen_nolar: return _guncellenemeyenler_mesaji(sonuclar)
 
-            islenen_nolar.append(str(sip_no))
-
-            cell = ws_siparis.find(str(sip_no), in_column=sip_no_col)
-            if cell: ws_siparis.update_cell(cell.row, tedarik_col, "TEDARİKÇİ KESTİ")
+        # Maliyet, seçilen siparişlerin tüm kalemleri üzerinden tek seferde toplanır
+        kalemler = kalem_tablosu()
+        secili = kalemler[(kalemler['Sipariş Türü'] == "Manuel") & kalemler['Sipariş Anahtarı'].isin([siparis_no_normalize(n) for n in islenen_nolar])]
+        toplam_maliyet = float((secili['Adet'] * secili['Ürün'].map(maliyet_sozlugu).fillna(0)).sum())
 
         # KDV Dahil Maliyet
         tutar_kdv_dahil = toplam_maliyet * 1.20
         aciklama = f"Sipariş Maliyetleri: {', '.join(islenen_nolar)}"
 
         # [Cari Adı, Tarih, Fatura No, Not, Tutar, Tip]
-        ws_cari.append_row([cari_hesap, tarih_str, "OTO-ALIS", aciklama, tutar_kdv_dahil, "BORÇ"])
-
-        cache_temizle()
-        return "BAŞARILI"
+        cari_islem_ekle([cari_hesap, tarih_str, "OTO-ALIS", aciklama, tutar_kdv_dahil, "BORÇ"])
+        return _guncellenemeyenler_mesaji(sonuclar)
     except Exception as e: return f"HATA: {e}"
 
 def alis_faturasi_onayla(alis_indexler):
-    sh = get_sheet()
-    try: ws_alis = sh.worksheet("Alislar")
+    try: depo().sutun_sayisi("Alislar")
     except: return "Alislar sayfası yok"
-    try: ws_cari = sh.worksheet("Cariler")
-    except:
-        ws_cari = sh.add_worksheet(title="Cariler", rows=100, cols=6)
-        ws_cari.append_row(["Cari Adı", "Tarih", "Fatura No", "Not", "Tutar", "Tip"])
 
     tarih_str = simdi().strftime("%d.%m.%Y")
     try:
-        headers = ws_alis.row_values(1)
-        durum_col = headers.index("Durum") + 1
+        durum_col = sutun_haritasi("Alislar")["Durum"]
 
+        guncellenen, cari_satirlari = [], []
         for row_num, cari_hesap, net_tutar, aciklama in alis_indexler:
-            ws_alis.update_cell(row_num + 2, durum_col, "FATURALAŞTI")
+            guncellenen.append((row_num + 2, durum_col, "FATURALAŞTI"))
             net_val = safe_float(net_tutar)
             brut_tutar = net_val * 1.20
             # [Cari Adı, Tarih, Fatura No, Not, Tutar, Tip]
-            ws_cari.append_row([cari_hesap, tarih_str, "ALIS-FAT", aciklama, brut_tutar, "BORÇ"])
-        cache_temizle()
+            cari_satirlari.append([cari_hesap, tarih_str, "ALIS-FAT", aciklama, brut_tutar, "BORÇ"])
+        depo().hucreleri_guncelle("Alislar", guncellenen)
+        snapshot_hucreleri_guncelle("Alislar", guncellenen)
+        cache_temizle("Alislar")
+        # Cari kayıtları kuyrukta tek append_rows isteğinde birleşir
+        kuyruga_ekle("Cariler", cari_satirlari)
         return "BAŞARILI"
     except Exception as e: return f"HATA: {e}"
 
 def maliyet_kaydet(veriler):
-    sh = get_sheet()
-    try: w = sh.worksheet("Maliyetler")
+    try: tum = depo().tum_degerler("Maliyetler")
     except: return "Maliyetler sayfası bulunamadı."
-    tum = w.get_all_records()
-    df = pd.DataFrame(tum)
+    df = _tabloya_cevir(tum)
     yeni = [veriler.get("Görsel",""), veriler.get("Ürün Kod",""), veriler.get("Ürün Id",""), veriler.get("Tahta",0), veriler.get("VERNİK",0), veriler.get("YAKMA",0), veriler.get("BOYA",0), veriler.get("MUSLUK",0), veriler.get("BORU",0), veriler.get("HALAT",0), veriler.get("Metal çubuk",0), veriler.get("CAM",0), veriler.get("UĞUR KAR",0), veriler.get("MALİYET",0)]
     try:
         col = "Ürün Id"
@@ -747,14 +1663,107 @@ def maliyet_kaydet(veriler):
         idx = df.index[df[col].astype(str) == str(veriler["Ürün Id"])].tolist()
         if idx:
             r = idx[0] + 2
-            w.update(f"A{r}:N{r}", [yeni])
-            cache_temizle()
+            depo().hucreleri_guncelle("Maliyetler", [(r, c + 1, v) for c, v in enumerate(yeni)], value_input_option='RAW')
+            snapshot_hucreleri_guncelle("Maliyetler", [(r, c + 1, v) for c, v in enumerate(yeni)])
+            cache_temizle("Maliyetler")
             return "GÜNCELLENDİ"
-        w.append_row(yeni)
-        cache_temizle()
+        depo().satir_ekle("Maliyetler", [yeni])
+        snapshot_satir_ekle("Maliyetler", [[str(v) for v in yeni]])
+        cache_temizle("Maliyetler")
         return "EKLENDİ"
     except Exception as e: return f"HATA: {e}"
 
+# --- PAZARYERİ ARTIMLI SENKRON ---
+# Her senkron her kaynaktan sadece o kaynağın son işaretinden (son görülen güncellenme zamanı) bu yana değişen siparişleri ister;
+# maliyeti geçmişin büyüklüğüne değil yeni sipariş sayısına bağlıdır.
+def _senkron_baglan():
+    os.makedirs(YEREL_VERI_KLASORU, exist_ok=True)
+    con = sqlite3.connect(SENKRON_DB, timeout=30)
+    con.execute("CREATE TABLE IF NOT EXISTS senkron_isaretleri (kaynak TEXT PRIMARY KEY, isaret_ms INTEGER, son_calisma REAL, son_eklenen INTEGER)")
+    return con
+
+def senkron_durumu(kaynak):
+    """Kaynağın son senkron bilgisi: {"isaret_ms", "son_calisma", "son_eklenen"}. Hiç senkron yapılmadıysa None."""
+    with closing(_senkron_baglan()) as con:
+        r = con.execute("SELECT isaret_ms, son_calisma, son_eklenen FROM senkron_isaretleri WHERE kaynak=?", (kaynak,)).fetchone()
+    if not r: return None
+    return {"isaret_ms": r[0], "son_calisma": r[1], "son_eklenen": r[2]}
+
+def _senkron_durumu_yaz(kaynak, isaret_ms, son_eklenen):
+    with closing(_senkron_baglan()) as con, con:
+        con.execute("INSERT OR REPLACE INTO senkron_isaretleri VALUES (?,?,?,?)", (kaynak, isaret_ms, time.time(), son_eklenen))
+
+@st.cache_resource
+def _senkron_kilidi():
+    # Zamanlanmış senkron ile butonun aynı anda çalışıp aynı siparişleri iki kez eklemesini önler
+    return threading.Lock()
+
+def _pazaryeri_getir(adaptor, baslangic_ms, bitis_ms):
+    orders, msg = adaptor.siparisleri_getir(baslangic_ms, bitis_ms, degisiklik_tarihine_gore=True)
+    if orders is None: return None, msg
+    return adaptor.tekillestir(adaptor.normalize(orders)), msg
+
+def pazaryerlerini_senkronize(adaptorler=None):
+    """Ayarlı tüm pazaryerlerini eşzamanlı senkronlar: her kaynak kendi işaretinden (eksi güvenlik payı) bu yana değişen
+    siparişleri çeker (toplam süre en yavaş kaynak kadardır); yeniler ve değişenler birleştirilip tek seferde kaydedilir.
+    Hata veren kaynak diğerlerini durdurmaz, sadece onun işareti ilerlemez. İşaretler ancak satırlar kalıcı kuyruğa
+    yazıldıktan sonra ilerletilir.
+    Dönüş: ({kaynak: {"yeni", "guncellenen"} veya {"hata": mesaj}}, "BAŞARILI") veya (None, hata mesajı)"""
+    kilit = _senkron_kilidi()
+    if not kilit.acquire(blocking=False):
+        return None, "Senkron zaten çalışıyor."
+    try:
+        if adaptorler is None: adaptorler = pazaryeri_adaptorleri()
+        if not adaptorler: return None, "st.secrets içinde ayarlı pazaryeri bulunamadı."
+        simdi_ms = int(time.time() * 1000)
+        isaretler = {}
+        for a in adaptorler:
+            durum = senkron_durumu(a.kaynak.lower())
+            isaretler[a.kaynak] = durum["isaret_ms"] if durum else simdi_ms - PAZARYERI_ILK_SENKRON_GUN * 24 * 3600 * 1000
+        with ThreadPoolExecutor(max_workers=len(adaptorler)) as havuz:
+            isler = {a.kaynak: havuz.submit(_pazaryeri_getir, a, isaretler[a.kaynak] - PAZARYERI_SENKRON_PAYI_SN * 1000, simdi_ms)
+                     for a in adaptorler}
+
+        # Mevcut siparişler sürüm başına bir kez kurulan indeksten bakılır (kuyruktaki satırlar dahil)
+        sonuclar, ayrilanlar = {}, {}
+        for kaynak, f in isler.items():
+            try: kayitlar, msg = f.result()
+            except Exception as e: kayitlar, msg = None, f"Sistem Hatası: {e}"
+            if kayitlar is None: sonuclar[kaynak] = {"hata": msg}
+            else: ayrilanlar[kaynak] = pazaryeri_siparislerini_ayir(kayitlar)
+        pazaryeri_degisikliklerini_kaydet([s for a in ayrilanlar.values() for s in a[0]],
+                                          [k for a in ayrilanlar.values() for k in a[1]],
+                                          [h for a in ayrilanlar.values() for h in a[2]])
+
+        for kaynak, (satirlar, _, degisen, _, bekleyen) in ayrilanlar.items():
+            # Başarılı çekimde (boş dönse de) işaret pencerenin sonuna ilerler; bir sonraki senkron buradan güvenlik payı
+            # kadar geriden başlar. Kuyrukta olduğu için karşılaştırılamayan sipariş varsa ilerletilmez, onlara tekrar bakılır
+            yeni_isaret = isaretler[kaynak] if bekleyen else simdi_ms
+            _senkron_durumu_yaz(kaynak.lower(), yeni_isaret, len(satirlar))
+            sonuclar[kaynak] = {"yeni": len(satirlar), "guncellenen": len({no for no, _, _ in degisen})}
+        return sonuclar, "BAŞARILI"
+    except Exception as e:
+        return None, f"Sistem Hatası: {e}"
+    finally:
+        kilit.release()
+
+@st.cache_resource
+def _pazaryeri_otomatik_senkron(dakika):
+    """secrets'ta [pazaryeri] (eski ayarlarda [trendyol]) otomatik_senkron_dk verilmişse senkronu bu aralıkla çalıştıran arka plan iş parçacığı."""
+    def calis():
+        sheets_zamanlayici().arka_plan_olarak_isaretle()
+        while True:
+            time.sleep(dakika * 60)
+            try:
+                sonuc, msg = pazaryerlerini_senkronize()
+                if msg != "BAŞARILI": print("Pazaryeri otomatik senkron:", msg)
+                for kaynak, r in (sonuc or {}).items():
+                    if "hata" in r: print(f"Pazaryeri otomatik senkron ({kaynak}):", r["hata"])
+            except Exception as e: print("Pazaryeri otomatik senkron hatası:", e)
+    t = threading.Thread(target=calis, name="pazaryeri-senkron", daemon=True)
+    t.start()
+    return t
+
 # --- ÜRÜNLERİ GETİR ---
 def get_urun_resimleri():
     sabitler = {
@@ -774,8 +1783,6 @@ def get_urun_resimleri():
             sabitler[u["Urun Adi"]] = u["Resim Dosya Adi"]
     return sabitler
 
-GUNCEL_URUNLER = get_urun_resimleri()
-
 def get_maliyet_dict():
     maliyetler = verileri_getir("Maliyetler")
     m_dict = {}
@@ -786,47 +1793,52 @@ def get_maliyet_dict():
             if u_id: m_dict[u_id] = cost
     return m_dict
 
+# --- PDF GÖRSELLERİ ---
+@st.cache_resource
+def _urun_gorseli_onbellegi():
+    return threading.Lock(), {}
+
+def urun_gorseli(yol):
+    """Ürün resminin fiş için küçültülmüş (300x220) JPEG halini FPDF'nin görsel bilgi sözlüğü olarak döner.
+    Süreç boyunca (yol, değişiklik zamanı) anahtarıyla bellekte tutulur; dosya değişince yeniden hazırlanır."""
+    mtime = os.path.getmtime(yol)
+    kilit, onbellek = _urun_gorseli_onbellegi()
+    with kilit:
+        info = onbellek.get((yol, mtime))
+    if info: return info
+    img = Image.open(yol).convert('RGB')
+    img.thumbnail((300, 220))
+    tampon = io.BytesIO()
+    img.save(tampon, format='JPEG')
+    info = {'w': img.width, 'h': img.height, 'cs': 'DeviceRGB', 'bpc': 8, 'f': 'DCTDecode', 'data': tampon.getvalue()}
+    with kilit:
+        # Aynı dosyanın eski sürümleri atılır
+        for anahtar in [k for k in onbellek if k[0] == yol]: del onbellek[anahtar]
+        onbellek[(yol, mtime)] = info
+    return info
+
+def pdf_gorsel_koy(pdf, yol, x, y, w):
+    """pdf.image'in geçici dosya kullanmayan karşılığı: önbellekteki görsel bilgisi belgeye doğrudan eklenir,
+    FPDF dosya okumaz. Belge çıktı alırken 'data'yı sildiği için belgeye kopyası verilir."""
+    info = urun_gorseli(yol)
+    if yol not in pdf.images:
+        pdf.images[yol] = dict(info, i=len(pdf.images) + 1)
+    pdf.image(yol, x=x, y=y, w=w)
+
 # --- PDF OLUŞTURMA ---
 def create_pdf(s, urun_dict):
-    pdf = FPDF(format=(100, 150))
+    pdf = EtiketPDF()
     pdf.add_page()
-    pdf.set_auto_page_break(auto=True, margin=5)
-    
-    # Arial fontunun kalın, italik versiyonlarını da eklememiz gerekiyor (bold, italic için)
-    # Eğer font dosyaları yoksa fpdf hata vermez ama set_font('ArialTR', 'B') çalışmaz
-    # Bu yüzden sadece normal metin için ArialTR kullanıp, diğerleri için fpdf standart fontlarını kullanabilir veya hepsini ArialTR (normal) yapabiliriz
-    try:
-        pdf.add_font('ArialTR', '', 'arial.ttf', uni=True)
-        pdf.add_font('ArialTR', 'B', 'arial.ttf', uni=True)
-        pdf.add_font('ArialTR', 'I', 'arial.ttf', uni=True)
-        pdf.set_font('ArialTR', '', 10)
-    except Exception as e:
-        print("Font yuklenemedi:", e)
-        pdf.set_font("Arial", size=10)
+    pdf.fis_basligi(s.get('Siparis No'), s.get('Tarih'))
+    tr, set_ft = pdf.tr, pdf.set_ft
 
-    pdf.set_fill_color(40, 40, 40)
-    pdf.rect(0, 0, 100, 20, 'F')
-    
-    pdf.set_text_color(255, 255, 255)
-    pdf.set_font_size(14)
-    pdf.text(5, 13, "MINIVAGON")
-    
-    pdf.set_font_size(8)
-    pdf.set_text_color(200, 200, 200)
-    pdf.text(55, 8, f"Siparis No: #{s.get('Siparis No')}")
-    pdf.text(55, 14, f"Tarih: {s.get('Tarih')}")
-    
     def resim_koy(u_adi, x_pos):
         if u_adi in urun_dict:
             dosya_adi = urun_dict[u_adi]
             full_path = os.path.join(RESIM_KLASORU, dosya_adi)
             if os.path.exists(full_path):
                 try:
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp:
-                        img = Image.open(full_path).convert('RGB')
-                        img.thumbnail((300, 220))
-                        img.save(tmp.name)
-                        pdf.image(tmp.name, x=x_pos, y=22, w=40)
+                    pdf_gorsel_koy(pdf, full_path, x=x_pos, y=22, w=40)
                 except Exception as e:
                     print("Resim hatasi:", e)
 
@@ -840,20 +1852,7 @@ def create_pdf(s, urun_dict):
     pdf.set_text_color(0, 0, 0)
     pdf.set_font_size(10)
 
-    # Eğer font yüklenmişse (fpdf anahtarları küçük harfle tutar) fpdf utf-8 destekler, çeviriye gerek kalmaz.
-    # Eğer yüklenememişse (fallback Arial) türkçe karakterleri düzeltmemiz gerekir ki pdf çökmesin.
-    def tr(t):
-        if not t: return ""
-        if 'arialtr' in pdf.fonts: return str(t)
-        return str(t).replace("ğ","g").replace("Ğ","G").replace("ş","s").replace("Ş","S").replace("İ","I").replace("ı","i").encode('latin-1','replace').decode('latin-1')
-
-    def set_ft(style='', size=10):
-        if 'arialtr' in pdf.fonts: pdf.set_font('ArialTR', style, size)
-        else: pdf.set_font('Arial', style, size)
-
-    pdf.set_fill_color(240, 240, 240)
-    pdf.cell(0, 6, tr("  ÜRÜN DETAYLARI"), ln=1, fill=True)
-    pdf.ln(1)
+    pdf.bolum_basligi("ÜRÜN DETAYLARI", 6)
 
     # ÜRÜN 1
     set_ft('B', 10)
@@ -908,9 +1907,7 @@ def create_pdf(s, urun_dict):
         
     pdf.set_y(y_start + 16)
 
-    pdf.set_fill_color(240, 240, 240)
-    pdf.cell(0, 6, tr("  MÜŞTERİ BİLGİLERİ"), ln=1, fill=True)
-    pdf.ln(1)
+    pdf.bolum_basligi("MÜŞTERİ BİLGİLERİ", 6)
     
     set_ft('B', 9)
     pdf.multi_cell(0, 4, tr(f"Müşteri: {s.get('Müşteri')}"))
@@ -934,298 +1931,114 @@ def create_pdf(s, urun_dict):
         pdf.set_text_color(0, 0, 0)
         set_ft('', 9)
 
-    return pdf.output(dest='S').encode('latin-1')
-
-
-
-def create_pazaryeri_bulk_pdf(siparisler, urun_dict):
-    pdf = FPDF(format=(100, 150))
-    pdf.set_auto_page_break(auto=True, margin=5)
-    
-    try:
-        pdf.add_font('ArialTR', '', 'arial.ttf', uni=True)
-        pdf.add_font('ArialTR', 'B', 'arial.ttf', uni=True)
-        pdf.add_font('ArialTR', 'I', 'arial.ttf', uni=True)
-    except Exception as e:
-        print("Font yuklenemedi (bulk):", e)
-        pass
-
-    def tr(t):
-        if not t: return ""
-        if 'arialtr' in pdf.fonts: return str(t)
-        return str(t).replace("ğ","g").replace("Ğ","G").replace("ş","s").replace("Ş","S").replace("İ","I").replace("ı","i").encode('latin-1','replace').decode('latin-1')
-
-    def set_ft(style='', size=10):
-        if 'arialtr' in pdf.fonts: pdf.set_font('ArialTR', style, size)
-        else: pdf.set_font('Arial', style, size)
-
-    import tempfile
-    import os
-    import requests
-
-    for s in siparisler:
-        pdf.add_page()
-        
-        # Header
-        pdf.set_fill_color(40, 40, 40)
-        pdf.rect(0, 0, 100, 15, 'F')
-        pdf.set_text_color(255, 255, 255)
-        set_ft('B', 12)
-        pdf.text(5, 10, "MINIVAGON - PAZARYERI KART")
-        
-        pdf.set_font_size(8)
-        pdf.set_text_color(200, 200, 200)
-        pdf.text(60, 10, f"Tarih: {s.get('Tarih', '')}")
-        pdf.set_text_color(0, 0, 0)
-        
-        kargo_takip = str(s.get('Kargo Takip No', '')).strip()
-        if 'E' in kargo_takip.upper():
-            try:
-                val = float(kargo_takip.upper().replace(',', '.'))
-                kargo_takip = f"{val:.0f}"
-            except: pass
-        kargo_takip = ''.join(c for c in kargo_takip if c.isalnum())
-
-        pazaryeri_sip_no = str(s.get('Pazaryeri Siparis No', s.get('Siparis No', ''))).strip()
-        if 'E' in pazaryeri_sip_no.upper():
-            try: pazaryeri_sip_no = str(int(float(pazaryeri_sip_no.upper().replace(',', '.'))))
-            except: pass
-
-        pdf.set_y(18)
-        set_ft('B', 10)
-        pdf.cell(0, 5, tr("Sipariş No: " + pazaryeri_sip_no), ln=1)
-
-        pdf.ln(2)
-
-        # Musteri
-        pdf.set_fill_color(240, 240, 240)
-        set_ft('', 9)
-        pdf.cell(0, 5, tr("  MÜŞTERİ BİLGİLERİ"), ln=1, fill=True)
-        pdf.ln(1)
-        
-        set_ft('B', 9)
-        pdf.multi_cell(0, 4, tr(f"Müşteri: {s.get('Müşteri', '')}"))
-        set_ft('', 9)
-        pdf.multi_cell(0, 4, tr(f"Telefon: {s.get('Telefon', '')}"))
-
-        il = str(s.get('İl', '')).strip()
-        ilce = str(s.get('İlçe', '')).strip()
-        adres_metni = str(s.get('Adres', '')).strip()
-        if il and ilce:
-            adres_metni = f"{adres_metni}\n{ilce.upper()} / {il.upper()}"
-
-        pdf.multi_cell(0, 4, tr(f"Adres: {adres_metni}"))
-        
-        pdf.ln(3)
-
-        # Urunler
-        pdf.set_fill_color(240, 240, 240)
-        set_ft('', 9)
-        pdf.cell(0, 5, tr("  ÜRÜN DETAYLARI"), ln=1, fill=True)
-        pdf.ln(1)
-
-        set_ft('B', 9)
-        pdf.multi_cell(0, 4, tr(f"1) {s.get('Ürün 1', '')} ({s.get('Adet 1', '')} Adet)"))
-        if s.get('Ürün 2'):
-            pdf.ln(1)
-            pdf.multi_cell(0, 4, tr(f"2) {s.get('Ürün 2', '')} ({s.get('Adet 2', '')} Adet)"))
-
-        # Barcode
-        if kargo_takip:
-            pdf.ln(10)
-            set_ft('', 9)
-            pdf.cell(0, 4, tr(f"Kargo Takip No: {kargo_takip}"), ln=1, align='C')
-            pdf.ln(2)
-
-            try:
-                api_url = f"https://bwipjs-api.metafloor.com/?bcid=code128&text={kargo_takip}&scale=3&height=12&includetext=false"
-                response = requests.get(api_url, timeout=5)
-                
-                if response.status_code == 200:
-                    fd, tmp_name = tempfile.mkstemp(suffix=".png")
-                    os.close(fd)
-                    with open(tmp_name, 'wb') as f:
-                        f.write(response.content)
-                        
-                    barkod_w = 80
-                    barkod_h = 15
-                    x_pos = (100 - barkod_w) / 2
-                    
-                    pdf.image(tmp_name, x=x_pos, y=pdf.get_y(), w=barkod_w, h=barkod_h)
-                    pdf.set_y(pdf.get_y() + barkod_h + 5)
-                    try: os.remove(tmp_name)
-                    except: pass
-                else:
-                    pdf.code39(kargo_takip, x=10, y=pdf.get_y(), w=1.5, h=15)
-                    pdf.set_y(pdf.get_y() + 20)
-            except Exception as e:
-                print("Barkod olusturulamadi (bulk):", e)
-                try:
-                    pdf.code39(kargo_takip, x=10, y=pdf.get_y(), w=1.5, h=15)
-                    pdf.set_y(pdf.get_y() + 20)
-                except: pass
-
-    return pdf.output(dest='S').encode('latin-1')
+    return pdf.cikti()
 
-def create_pazaryeri_pdf(s, urun_dict):
-    pdf = FPDF(format=(100, 150))
-    pdf.add_page()
-    pdf.set_auto_page_break(auto=True, margin=5)
-    
-    try:
-        pdf.add_font('ArialTR', '', 'arial.ttf', uni=True)
-        pdf.add_font('ArialTR', 'B', 'arial.ttf', uni=True)
-        pdf.add_font('ArialTR', 'I', 'arial.ttf', uni=True)
-        pdf.set_font('ArialTR', '', 10)
-    except Exception as e:
-        print("Font yuklenemedi:", e)
-        pdf.set_font("Arial", size=10)
-
-    def tr(t):
-        if not t: return ""
-        if 'arialtr' in pdf.fonts: return str(t)
-        return str(t).replace("ğ","g").replace("Ğ","G").replace("ş","s").replace("Ş","S").replace("İ","I").replace("ı","i").encode('latin-1','replace').decode('latin-1')
-
-    def set_ft(style='', size=10):
-        if 'arialtr' in pdf.fonts: pdf.set_font('ArialTR', style, size)
-        else: pdf.set_font('Arial', style, size)
-
-    # Header
-    pdf.set_fill_color(40, 40, 40)
-    pdf.rect(0, 0, 100, 15, 'F')
-    pdf.set_text_color(255, 255, 255)
-    set_ft('B', 12)
-    pdf.text(5, 10, "MINIVAGON - PAZARYERI KART")
-    
-    pdf.set_font_size(8)
-    pdf.set_text_color(200, 200, 200)
-    pdf.text(60, 10, f"Tarih: {s.get('Tarih')}")
-    pdf.set_text_color(0, 0, 0)
-    
-    kargo_takip = str(s.get('Kargo Takip No', '')).strip()
-    
+def pazaryeri_toplu_belge(siparisler, ilerleme=None):
+    """Siparişlerin kartlarını sırayla tek EtiketPDF'te toplar (bkz. etiket.pazaryeri_kartlari).
+    ilerleme(biten, toplam) her parça bittiğinde çağrılır."""
     # Bilimsel gösterim varsa düzelt. Örn: 7.26003E+15
-    # Not: Pandas float olarak okuduysa Excel'den hassasiyet kaybolmuş olabilir.
+    # Not: Pandas float olarak okuduysa Excel'den hassasiyet kaybolmuş olabilir (7260030000000000 gibi).
     # Bu yüzden numaranın tam metin olarak girilmesi/okunması tavsiye edilir.
-    if 'E' in kargo_takip.upper():
-        try:
-            # Sadece E'li formatı sayıya çevirmeyi dener.
-            # Ancak çok haneli sayılarda son rakamlar sıfır olabilir (7260030000000000 gibi).
-            # Excel'den metin olarak çekmek en doğrusudur.
-            val = float(kargo_takip.upper().replace(',', '.'))
-            kargo_takip = f"{val:.0f}"
-        except:
-            pass
-    # Virgül veya nokta ile girilmiş format bozuklukları varsa temizle (kargo takip numarasında harf ve rakam olur)
-    kargo_takip = ''.join(c for c in kargo_takip if c.isalnum())
+    return pazaryeri_kartlari([dict(s, **{
+        'Kargo Takip No': siparis_no_normalize(s.get('Kargo Takip No', '')),
+        'Pazaryeri Siparis No': siparis_no_normalize(s.get('Pazaryeri Siparis No', s.get('Siparis No', ''))),
+    }) for s in siparisler], ilerleme)
 
-    kargo_firmasi = str(s.get('Kargo Firması', 'TRENDYOL EXPRESS')).strip()
-    if not kargo_firmasi:
-        kargo_firmasi = "TRENDYOL EXPRESS"
-
-    pazaryeri_sip_no = str(s.get('Pazaryeri Siparis No', s.get('Siparis No', ''))).strip()
-    if 'E' in pazaryeri_sip_no.upper():
-        try:
-            pazaryeri_sip_no = str(int(float(pazaryeri_sip_no.upper().replace(',', '.'))))
-        except:
-            pass
-
-    pdf.set_y(18)
-    set_ft('B', 10)
-    pdf.cell(0, 5, tr("Sipariş No: " + pazaryeri_sip_no), ln=1)
-
-    pdf.ln(2)
-
-    # Musteri
-    pdf.set_fill_color(240, 240, 240)
-    set_ft('', 9)
-    pdf.cell(0, 5, tr("  MÜŞTERİ BİLGİLERİ"), ln=1, fill=True)
-    pdf.ln(1)
-    
-    set_ft('B', 9)
-    pdf.multi_cell(0, 4, tr(f"Müşteri: {s.get('Müşteri')}"))
-    set_ft('', 9)
-    pdf.multi_cell(0, 4, tr(f"Telefon: {s.get('Telefon')}"))
-
-    il = str(s.get('İl', '')).strip()
-    ilce = str(s.get('İlçe', '')).strip()
-    adres_metni = str(s.get('Adres', '')).strip()
-    if il and ilce:
-        adres_metni = f"{adres_metni}\n{ilce.upper()} / {il.upper()}"
-
-    pdf.multi_cell(0, 4, tr(f"Adres: {adres_metni}"))
-    
-    pdf.ln(3)
-
-    # Urunler
-    pdf.set_fill_color(240, 240, 240)
-    set_ft('', 9)
-    pdf.cell(0, 5, tr("  ÜRÜN DETAYLARI"), ln=1, fill=True)
-    pdf.ln(1)
-
-    set_ft('B', 9)
-    pdf.multi_cell(0, 4, tr(f"1) {s.get('Ürün 1')} ({s.get('Adet 1')} Adet)"))
-    if s.get('Ürün 2'):
-        pdf.ln(1)
-        pdf.multi_cell(0, 4, tr(f"2) {s.get('Ürün 2')} ({s.get('Adet 2')} Adet)"))
-
-    # Barcode
-    if kargo_takip:
-        pdf.ln(10)
-        
-        # Kargo Firmasi kaldirildi, sadece Kargo Takip No yaziyoruz
-        set_ft('', 9)
-        pdf.cell(0, 4, tr(f"Kargo Takip No: {kargo_takip}"), ln=1, align='C')
-        pdf.ln(2)
+def create_pazaryeri_bulk_pdf(siparisler, urun_dict, ilerleme=None):
+    return pazaryeri_toplu_belge(siparisler, ilerleme).cikti()
 
+def create_pazaryeri_pdf(s, urun_dict):
+    return create_pazaryeri_bulk_pdf([s], urun_dict)
+
+# --- TOPLU ETİKET ÇIKTISI ---
+# Toplu yazdırmada belge session_state'te bayt olarak değil EtiketCiktisi olarak bekler: bütçeyi aşan belge doğrudan
+# spool dosyasına yazılır (encode kopyası parça parça yapılır) ve indirme butonuna diskten okuyan bir fonksiyon verilir.
+def _spool_sil(yol):
+    try: os.remove(yol)
+    except FileNotFoundError: pass
+
+def _eski_spoollari_temizle():
+    """Önceki süreçlerden (çökme / yeniden başlatma) sahipsiz kalmış spool dosyalarını siler."""
+    sinir = time.time() - ETIKET_SPOOL_OMUR_SN
+    for ad in os.listdir(ETIKET_SPOOL_KLASORU):
+        yol = os.path.join(ETIKET_SPOOL_KLASORU, ad)
         try:
-            import tempfile
-            import os
-            import requests
-            
-            # API ile en standart ve net barkodu olusturuyoruz (yuksekligi dusuruldu)
-            api_url = f"https://bwipjs-api.metafloor.com/?bcid=code128&text={kargo_takip}&scale=3&height=12&includetext=false"
-            response = requests.get(api_url, timeout=5)
-            
-            if response.status_code == 200:
-                fd, tmp_name = tempfile.mkstemp(suffix=".png")
-                os.close(fd)
-                
-                with open(tmp_name, 'wb') as f:
-                    f.write(response.content)
-                    
-                barkod_w = 80
-                # Burada resmin yuksekligini de belirleyerek dikeyde uzamasini onluyoruz
-                barkod_h = 15
-                x_pos = (100 - barkod_w) / 2
-                
-                pdf.image(tmp_name, x=x_pos, y=pdf.get_y(), w=barkod_w, h=barkod_h)
-                pdf.set_y(pdf.get_y() + barkod_h + 5)
-                
-                try:
-                    os.remove(tmp_name)
-                except:
-                    pass
-            else:
-                # FPDF'nin kendi barkoduna fallback
-                pdf.code39(kargo_takip, x=10, y=pdf.get_y(), w=1.5, h=15)
-                pdf.set_y(pdf.get_y() + 20)
-                
-        except Exception as e:
-            print("Barkod olusturulamadi:", e)
-            try:
-                pdf.code39(kargo_takip, x=10, y=pdf.get_y(), w=1.5, h=15)
-                pdf.set_y(pdf.get_y() + 20)
-            except:
-                pass
-
-    return pdf.output(dest='S').encode('latin-1')
-
+            if os.path.getmtime(yol) < sinir: os.remove(yol)
+        except OSError: pass
+
+class EtiketCiktisi:
+    """Oturumda onay bekleyen toplu etiket PDF'i. ETIKET_OTURUM_BELLEK_BUTCESI'ne sığan belge bellekte, daha büyüğü
+    spool dosyasında tutulur. Dosya kapat() ile ya da nesne toplandığında (session_state'ten silinmesi, oturumun
+    sona ermesi) silinir."""
+
+    def __init__(self, pdf):
+        pdf.close()
+        self.boyut = len(pdf.buffer)
+        self.veri, self.yol = None, None
+        if self.boyut <= ETIKET_OTURUM_BELLEK_BUTCESI:
+            self.veri = pdf.buffer.encode('latin-1')
+            return
+        os.makedirs(ETIKET_SPOOL_KLASORU, exist_ok=True)
+        _eski_spoollari_temizle()
+        self.yol = os.path.join(ETIKET_SPOOL_KLASORU, f"{uuid.uuid4().hex}.pdf")
+        self._sil = weakref.finalize(self, _spool_sil, self.yol)
+        parca = 1024 * 1024
+        with open(self.yol, 'wb') as f:
+            for i in range(0, self.boyut, parca):
+                f.write(pdf.buffer[i:i + parca].encode('latin-1'))
+
+    def mevcut_mu(self):
+        return self.veri is not None or os.path.exists(self.yol)
+
+    def indirme_verisi(self):
+        """download_button'a verilecek veri: bellekteki bayt ya da tıklanınca spool dosyasını okuyan fonksiyon."""
+        if self.veri is not None: return self.veri
+        yol = self.yol
+        def oku():
+            with open(yol, 'rb') as f:
+                return f.read()
+        return oku
+
+    def kapat(self):
+        if self.yol: self._sil()
 
 # --- MENÜ ---
 menu_options = ["📦 Sipariş Girişi", "📋 Sipariş Listesi", "🧾 Fatura Takibi", "🧾 Alış ve Tedarik", "📊 Raporlar", "💰 Cari Hesaplar", "📉 Maliyet Yönetimi", "➕ Ürün Yönetimi"]
 menu = st.sidebar.radio("Menü", menu_options)
 
+_yazma_kuyrugu_isleyicisi()
+pz_senkron_dk = st.secrets.get("pazaryeri", {}).get("otomatik_senkron_dk") or st.secrets.get("trendyol", {}).get("otomatik_senkron_dk")
+if pz_senkron_dk: _pazaryeri_otomatik_senkron(int(pz_senkron_dk))
+bekleyen_kayit = len(kuyruktaki_satirlar())
+if bekleyen_kayit:
+    st.sidebar.caption(f"⏳ {bekleyen_kayit} kayıt Sheets'e aktarılmayı bekliyor")
+if isinstance(depo(), SqliteDeposu):
+    st.sidebar.caption("💾 Yerel depo (SQLite) kullanılıyor")
+else:
+    sheets_metrik = sheets_zamanlayici().metrik
+    st.sidebar.caption(f"Sheets API: {sheets_metrik['cagri']} çağrı · {sheets_metrik['kisitlanan']} kısıtlandı · {sheets_metrik['yeniden_deneme']} yeniden deneme")
+http_kilit, http_metrik = http_metrikleri()
+with http_kilit:
+    http_ozet = [f"{ad}: {m['cagri']} çağrı · ort. {m['toplam_sn'] / m['cagri'] * 1000:.0f} ms · en uzun {m['en_uzun_sn'] * 1000:.0f} ms · {m['hata']} hata"
+                 for ad, m in sorted(http_metrik.items())]
+for satir in http_ozet:
+    st.sidebar.caption(satir)
+
+# Her ekranın okuduğu çalışma sayfaları; hepsi tek istekte önceden çekilir
+SAYFA_VERI_IHTIYACI = {
+    "📦 Sipariş Girişi": ["Siparisler"],
+    "📋 Sipariş Listesi": ["Siparisler", "PazaryeriSiparisleri"],
+    "🧾 Fatura Takibi": ["Siparisler"],
+    "🧾 Alış ve Tedarik": ["Cariler", "Maliyetler", "Siparisler", "SiparisSatirlari"],
+    "📊 Raporlar": ["Siparisler", "PazaryeriSiparisleri", "SiparisSatirlari"],
+    "💰 Cari Hesaplar": ["Cariler"],
+    "📉 Maliyet Yönetimi": ["Maliyetler"],
+    "➕ Ürün Yönetimi": [],
+}
+verileri_toplu_getir(["Urunler"] + SAYFA_VERI_IHTIYACI.get(menu, []))
+
+GUNCEL_URUNLER = get_urun_resimleri()
+
 # 1. SİPARİŞ GİRİŞİ
 if menu == "📦 Sipariş Girişi":
     st.header("Yeni Sipariş Ekle")
@@ -1287,7 +2100,7 @@ if menu == "📦 Sipariş Girişi":
                     # Sütun kaymasını önlemek için İl ve İlçe'yi en sona ekliyoruz
                     satir = [yeni_no, tarih, durum, ad, tel, tc, mail, u1, a1, i1, u2, a2, i2, tutar, odeme, kaynak, adres, notlar, fatura, tedarik, il.upper(), ilce.upper()]
                     siparis_ekle(satir)
-                    st.success(f"✅ Sipariş #{yeni_no} Kaydedildi!")
+                    st.success(f"✅ Sipariş #{yeni_no} Kaydedildi! (Sheets'e aktarılmak üzere sıraya alındı)")
                 except Exception as e: st.error(f"Hata: {e}")
 
 # 2. SİPARİŞ LİSTESİ
@@ -1328,6 +2141,19 @@ elif menu == "📋 Sipariş Listesi":
         st.subheader("Trendyol ve Diğer Pazaryeri Siparişleri")
 
         c_p1, c_p2 = st.columns([2, 1])
+        with c_p1:
+            if st.button("⚡ Tüm Pazaryerlerini Senkronize Et"):
+                with st.spinner("Son senkrondan bu yana değişen siparişler tüm pazaryerlerinden çekiliyor..."):
+                    sonuc, msg = pazaryerlerini_senkronize()
+                if msg == "BAŞARILI":
+                    for kaynak, r in sonuc.items():
+                        if "hata" in r: st.error(f"{kaynak}: {r['hata']}")
+                        else: st.success(f"{kaynak}: {r['yeni']} yeni sipariş sıraya alındı, {r['guncellenen']} siparişin durumu güncellendi.")
+                else: st.error(msg)
+            for adaptor in PAZARYERI_ADAPTORLERI:
+                pz_durum = senkron_durumu(adaptor.kaynak.lower())
+                if pz_durum:
+                    st.caption(f"{adaptor.kaynak} son senkron: {datetime.fromtimestamp(pz_durum['son_calisma'], tz=pytz.timezone('Europe/Istanbul')).strftime('%d.%m.%Y %H:%M')} · {pz_durum['son_eklenen']} yeni sipariş")
         with c_p2:
             if st.button("🔄 Trendyol Siparişlerini Çek", use_container_width=True):
                 st.session_state["ty_cekildi"] = True
@@ -1350,7 +2176,11 @@ elif menu == "📋 Sipariş Listesi":
                         # Make end date the very end of the selected day
                         bit_ms = int(datetime.combine(bit_tarih, datetime.max.time()).timestamp() * 1000)
 
-                        ty_orders, msg = fetch_trendyol_orders(start_date_ms=bas_ms, end_date_ms=bit_ms)
+                        ilerleme_cubugu = st.progress(0.0)
+                        ty_orders, msg = fetch_trendyol_orders(st.secrets.get("trendyol"), http_istek,
+                                                               start_date_ms=bas_ms, end_date_ms=bit_ms,
+                                                               ilerleme=lambda a, t: ilerleme_cubugu.progress(a / t, text=f"{a}/{t} sayfa alındı"))
+                        ilerleme_cubugu.empty()
                         st.session_state["ty_orders_temp"] = ty_orders
                         st.session_state["ty_msg_temp"] = msg
 
@@ -1358,19 +2188,21 @@ elif menu == "📋 Sipariş Listesi":
                 msg = st.session_state.get("ty_msg_temp")
 
                 if ty_orders is not None:
-                    yeni_siparis_satirlari = format_trendyol_orders(ty_orders, df_pz if not df_pz.empty else None)
-                    if not yeni_siparis_satirlari:
-                        st.info("Yeni bir Trendyol siparişi bulunamadı (Hepsi zaten sistemde olabilir).")
+                    yeni_siparis_satirlari, yeni_kalemler, degisen_hucreler, degismeyen, _ = trendyol_siparislerini_ayir(ty_orders)
+                    guncellenecek = len({no for no, _, _ in degisen_hucreler})
+                    if not yeni_siparis_satirlari and not degisen_hucreler:
+                        st.info(f"Yeni veya değişen Trendyol siparişi bulunamadı ({degismeyen} sipariş zaten güncel).")
                     else:
-                        st.success(f"{len(yeni_siparis_satirlari)} adet yeni Trendyol siparişi bulundu!")
+                        st.success(f"{len(yeni_siparis_satirlari)} adet yeni Trendyol siparişi bulundu, {guncellenecek} siparişin durumu/kargo bilgisi değişmiş.")
 
-                        df_yeni = pd.DataFrame(yeni_siparis_satirlari, columns=["Pazaryeri Siparis No","Tarih","Durum","Müşteri","Telefon","TC No","Mail","Ürün 1","Adet 1","İsim 1","Ürün 2","Adet 2","İsim 2","Tutar","Ödeme","Kaynak","Adres","Kargo Takip No","Fatura Durumu","Tedarik Durumu", "İl", "İlçe", "Kargo Firması", "Yazdırıldı Durumu"])
-                        st.dataframe(df_yeni[["Pazaryeri Siparis No", "Müşteri", "Ürün 1", "Adet 1", "Tutar", "Tarih", "Durum"]], use_container_width=True)
+                        if yeni_siparis_satirlari:
+                            df_yeni = pd.DataFrame(yeni_siparis_satirlari, columns=SAYFA_BASLIKLARI["PazaryeriSiparisleri"])
+                            st.dataframe(df_yeni[["Pazaryeri Siparis No", "Müşteri", "Ürün 1", "Adet 1", "Tutar", "Tarih", "Durum"]], use_container_width=True)
 
                         if st.button("✅ Listeyi Pazaryeri Tablosuna Kaydet", type="primary"):
                             try:
-                                pazaryeri_siparis_toplu_ekle(yeni_siparis_satirlari)
-                                st.success(f"{len(yeni_siparis_satirlari)} yeni sipariş Pazaryeri veritabanına başarıyla kaydedildi!")
+                                pazaryeri_degisikliklerini_kaydet(yeni_siparis_satirlari, yeni_kalemler, degisen_hucreler)
+                                st.success(f"{len(yeni_siparis_satirlari)} yeni sipariş kaydedildi, {guncellenecek} sipariş güncellendi!")
                                 st.session_state["ty_cekildi"] = False
                                 if "ty_orders_temp" in st.session_state:
                                     del st.session_state["ty_orders_temp"]
@@ -1430,15 +2262,23 @@ elif menu == "📋 Sipariş Listesi":
                                 for s in sip_listesi:
                                     s['Siparis No'] = s.get('Pazaryeri Siparis No', '')
                                     
-                                pdf_data = create_pazaryeri_bulk_pdf(sip_listesi, GUNCEL_URUNLER)
-                                st.session_state['bulk_pdf_data'] = pdf_data
+                                pdf_ilerleme = st.progress(0.0, text=f"Etiketler çiziliyor... (0/{len(sip_listesi)})")
+                                belge = pazaryeri_toplu_belge(sip_listesi,
+                                                              ilerleme=lambda a, t: pdf_ilerleme.progress(a / t, text=f"Etiketler çiziliyor... ({a}/{t})"))
+                                pdf_ilerleme.empty()
+                                if st.session_state.get('bulk_pdf_data'): st.session_state['bulk_pdf_data'].kapat()
+                                st.session_state['bulk_pdf_data'] = EtiketCiktisi(belge)
+                                del belge
                                 st.session_state['bulk_pdf_siparis_nolar'] = secili_siparisler['Pazaryeri Siparis No'].astype(str).tolist()
                                 st.success("PDF hazır! Aşağıdan indirebilirsiniz.")
 
+                        if st.session_state.get('bulk_pdf_data') and not st.session_state['bulk_pdf_data'].mevcut_mu():
+                            del st.session_state['bulk_pdf_data']
+                            st.warning("Oluşturulan PDF artık bulunamadı, lütfen tekrar oluşturun.")
                         if st.session_state.get('bulk_pdf_data'):
                             st.download_button(
                                 label="📥 Oluşturulan PDF'i İndir",
-                                data=st.session_state['bulk_pdf_data'],
+                                data=st.session_state['bulk_pdf_data'].indirme_verisi(),
                                 file_name=f"Pazaryeri_Toplu_{simdi().strftime('%Y%m%d_%H%M')}.pdf",
                                 mime="application/pdf",
                                 type="primary"
@@ -1446,11 +2286,14 @@ elif menu == "📋 Sipariş Listesi":
                             
                             # İndir butonunun ardından durum güncelleme butonu
                             if st.button("✅ İndirdim, 'Yazdırıldı' Olarak İşaretle"):
-                                update_yazdirildi_durumu(st.session_state['bulk_pdf_siparis_nolar'])
-                                del st.session_state['bulk_pdf_data']
-                                del st.session_state['bulk_pdf_siparis_nolar']
-                                st.success("Durumlar güncellendi!")
-                                st.rerun()
+                                sonuc = update_yazdirildi_durumu(st.session_state['bulk_pdf_siparis_nolar'])
+                                if sonuc == "BAŞARILI":
+                                    st.session_state['bulk_pdf_data'].kapat()
+                                    del st.session_state['bulk_pdf_data']
+                                    del st.session_state['bulk_pdf_siparis_nolar']
+                                    st.success("Durumlar güncellendi!")
+                                    st.rerun()
+                                else: st.error(sonuc)
 
             with tab_yazdirilanlar:
                 df_yazdirilanlar = df_pz[df_pz['Yazdırıldı Durumu'] == 'YAZDIRILDI']
@@ -1483,10 +2326,12 @@ elif menu == "📋 Sipariş Listesi":
 elif menu == "🧾 Fatura Takibi":
     st.header("Müşteri Fatura Yönetimi")
     try:
-        raw_data = verileri_getir("Siparisler")
-        if raw_data:
-            df = pd.DataFrame(raw_data)
-            df['Tutar_float'] = df['Tutar'].apply(lambda x: safe_float(x))
+        # Önceki (yarıda kalmış olabilecek) kesimlerden kalan, Sheets'e henüz işlenmemiş faturalar
+        uzlasan, uzlasma_msg = fatura_gunlugunu_uzlastir()
+        if uzlasan: st.info(f"{uzlasan} siparişin kesilmiş faturası kayıtlara işlendi.")
+        elif uzlasma_msg != "BAŞARILI": st.warning(f"Fatura günlüğü işlenemedi: {uzlasma_msg}")
+        df = tablo_getir("Siparisler")
+        if not df.empty:
             if "Fatura Durumu" not in df.columns: st.error("Veritabanında 'Fatura Durumu' sütunu bulunamadı.")
             else:
                 tab1, tab2 = st.tabs(["🔴 Kesilecekler", "🟢 Kesilenler"])
@@ -1509,38 +2354,27 @@ elif menu == "🧾 Fatura Takibi":
                                         st.rerun()
                                     else: st.error(sonuc)
                         with col_f2:
+                            belirsizse_de = st.checkbox("Sonucu belirsiz kalanları yeniden gönder", help="Önceki kesim yarıda kaldıysa bazı faturaların kesilip kesilmediği bilinmez. Trendyol panelinden kesilmediklerini doğruladıktan sonra işaretleyin.")
                             if st.button("⚡ Trendyol E-Fatura Kes", type="primary", use_container_width=True):
                                 if secilen_faturalar:
-                                    with st.spinner("Trendyol E-Faturam API'sine bağlanılıyor..."):
-                                        token, msg = trendyol_efatura_login()
-                                        if token:
-                                            basarili_nolar = []
-                                            siparis_nolar = [int(s.split(" - ")[0]) for s in secilen_faturalar]
-                                            for sip_no in siparis_nolar:
-                                                siparis_satiri = bekleyenler[bekleyenler['Siparis No'].astype(str) == str(sip_no)].iloc[0].to_dict()
-                                                # token artık bir dict dönüyor: {"token": "...", "user_id": "...", "company_id": "..."}
-                                                payload = create_efatura_payload(siparis_satiri, user_id=token.get("user_id"), company_id=token.get("company_id"))
-
-                                                il_kontrol = siparis_satiri.get('İl', '')
-                                                ilce_kontrol = siparis_satiri.get('İlçe', '')
-
-                                                if not il_kontrol or not ilce_kontrol or str(il_kontrol).strip() == "" or str(ilce_kontrol).strip() == "":
-                                                    st.error(f"#{sip_no} Hatası: İl veya İlçe bilgisi eksik! Lütfen siparişi güncelleyip (veya excelden ekleyip) tekrar deneyin.")
-                                                    continue
-
-                                                cevap, msj2 = trendyol_efatura_kes(token.get("token"), payload)
-                                                if msj2 == "BAŞARILI":
-                                                    basarili_nolar.append(sip_no)
-                                                    st.success(f"#{sip_no} numaralı sipariş için e-fatura oluşturuldu!")
-                                                else:
-                                                    st.error(f"#{sip_no} Hatası: {msj2}")
-
-                                            # Başarılı olanların durumunu "KESİLDİ" yap
-                                            if basarili_nolar:
-                                                fatura_durumunu_kesildi_yap(basarili_nolar)
-                                                st.info("Kayıtlar güncellendi.")
-                                        else:
-                                            st.error(msg)
+                                    secilen_nolar = {s.split(" - ")[0] for s in secilen_faturalar}
+                                    siparisler = bekleyenler[bekleyenler['Siparis No'].astype(str).isin(secilen_nolar)]
+                                    fatura_ilerleme = st.progress(0.0, text=f"Faturalar kesiliyor... (0/{len(siparisler)})")
+                                    fatura_sonuclari = st.container()
+
+                                    def fatura_sonucu(sip_no, basarili, mesaj, biten, toplam):
+                                        fatura_ilerleme.progress(biten / toplam, text=f"Faturalar kesiliyor... ({biten}/{toplam})")
+                                        if basarili: fatura_sonuclari.success(f"#{sip_no} numaralı sipariş için e-fatura oluşturuldu!" if mesaj == "BAŞARILI" else f"#{sip_no}: {mesaj}")
+                                        else: fatura_sonuclari.error(f"#{sip_no} Hatası: {mesaj}")
+
+                                    basarili_nolar, msg = efatura_toplu_kes(siparisler, fatura_sonucu, belirsizse_de)
+                                    if msg != "BAŞARILI": st.error(msg)
+
+                                    # Kesilenlerin (ve önceki çalışmalardan kalanların) durumunu tek toplu yazma ile "KESİLDİ" yap
+                                    if basarili_nolar:
+                                        uzlasan, uzlasma_msg = fatura_gunlugunu_uzlastir(zorla=True)
+                                        if uzlasma_msg == "BAŞARILI": st.info("Kayıtlar güncellendi.")
+                                        else: st.error(uzlasma_msg)
                     else: st.success("Kesilecek fatura kalmadı.")
                 with tab2:
                     kesilenler = df[df["Fatura Durumu"] == "KESİLDİ"]
@@ -1604,26 +2438,18 @@ elif menu == "📊 Raporlar":
                              horizontal=True)
 
     try:
-        raw_manuel = verileri_getir("Siparisler") if "Manuel" in kaynak_secimi or "Tümü" in kaynak_secimi else []
-        raw_pazaryeri = verileri_getir("PazaryeriSiparisleri") if "Pazaryeri" in kaynak_secimi or "Tümü" in kaynak_secimi else []
-
-        df_manuel = pd.DataFrame(raw_manuel) if raw_manuel else pd.DataFrame()
-        df_pazaryeri = pd.DataFrame(raw_pazaryeri) if raw_pazaryeri else pd.DataFrame()
+        df_manuel = tablo_getir("Siparisler") if "Manuel" in kaynak_secimi or "Tümü" in kaynak_secimi else pd.DataFrame()
+        df_pazaryeri = tablo_getir("PazaryeriSiparisleri") if "Pazaryeri" in kaynak_secimi or "Tümü" in kaynak_secimi else pd.DataFrame()
 
-        # Ortak bir DataFrame oluşturalım
+        # Ortak bir DataFrame oluşturalım (önbellekteki tablolar paylaşıldığı için assign ile kopya üzerinde)
         df_list = []
         if not df_manuel.empty:
-            df_manuel["Sipariş Türü"] = "Manuel"
-            df_list.append(df_manuel)
+            df_list.append(df_manuel.assign(**{"Sipariş Türü": "Manuel"}))
         if not df_pazaryeri.empty:
-            df_pazaryeri["Sipariş Türü"] = "Pazaryeri"
-            df_list.append(df_pazaryeri)
+            df_list.append(df_pazaryeri.assign(**{"Sipariş Türü": "Pazaryeri"}))
 
         if df_list:
             df = pd.concat(df_list, ignore_index=True)
-            df['Tarih_dt'] = pd.to_datetime(df['Tarih'], format="%d.%m.%Y %H:%M", errors='coerce')
-            df['Tarih_gun'] = df['Tarih_dt'].dt.date
-            df['Tutar_float'] = df['Tutar'].apply(lambda x: safe_float(x))
 
             f1, f2, f3 = st.columns([1, 1, 2])
             with f1: secilen_urunler = st.multiselect("Ürün Seçiniz:", list(GUNCEL_URUNLER.keys()))
@@ -1637,28 +2463,29 @@ elif menu == "📊 Raporlar":
             elif zaman_secimi == "Son 1 Yıl": bas = bugun - timedelta(days=365)
             elif zaman_secimi == "Bu Ay": bas = bugun.replace(day=1)
             elif zaman_secimi == "Geçen Ay": bas = (bugun.replace(day=1) - timedelta(days=1)).replace(day=1); bit = bugun.replace(day=1) - timedelta(days=1)
-            df_f = df[(df['Tarih_gun'] >= bas) & (df['Tarih_gun'] <= bit)]
-            if secilen_urunler: df_f = df_f[df_f['Ürün 1'].isin(secilen_urunler) | df_f['Ürün 2'].isin(secilen_urunler)]
+            df_f = df[(df['Tarih_dt'] >= pd.Timestamp(bas)) & (df['Tarih_dt'] < pd.Timestamp(bit + timedelta(days=1)))]
+            # Ürün bazlı hesaplar kalem tablosundan (3+ ürünlü siparişler dahil) yapılır
+            kalemler = kalem_tablosu()
+            anahtar = ['Sipariş Türü', 'Sipariş Anahtarı']
+            if secilen_urunler:
+                df_f = df_f.merge(kalemler.loc[kalemler['Ürün'].isin(secilen_urunler), anahtar].drop_duplicates(), on=anahtar)
+            kalemler_f = kalemler.merge(df_f[anahtar].drop_duplicates(), on=anahtar)
             if not df_f.empty:
                 st.info(f"📅 {bas.strftime('%d.%m.%Y')} - {bit.strftime('%d.%m.%Y')}")
                 top_ciro = df_f['Tutar_float'].sum()
                 top_sip = len(df_f)
-                a1 = pd.to_numeric(df_f['Adet 1'], errors='coerce').fillna(0).sum()
-                a2 = pd.to_numeric(df_f['Adet 2'], errors='coerce').fillna(0).sum()
-                top_urun = a1 + a2
+                top_urun = kalemler_f['Adet'].sum()
                 k1, k2, k3 = st.columns(3)
                 k1.metric("Toplam Ciro", f"{top_ciro:,.2f} TL")
                 k2.metric("Sipariş Sayısı", f"{top_sip}")
                 k3.metric("Satılan Ürün", f"{int(top_urun)}")
                 g1, g2 = st.columns(2)
                 with g1:
-                    u1c = df_f['Ürün 1'].value_counts(); u2c = df_f['Ürün 2'].value_counts()
-                    total = u1c.add(u2c, fill_value=0).sort_values(ascending=True)
-                    if '' in total.index: total = total.drop('')
+                    total = kalemler_f.groupby('Ürün')['Adet'].sum().sort_values(ascending=True)
                     if not total.empty: st.plotly_chart(px.bar(x=total.values, y=total.index, orientation='h', labels={'x':'Adet','y':''}), use_container_width=True)
                 with g2:
                     if not df_f.empty:
-                        df_grp = df_f.groupby('Tarih_gun')['Tutar_float'].sum().reset_index()
+                        df_grp = df_f.groupby(df_f['Tarih_dt'].dt.normalize().rename('Tarih_gun'))['Tutar_float'].sum().reset_index()
                         st.plotly_chart(px.line(df_grp, x='Tarih_gun', y='Tutar_float', markers=True, title='Günlük Ciro'), use_container_width=True)
 
                 # Eğer tümü seçiliyse, Sipariş Türü bazında pasta grafik veya bar da eklenebilir.
@@ -1685,11 +2512,9 @@ elif menu == "💰 Cari Hesaplar":
     with st.expander("➕ Yeni Fatura / Ödeme İşle", expanded=True):
         with st.form("cari"):
             c1, c2 = st.columns(2)
-            mevcut_data = verileri_getir("Cariler")
+            df_cari = tablo_getir("Cariler")
             mevcut_cariler = []
-            if mevcut_data:
-                df_temp = pd.DataFrame(mevcut_data)
-                if "Cari Adı" in df_temp.columns: mevcut_cariler = df_temp["Cari Adı"].unique().tolist()
+            if "Cari Adı" in df_cari.columns: mevcut_cariler = df_cari["Cari Adı"].unique().tolist()
             cari_secim = c1.selectbox("Cari Hesap Seç:", ["Yeni Ekle..."] + mevcut_cariler)
             if cari_secim == "Yeni Ekle...": ad = c1.text_input("Yeni Cari Adı:")
             else: ad = cari_secim
@@ -1703,17 +2528,15 @@ elif menu == "💰 Cari Hesaplar":
                     tarih_str = f_tarih.strftime("%d.%m.%Y")
                     tip_kisa = "BORÇ" if "BORÇ" in islem_tipi else "ALACAK"
                     cari_islem_ekle([ad, tarih_str, f_no, not_aciklama, tutar, tip_kisa])
-                    st.success("Kaydedildi!")
-                    st.cache_resource.clear()
+                    st.success("Kaydedildi! (Sheets'e aktarılmak üzere sıraya alındı)")
                     st.rerun()
                 else: st.warning("Cari adı boş olamaz.")
-    if mevcut_data:
-        df = pd.DataFrame(mevcut_data)
+    if not df_cari.empty:
+        df = df_cari
         if 'Cari Adı' in df.columns:
             secili = st.selectbox("Hesap Detayı Gör:", df['Cari Adı'].unique())
             if secili:
-                df['Tutar_float'] = df['Tutar'].apply(lambda x: safe_float(x))
-                sub = df[df['Cari Adı'] == secili].copy()
+                sub = df[df['Cari Adı'] == secili]
                 st.table(sub[["Tarih", "Fatura No", "Not", "Tutar", "Tip"]])
         else: st.warning("Veriler yüklenemedi.")
     else: st.info("Henüz kayıt yok.")
@@ -1769,7 +2592,7 @@ elif menu == "📉 Maliyet Yönetimi":
                 veri = { "Ürün Id": u_id, "Ürün Kod": u_kod, "Görsel": GUNCEL_URUNLER.get(u_id, ""), "Tahta": tahta, "VERNİK": vernik, "YAKMA": yakma, "BOYA": boya, "MUSLUK": musluk, "BORU": boru, "HALAT": halat, "Metal çubuk": metal, "CAM": cam, "UĞUR KAR": ugur, "MALİYET": toplam }
                 res = maliyet_kaydet(veri)
                 if "HATA" in res: st.error(res)
-                else: st.success(res); st.cache_resource.clear()
+                else: st.success(res)
 
 # 8. ÜRÜN YÖNETİMİ
 elif menu == "➕ Ürün Yönetimi":
@@ -1782,6 +2605,6 @@ elif menu == "➕ Ürün Yönetimi":
                 dosya = f"{ad.replace(' ','_')}.jpg"
                 img = Image.open(resim).convert('RGB'); img.save(os.path.join(RESIM_KLASORU, dosya))
                 yeni_urun_resim_ekle(ad, dosya)
-                st.success("Eklendi!")
+                st.success("Eklendi! (Sheets'e aktarılmak üzere sıraya alındı)")
             else: st.warning("Eksik bilgi.")
 
@@ -0,0 +1,293 @@
+"""Etiket ve fiş PDF'leri: Code128 barkod, 100x150 mm EtiketPDF şablonu ve pazaryeri kartları.
+
+Streamlit'e bağlı değildir; toplu pazaryeri etiketlerini çizen süreç havuzu işçileri bu modülü içe aktarır."""
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from fpdf import FPDF
+
+# Toplu pazaryeri etiketleri bu büyüklükte parçalar halinde işlemci çekirdeklerine dağıtılır (tek parçalık iş seri çizilir)
+ETIKET_PARCA_BOYUTU = 40
+# Toplu çizimin süreç havuzunda en fazla bekleneceği süre; aşılırsa işçiler sonlandırılıp seri çizilir
+ETIKET_HAVUZ_ZAMAN_ASIMI_SN = 120
+# İşçiler forkserver (yoksa, Windows'ta spawn) ile açılır. fork kullanılmaz: Streamlit süreci çok iş parçacıklıdır
+ETIKET_SURECI_BASLATMA = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+# --- CODE128 BARKOD ---
+# Kargo takip numaraları Code128 ile kodlanır ve çubuklar PDF'e vektör dikdörtgen olarak çizilir (ağ ve geçici dosya yok).
+# Her desen sırasıyla çubuk/boşluk genişlikleridir (modül); 103-105 başlangıç A/B/C, 106 bitiş.
+CODE128_DESENLERI = [
+    "212222", "222122", "222221", "121223", "121322", "131222", "122213", "122312", "132212", "221213",
+    "221312", "231212", "112232", "122132", "122231", "113222", "123122", "123221", "223211", "221132",
+    "221231", "213212", "223112", "312131", "311222", "321122", "321221", "312212", "322112", "322211",
+    "212123", "212321", "232121", "111323", "131123", "131321", "112313", "132113", "132311", "211313",
+    "231113", "231311", "112133", "112331", "132131", "113123", "113321", "133121", "313121", "211331",
+    "231131", "213113", "213311", "213131", "311123", "311321", "331121", "312113", "312311", "332111",
+    "314111", "221411", "431111", "111224", "111422", "121124", "121421", "141122", "141221", "112214",
+    "112412", "122114", "122411", "142112", "142211", "241211", "221114", "413111", "241112", "134111",
+    "111242", "121142", "121241", "114212", "124112", "124211", "411212", "421112", "421211", "212141",
+    "214121", "412121", "111143", "111341", "131141", "114113", "114311", "411113", "411311", "113141",
+    "114131", "311141", "411131", "211412", "211214", "211232", "2331112",
+]
+
+def code128_kodla(metin):
+    """Metni Code128 sembol değerlerine çevirir (başlangıç, veri, kontrol, bitiş). Harfler B kümesiyle, 4 ve daha
+    uzun rakam dizileri (ortada 6+) iki rakam bir sembol olan C kümesiyle kodlanır. ASCII 32-126 dışı karakterde ValueError."""
+    metin = str(metin)
+    if not metin: raise ValueError("Boş barkod metni")
+    if any(not 32 <= ord(c) <= 126 for c in metin): raise ValueError(f"Code128 B ile kodlanamayan karakter: {metin}")
+
+    def rakam_dizisi(i):
+        j = i
+        while j < len(metin) and metin[j].isdigit(): j += 1
+        return j - i
+
+    degerler, kume, i = [], None, 0
+    while i < len(metin):
+        n = rakam_dizisi(i)
+        # Baştaki / sondaki dizide 4, ortada 6 rakamdan itibaren C kümesi daha kısadır; tüm metin 2 rakamsa da C
+        c_uygun = n >= 4 and (i == 0 or i + n == len(metin) or n >= 6) or (i == 0 and n == len(metin) == 2)
+        if c_uygun and kume != 'C':
+            if n % 2 and kume is not None:
+                degerler.append(ord(metin[i]) - 32)  # tek rakam B'de kalır, kalan çift sayı C'ye geçer
+                i += 1
+                n -= 1
+            elif n % 2:
+                n -= 1  # başlangıçta: çift kısım C ile, artan rakam sonra B ile
+            degerler.append(105 if kume is None else 99)
+            kume = 'C'
+        if kume == 'C' and n >= 2:
+            for k in range(i, i + n - n % 2, 2):
+                degerler.append(int(metin[k:k + 2]))
+            i += n - n % 2
+            continue
+        if kume != 'B':
+            degerler.append(104 if kume is None else 100)
+            kume = 'B'
+        degerler.append(ord(metin[i]) - 32)
+        i += 1
+    kontrol = (degerler[0] + sum(k * v for k, v in enumerate(degerler[1:], 1))) % 103
+    return degerler + [kontrol, 106]
+
+def pdf_code128(pdf, metin, x, y, w, h):
+    """Code128 barkodunu (x, y) noktasından başlayarak w x h alana siyah dikdörtgenlerle çizer."""
+    genislikler = [int(c) for v in code128_kodla(metin) for c in CODE128_DESENLERI[v]]
+    modul = w / sum(genislikler)
+    pdf.set_fill_color(0, 0, 0)
+    for k, g in enumerate(genislikler):
+        # Desenler çubukla başlar; çift sıralar çubuk, tek sıralar boşluktur
+        if k % 2 == 0: pdf.rect(x, y, g * modul, h, 'F')
+        x += g * modul
+
+# --- ETİKET ŞABLONLARI ---
+# arial.ttf metrikleri süreç başına bir kez yüklenir; her belge bu metrikleri kendi alt küme (subset) listesiyle kullanır.
+# Etiket türlerinin sabit bölümleri (başlık bandı, bölüm başlıkları) EtiketPDF'te tek yerde tanımlıdır;
+# belge başına sadece değişken alanlar yazılır.
+_font_onbellegi = {}
+_font_kilidi = threading.Lock()
+
+def etiket_fontu():
+    """ArialTR font girdisini ve dosya kaydını döner; arial.ttf yüklenemezse None (belgeler standart Arial'a düşer)."""
+    with _font_kilidi:
+        if "arialtr" not in _font_onbellegi:
+            try:
+                pdf = FPDF()
+                pdf.add_font('ArialTR', '', 'arial.ttf', uni=True)
+                _font_onbellegi["arialtr"] = (pdf.fonts['arialtr'], pdf.font_files)
+            except Exception as e:
+                print("Font yuklenemedi:", e)
+                _font_onbellegi["arialtr"] = None
+        return _font_onbellegi["arialtr"]
+
+class EtiketPDF(FPDF):
+    """100x150 mm etiket belgesi. arial.ttf'nin ayrı kalın/italik dosyası olmadığından (üç stil de aynı dosyaydı)
+    ArialTR tek font olarak gömülür; stiller sadece standart Arial'a düşüldüğünde uygulanır."""
+
+    def __init__(self):
+        super().__init__(format=(100, 150))
+        self.set_auto_page_break(auto=True, margin=5)
+        font = etiket_fontu()
+        if font:
+            girdi, dosyalar = font
+            self.fonts['arialtr'] = dict(girdi, i=len(self.fonts) + 1, subset=list(girdi['subset']))
+            self.font_files.update({k: dict(v) for k, v in dosyalar.items()})
+
+    # Eğer font yüklenmişse (fpdf anahtarları küçük harfle tutar) fpdf utf-8 destekler, çeviriye gerek kalmaz.
+    # Eğer yüklenememişse (fallback Arial) türkçe karakterleri düzeltmemiz gerekir ki pdf çökmesin.
+    def tr(self, t):
+        if not t: return ""
+        if 'arialtr' in self.fonts: return str(t)
+        return str(t).replace("ğ","g").replace("Ğ","G").replace("ş","s").replace("Ş","S").replace("İ","I").replace("ı","i").encode('latin-1','replace').decode('latin-1')
+
+    def set_ft(self, style='', size=10):
+        if 'arialtr' in self.fonts: self.set_font('ArialTR', '', size)
+        else: self.set_font('Arial', style, size)
+
+    def bolum_basligi(self, metin, h):
+        self.set_fill_color(240, 240, 240)
+        self.cell(0, h, self.tr(f"  {metin}"), ln=1, fill=True)
+        self.ln(1)
+
+    def fis_basligi(self, siparis_no, tarih):
+        """Manuel sipariş fişinin 20 mm'lik koyu başlık bandı."""
+        self.set_ft('', 10)
+        self.set_fill_color(40, 40, 40)
+        self.rect(0, 0, 100, 20, 'F')
+        self.set_text_color(255, 255, 255)
+        self.set_font_size(14)
+        self.text(5, 13, "MINIVAGON")
+        self.set_font_size(8)
+        self.set_text_color(200, 200, 200)
+        self.text(55, 8, f"Siparis No: #{siparis_no}")
+        self.text(55, 14, f"Tarih: {tarih}")
+
+    def kart_basligi(self, tarih):
+        """Pazaryeri kartının 15 mm'lik koyu başlık bandı."""
+        self.set_fill_color(40, 40, 40)
+        self.rect(0, 0, 100, 15, 'F')
+        self.set_text_color(255, 255, 255)
+        self.set_ft('B', 12)
+        self.text(5, 10, "MINIVAGON - PAZARYERI KART")
+        self.set_font_size(8)
+        self.set_text_color(200, 200, 200)
+        self.text(60, 10, f"Tarih: {tarih}")
+        self.set_text_color(0, 0, 0)
+
+    def sayfalari_ekle(self, sayfalar, alt_kume):
+        """Başka bir EtiketPDF'te çizilmiş sayfa akışlarını sona ekler ve orada kullanılan karakterleri font alt kümesine
+        ilk kullanım sırasıyla katar. Resim ve bağlantı taşınmaz; pazaryeri kartlarında ikisi de yoktur."""
+        for akis in sayfalar:
+            self.page += 1
+            self.pages[self.page] = akis
+        self.state = 2
+        kume = self.fonts['arialtr']['subset']
+        for c in alt_kume:
+            if c not in kume: kume.append(c)
+
+    def cikti(self):
+        return self.output(dest='S').encode('latin-1')
+
+# --- PAZARYERİ KARTI ---
+def _pazaryeri_karti_ciz(pdf, s):
+    """Bir pazaryeri siparişinin kartını yeni bir sayfaya çizer. Sipariş ve kargo numaraları normalize edilmiş gelir."""
+    tr, set_ft = pdf.tr, pdf.set_ft
+    pdf.add_page()
+    pdf.kart_basligi(s.get('Tarih', ''))
+
+    kargo_takip = str(s.get('Kargo Takip No', ''))
+    # Virgül veya nokta ile girilmiş format bozuklukları varsa temizle (kargo takip numarasında harf ve rakam olur).
+    # isalnum() 'İ', 'ş', '²' gibi ASCII dışı karakterleri de kabul eder; Code128 onları kodlayamaz, barkod hiç basılmazdı.
+    kargo_takip = ''.join(c for c in kargo_takip if c.isascii() and c.isalnum())
+
+    pazaryeri_sip_no = str(s.get('Pazaryeri Siparis No', s.get('Siparis No', '')))
+
+    pdf.set_y(18)
+    set_ft('B', 10)
+    pdf.cell(0, 5, tr("Sipariş No: " + pazaryeri_sip_no), ln=1)
+
+    pdf.ln(2)
+
+    # Musteri
+    set_ft('', 9)
+    pdf.bolum_basligi("MÜŞTERİ BİLGİLERİ", 5)
+
+    set_ft('B', 9)
+    pdf.multi_cell(0, 4, tr(f"Müşteri: {s.get('Müşteri', '')}"))
+    set_ft('', 9)
+    pdf.multi_cell(0, 4, tr(f"Telefon: {s.get('Telefon', '')}"))
+
+    il = str(s.get('İl', '')).strip()
+    ilce = str(s.get('İlçe', '')).strip()
+    adres_metni = str(s.get('Adres', '')).strip()
+    if il and ilce:
+        adres_metni = f"{adres_metni}\n{ilce.upper()} / {il.upper()}"
+
+    pdf.multi_cell(0, 4, tr(f"Adres: {adres_metni}"))
+
+    pdf.ln(3)
+
+    # Urunler
+    set_ft('', 9)
+    pdf.bolum_basligi("ÜRÜN DETAYLARI", 5)
+
+    set_ft('B', 9)
+    pdf.multi_cell(0, 4, tr(f"1) {s.get('Ürün 1', '')} ({s.get('Adet 1', '')} Adet)"))
+    if s.get('Ürün 2'):
+        pdf.ln(1)
+        pdf.multi_cell(0, 4, tr(f"2) {s.get('Ürün 2', '')} ({s.get('Adet 2', '')} Adet)"))
+
+    # Barcode
+    if kargo_takip:
+        pdf.ln(10)
+        # Kargo Firmasi kaldirildi, sadece Kargo Takip No yaziyoruz
+        set_ft('', 9)
+        pdf.cell(0, 4, tr(f"Kargo Takip No: {kargo_takip}"), ln=1, align='C')
+        pdf.ln(2)
+
+        try:
+            barkod_w = 80
+            barkod_h = 15
+            x_pos = (100 - barkod_w) / 2
+            pdf_code128(pdf, kargo_takip, x=x_pos, y=pdf.get_y(), w=barkod_w, h=barkod_h)
+            pdf.set_y(pdf.get_y() + barkod_h + 5)
+        except Exception as e:
+            print("Barkod olusturulamadi:", e)
+
+# --- TOPLU PAZARYERİ KARTLARI ---
+# Toplu kartlar ETIKET_PARCA_BOYUTU'luk parçalar halinde süreç havuzunda çizilir, sayfa akışları sırayla tek belgede
+# birleştirilir. fpdf her yeni sayfaya önceki sayfanın son font/renk durumunu taşıdığından her parça, önceki parçanın
+# son kartını atılan bir ısınma sayfası olarak çizerek başlar; böylece sayfalar seri çizimle bayt bayt aynı olur.
+# İşçiler bu modülü içe aktarıp fontu kendileri yükler. Havuz hata verir ya da süre aşılırsa seri çizilir.
+def _pazaryeri_parcasi_ciz(siparisler, onceki=None):
+    """İşçide bir parçanın kartlarını çizer; (sayfa akışları, font alt kümesi) döner."""
+    pdf = EtiketPDF()
+    if onceki is not None:
+        _pazaryeri_karti_ciz(pdf, onceki)
+    ilk = pdf.page + 1  # uzun adresli kart sayfa taşırabilir, ısınma birden çok sayfa olabilir
+    for s in siparisler:
+        _pazaryeri_karti_ciz(pdf, s)
+    return [pdf.pages[n] for n in range(ilk, pdf.page + 1)], pdf.fonts['arialtr']['subset']
+
+def _paralel_ciz(siparisler, parcalar, isci, ilerleme=None):
+    baglam = multiprocessing.get_context(ETIKET_SURECI_BASLATMA)
+    if ETIKET_SURECI_BASLATMA == "forkserver": baglam.set_forkserver_preload([__name__])
+    havuz = ProcessPoolExecutor(max_workers=isci, mp_context=baglam)
+    sonuclar, biten = {}, 0
+    try:
+        isler = {havuz.submit(_pazaryeri_parcasi_ciz, parca, siparisler[bas - 1] if bas else None): (bas, len(parca))
+                 for bas, parca in parcalar}
+        for f in as_completed(isler, timeout=ETIKET_HAVUZ_ZAMAN_ASIMI_SN):
+            bas, adet = isler[f]
+            sonuclar[bas] = f.result()
+            biten += adet
+            if ilerleme: ilerleme(biten, len(siparisler))
+    except BaseException:
+        # Takılan ya da çöken işçiler beklenmez, sonlandırılır
+        surecler = list((havuz._processes or {}).values())
+        havuz.shutdown(wait=False, cancel_futures=True)
+        for p in surecler: p.terminate()
+        raise
+    havuz.shutdown()
+    pdf = EtiketPDF()
+    for bas, _ in parcalar:
+        pdf.sayfalari_ekle(*sonuclar[bas])
+    return pdf
+
+def pazaryeri_kartlari(siparisler, ilerleme=None):
+    """Siparişlerin kartlarını sırayla tek EtiketPDF'te toplar. ilerleme(biten, toplam) her parça bittiğinde çağrılır."""
+    siparisler = list(siparisler)
+    parcalar = [(bas, siparisler[bas:bas + ETIKET_PARCA_BOYUTU]) for bas in range(0, len(siparisler), ETIKET_PARCA_BOYUTU)]
+    isci = min(os.cpu_count() or 1, len(parcalar))
+    # Font (ve fpdf'in yanına yazdığı metrik önbelleği) işçiler açılmadan yüklenir
+    if etiket_fontu() and isci > 1:
+        try:
+            return _paralel_ciz(siparisler, parcalar, isci, ilerleme)
+        except Exception as e:
+            print("Paralel etiket cizimi basarisiz, seri ciziliyor:", repr(e))
+
+    pdf = EtiketPDF()
+    for k, s in enumerate(siparisler, 1):
+        _pazaryeri_karti_ciz(pdf, s)
+        if ilerleme and (k % ETIKET_PARCA_BOYUTU == 0 or k == len(siparisler)): ilerleme(k, len(siparisler))
+    return pdf
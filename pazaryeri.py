@@ -0,0 +1,293 @@
+"""Pazaryeri siparişleri: Trendyol sipariş API'si, pazaryeri adaptörleri ve kayıtlı cevaplarla istek.
+
+Streamlit'e bağlı değildir; secrets bölümü ve HTTP istek fonksiyonu adaptörlere uygulama tarafından verilir."""
+import base64
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+import pytz
+import requests
+
+# Trendyol sipariş API'si: sayfa boyutu üst sınırı, tek istekte izin verilen en uzun tarih aralığı,
+# aynı anda gönderilen en fazla istek ve 429/5xx cevaplarında tekrar deneme sayısı
+TRENDYOL_SAYFA_BOYUTU = 200
+TRENDYOL_PENCERE_GUN = 14
+TRENDYOL_ESZAMANLI_ISTEK = 5
+TRENDYOL_MAKS_DENEME = 3
+# Kayıtlı cevap anahtarına girmeyen istek parametreleri (senkron penceresi o anki saatten hesaplanır)
+KAYIT_DISI_PARAMETRELER = ("startDate", "endDate")
+
+# --- SİPARİŞ NUMARASI KİMLİĞİ ---
+def siparis_no_normalize(val):
+    """Sipariş numarasının tek kanonik biçimi. Sheets/Excel'in sayıya çevirdiği numaralardaki
+    '.0' sonekini ve bilimsel gösterimi (7.26003E+15) temizler; tüm karşılaştırmalar bunu kullanmalı."""
+    if val is None: return ""
+    s = str(val).strip()
+    if not s or s.lower() == "nan": return ""
+    if re.fullmatch(r"[+-]?\d+(?:[.,]\d+)?[eE][+-]?\d+", s):
+        try: return f"{float(s.replace(',', '.')):.0f}"
+        except ValueError: return s
+    if re.fullmatch(r"\d+[.,]0+", s):
+        return re.split(r"[.,]", s)[0]
+    return s
+
+# --- TRENDYOL API BAĞLANTISI ---
+def _trendyol_pencereleri(start_date_ms, end_date_ms):
+    """Tarih aralığını API'nin kabul ettiği uzunlukta, birbirine değmeyen pencerelere böler. Tarih yoksa tek pencere (None)."""
+    if not (start_date_ms and end_date_ms): return [None]
+    adim = TRENDYOL_PENCERE_GUN * 24 * 3600 * 1000
+    pencereler, bas = [], int(start_date_ms)
+    while bas <= int(end_date_ms):
+        bit = min(bas + adim - 1, int(end_date_ms))
+        pencereler.append((bas, bit))
+        bas = bit + 1
+    return pencereler
+
+def _trendyol_sayfa_getir(istek, url, headers, pencere, sayfa):
+    params = {"page": sayfa, "size": TRENDYOL_SAYFA_BOYUTU}
+    if pencere: params.update(startDate=pencere[0], endDate=pencere[1])
+    for deneme in range(TRENDYOL_MAKS_DENEME + 1):
+        response = istek("trendyol_siparis", "GET", url, headers=headers, params=params)
+        if response.status_code == 200:
+            return response.json()
+        if response.status_code not in (429, 500, 502, 503, 504) or deneme == TRENDYOL_MAKS_DENEME:
+            break
+        time.sleep(random.uniform(0, 2 ** deneme))
+    raise RuntimeError(f"Trendyol Hatası: {response.status_code} - {response.text}")
+
+def fetch_trendyol_orders(ayar, istek, start_date_ms=None, end_date_ms=None, status=None, ilerleme=None, degisiklik_tarihine_gore=False):
+    """Seçilen aralıktaki tüm siparişleri çeker. Aralık pencerelere bölünür, her pencerenin ilk sayfası
+    totalPages'i verince kalan sayfalar da kuyruğa eklenir; hepsi sınırlı bir iş havuzunda eşzamanlı gider.
+    ilerleme(alınan sayfa, toplam sayfa) verilirse her sayfa geldiğinde çağrılır.
+    degisiklik_tarihine_gore=True ise aralık paketlerin son güncellenme tarihine uygulanır (artımlı senkron için).
+    ayar secrets'taki [trendyol] bölümü, istek http_istek imzasında istek fonksiyonudur (kayıtlı cevaplar için kayitli_cevap_istegi)."""
+    try:
+        if not ayar:
+            return None, "st.secrets içinde [trendyol] ayarı bulunamadı."
+
+        trendyol_secrets = ayar
+        supplier_id = trendyol_secrets.get("supplier_id")
+        api_key = trendyol_secrets.get("api_key")
+        api_secret = trendyol_secrets.get("api_secret")
+
+        if not supplier_id or not api_key or not api_secret:
+            return None, "Trendyol API bilgileri (supplier_id, api_key, api_secret) st.secrets içinde eksik!"
+
+        auth_str = f"{api_key}:{api_secret}"
+        b64_auth_str = base64.b64encode(auth_str.encode()).decode()
+
+        url = f"https://api.trendyol.com/sapigw/suppliers/{supplier_id}/orders"
+        params = []
+        if status:
+            params.append(f"status={status}")
+        else:
+            params.append("status=Created,Picking,Invoiced,Shipped,Cancelled,Delivered,UnDelivered,Returned,Repack,UnPacked,UnSupplied")
+        if degisiklik_tarihine_gore:
+            params.append("orderByField=PackageLastModifiedDate&orderByDirection=ASC")
+
+        if params:
+            url += "?" + "&".join(params)
+
+        headers = {
+            "Authorization": f"Basic {b64_auth_str}",
+            "User-Agent": f"{supplier_id} - MiniVagonApp"
+        }
+
+        pencereler = _trendyol_pencereleri(start_date_ms, end_date_ms)
+        sayfalar = {}
+        toplam = len(pencereler)
+        with ThreadPoolExecutor(max_workers=TRENDYOL_ESZAMANLI_ISTEK) as havuz:
+            bekleyen = {havuz.submit(_trendyol_sayfa_getir, istek, url, headers, p, 0): (i, 0) for i, p in enumerate(pencereler)}
+            try:
+                while bekleyen:
+                    bitenler, _ = wait(bekleyen, return_when=FIRST_COMPLETED)
+                    for f in bitenler:
+                        i, sayfa = bekleyen.pop(f)
+                        cevap = f.result()
+                        sayfalar[(i, sayfa)] = cevap.get("content", [])
+                        if sayfa == 0:
+                            toplam_sayfa = max(1, int(cevap.get("totalPages") or 1))
+                            toplam += toplam_sayfa - 1
+                            for s in range(1, toplam_sayfa):
+                                bekleyen[havuz.submit(_trendyol_sayfa_getir, istek, url, headers, pencereler[i], s)] = (i, s)
+                        if ilerleme: ilerleme(len(sayfalar), toplam)
+            except Exception:
+                for f in bekleyen: f.cancel()
+                raise
+
+        # Pencere/sayfa sırasıyla birleştirilir; sayfalama sırasında kayan paketler iki kez gelebildiği için tekilleştirilir
+        siparisler, gorulen = [], set()
+        for anahtar in sorted(sayfalar):
+            for order in sayfalar[anahtar]:
+                k = order.get("id") or order.get("orderNumber")
+                if k in gorulen: continue
+                gorulen.add(k)
+                siparisler.append(order)
+        return siparisler, "BAŞARILI"
+    except RuntimeError as e:
+        return None, str(e)
+    except Exception as e:
+        return None, f"Sistem Hatası: {str(e)}"
+
+def format_trendyol_orders(orders):
+    """Trendyol siparişlerini sisteme uygun formata (PazaryeriSiparisleri sayfasına) dönüştürür.
+    Kayıtlı siparişlerle karşılaştırma pazaryeri_siparislerini_ayir'dadır."""
+    formatted_list = []
+
+    for order in orders:
+        # Pazaryeri Siparis No kolonunda trendyol order numarasını tutuyoruz.
+        ty_order_no = str(order.get('orderNumber'))
+
+        ship_addr = order.get('shipmentAddress', {})
+        musteri_adi = f"{ship_addr.get('firstName', '')} {ship_addr.get('lastName', '')}".strip()
+        tel = ship_addr.get('phone', '')
+        adres = ship_addr.get('fullAddress', '')
+        tc = order.get('invoiceAddress', {}).get('tcIdentityNumber', '')
+        mail = order.get('customerEmail', '')
+
+        tarih_ms = order.get('orderDate', 0)
+        tarih = datetime.now(pytz.timezone('Europe/Istanbul')).strftime("%d.%m.%Y %H:%M")
+        if tarih_ms > 0:
+            try:
+                tarih = datetime.fromtimestamp(tarih_ms/1000).strftime("%d.%m.%Y %H:%M")
+            except: pass
+
+        lines = order.get('lines', [])
+
+        u1, a1, i1 = "", 0, ""
+        u2, a2, i2 = "", 0, ""
+        toplam_tutar = order.get('totalPrice', 0)
+
+        if len(lines) > 0:
+            u1 = lines[0].get('productName', '')
+            a1 = lines[0].get('quantity', 0)
+        if len(lines) > 1:
+            u2 = lines[1].get('productName', '')
+            a2 = lines[1].get('quantity', 0)
+        if len(lines) > 2:
+            i1 = "Trendyol panelinden kontrol ediniz (3+ ürün)"
+
+        # Trendyol API'deki statüye göre bizim sistem statüsünü eşleştirme
+        ty_status = order.get('status', '')
+        durum_map = {
+            "Created": "YENİ SİPARİŞ",
+            "Picking": "YENİ SİPARİŞ",
+            "Shipped": "KARGOLANDI",
+            "Delivered": "TESLİM EDİLDİ",
+            "Cancelled": "İPTAL",
+            "Returned": "İADE",
+            "UnDelivered": "TESLİM EDİLEMEDİ"
+        }
+        durum = durum_map.get(ty_status, "YENİ SİPARİŞ")
+
+        odeme = "TRENDYOL"
+        kaynak = "Trendyol"
+        fatura = "KESİLMEDİ"
+        tedarik = "BEKLİYOR"
+        kargo_takip = str(order.get('cargoTrackingNumber') or '').strip()
+        kargo_firmasi = str(order.get('cargoProviderName') or '').strip()
+
+        # ["Pazaryeri Siparis No","Tarih","Durum","Müşteri","Telefon","TC No","Mail","Ürün 1","Adet 1","İsim 1","Ürün 2","Adet 2","İsim 2","Tutar","Ödeme","Kaynak","Adres","Kargo Takip No","Fatura Durumu","Tedarik Durumu", "İl", "İlçe", "Kargo Firması", "Yazdırıldı Durumu"]
+        il = ship_addr.get('city','')
+        ilce = ship_addr.get('district','')
+        yazdirildi = "YAZDIRILMADI"
+        satir = [
+            ty_order_no, tarih, durum, musteri_adi, tel, tc, mail,
+            u1, a1, i1, u2, a2, i2, toplam_tutar, odeme, kaynak,
+            adres, kargo_takip, fatura, tedarik, il, ilce, kargo_firmasi, yazdirildi
+        ]
+
+        formatted_list.append(satir)
+
+    return formatted_list
+
+# --- PAZARYERİ ADAPTÖRLERİ ---
+# Her pazaryeri aynı sözleşmeyi uygular: siparisleri_getir (ham API cevabı), normalize (PazaryeriSiparisleri satırı
+# ve kalemler) ve tekillestir. Senkron ayarlı tüm adaptörleri eşzamanlı çalıştırır, sonuçları tek toplu yazmayla kaydeder.
+# Adaptörler HTTP isteklerini kendilerine verilen istek fonksiyonuyla yapar; kayitli_cevap_istegi ile ağa çıkmadan denenebilir.
+class PazaryeriAdaptoru(ABC):
+    """Adaptör arayüzü. kaynak hem Kaynak sütunundaki ad hem de senkron işaretinin anahtarıdır."""
+    kaynak = None
+    ayar_bolumu = None
+
+    def __init__(self, istek, ayar=None):
+        """istek http_istek imzasında istek fonksiyonu, ayar secrets'taki bölümü (ayar_bolumu) olur."""
+        self.istek = istek
+        self.ayar = ayar
+
+    @abstractmethod
+    def ayarli_mi(self):
+        """secrets'ta gerekli ayarlar varsa True; senkron sadece ayarlı adaptörleri çalıştırır."""
+
+    @abstractmethod
+    def siparisleri_getir(self, baslangic_ms, bitis_ms, ilerleme=None, degisiklik_tarihine_gore=False):
+        """Aralıktaki ham siparişler: (liste, "BAŞARILI") veya (None, hata mesajı)"""
+
+    @abstractmethod
+    def normalize(self, orders):
+        """Ham siparişleri [{"no", "degisiklik_ms", "satir", "kalemler"}] kayıtlarına çevirir. satir PazaryeriSiparisleri
+        başlık sırasındadır; kalemler [(ürün, adet, isim)] siparişin tüm ürünleridir (satır sadece ilk ikisini tutar)."""
+
+    def tekillestir(self, kayitlar):
+        """Aynı sipariş birden çok kez gelebilir (ör. birden çok paket); en son değişen kayıt geçerlidir."""
+        gelen = {}
+        for k in sorted(kayitlar, key=lambda k: k["degisiklik_ms"]):
+            no = siparis_no_normalize(k["no"])
+            if no: gelen[no] = k
+        return list(gelen.values())
+
+class TrendyolAdaptoru(PazaryeriAdaptoru):
+    kaynak = "Trendyol"
+    ayar_bolumu = "trendyol"
+
+    def ayarli_mi(self):
+        return bool(self.ayar)
+
+    def siparisleri_getir(self, baslangic_ms, bitis_ms, ilerleme=None, degisiklik_tarihine_gore=False):
+        return fetch_trendyol_orders(self.ayar, self.istek, start_date_ms=baslangic_ms, end_date_ms=bitis_ms,
+                                     ilerleme=ilerleme, degisiklik_tarihine_gore=degisiklik_tarihine_gore)
+
+    def normalize(self, orders):
+        orders = list(orders)
+        return [{"no": satir[0], "degisiklik_ms": o.get('lastModifiedDate') or o.get('orderDate') or 0, "satir": satir,
+                 "kalemler": [(l.get('productName', ''), l.get('quantity', 0), "") for l in o.get('lines', [])]}
+                for o, satir in zip(orders, format_trendyol_orders(orders))]
+
+# Yeni bir pazaryeri, adaptörü bu listeye eklenerek senkrona katılır
+PAZARYERI_ADAPTORLERI = [TrendyolAdaptoru]
+
+def kayitli_cevap_istegi(klasor, kaydeden_istek=None):
+    """http_istek yerine geçen istek fonksiyonu. Cevapları klasördeki JSON dosyalarından okur; kaydeden_istek verilirse
+    gerçek istek onunla yapılır ve cevap oraya yazılır. Adaptörleri kayıtlı cevaplarla ağa çıkmadan denemek için.
+    Dosya adı uç nokta, istek ve aynı isteğin kaçıncı kez yapıldığından oluşur; o anki saatten hesaplanan tarih
+    penceresi parametreleri anahtara girmez, aynı sayfanın farklı pencereleri sıra numarasıyla ayrılır."""
+    sayaclar, kilit = {}, threading.Lock()
+
+    def istek(uc_nokta, method, url, **kwargs):
+        params = kwargs.get("params")
+        if isinstance(params, dict):
+            params = {k: v for k, v in params.items() if k not in KAYIT_DISI_PARAMETRELER}
+        anahtar = hashlib.sha1(json.dumps([method, url, params], sort_keys=True, default=str).encode()).hexdigest()[:16]
+        with kilit:
+            sira = sayaclar.get(anahtar, 0)
+            sayaclar[anahtar] = sira + 1
+        yol = os.path.join(klasor, f"{uc_nokta}_{anahtar}_{sira}.json")
+        if kaydeden_istek:
+            response = kaydeden_istek(uc_nokta, method, url, **kwargs)
+            os.makedirs(klasor, exist_ok=True)
+            with open(yol, "w", encoding="utf-8") as f:
+                json.dump({"status_code": response.status_code, "text": response.text}, f, ensure_ascii=False)
+            return response
+        with open(yol, encoding="utf-8") as f:
+            kayit = json.load(f)
+        response = requests.Response()
+        response.status_code, response._content, response.encoding = kayit["status_code"], kayit["text"].encode("utf-8"), "utf-8"
+        return response
+    return istek
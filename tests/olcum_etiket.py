@@ -0,0 +1,88 @@
+"""Etiket çiziminin belge ve etiket başına süresi: önceki kurulum (her belge arial.ttf'yi üç stil için ayrıştırıp
+üç kez gömer) ile EtiketPDF (font metrikleri süreç başına bir kez yüklenir, tek gömülü font) karşılaştırılır.
+
+Depo kökünden çalıştırılır (arial.ttf göreli yoldan yüklenir):
+    python -m tests.olcum_etiket [--tekrar 50] [--adet 200]
+Manuel sipariş fişi app.py'de olduğu için ölçülmez; onun belge başına kurulum maliyeti "boş belge" satırıdır."""
+import argparse
+import time
+
+from fpdf import FPDF
+
+from etiket import EtiketPDF, _pazaryeri_karti_ciz, etiket_fontu, pazaryeri_kartlari
+
+ORNEK_SIPARIS = {
+    "Pazaryeri Siparis No": "10734567801", "Tarih": "17.10.2026 14:05", "Müşteri": "Ayşe Yılmaz",
+    "Telefon": "05551234567", "Adres": "Caferağa Mah. Moda Cad. No:12 D:4", "İl": "İstanbul", "İlçe": "Kadıköy",
+    "Ürün 1": "6 LI KADEHLİK", "Adet 1": 1, "Ürün 2": "ÇİFTLİ FIÇI", "Adet 2": 2, "Kargo Takip No": "7330012345678",
+}
+
+
+class OncekiEtiketPDF(EtiketPDF):
+    """Değişiklik öncesi belge kurulumu: fontlar her belgede yeniden yüklenir, kalın/italik ayrı font olarak gömülür."""
+
+    def __init__(self):
+        FPDF.__init__(self, format=(100, 150))
+        self.set_auto_page_break(auto=True, margin=5)
+        for stil in ('', 'B', 'I'):
+            self.add_font('ArialTR', stil, 'arial.ttf', uni=True)
+
+    def set_ft(self, style='', size=10):
+        self.set_font('ArialTR', style, size)
+
+
+def sure_ms(is_, tekrar):
+    """is_'in tekrar kez çalıştırılmasının ortalama süresi (ms)."""
+    basla = time.perf_counter()
+    for _ in range(tekrar):
+        is_()
+    return (time.perf_counter() - basla) * 1000 / tekrar
+
+
+def bos_belge(sinif):
+    pdf = sinif()
+    pdf.add_page()
+    return pdf.cikti()
+
+
+def tek_kart(sinif):
+    pdf = sinif()
+    _pazaryeri_karti_ciz(pdf, ORNEK_SIPARIS)
+    return pdf.cikti()
+
+
+def seri_kartlar(sinif, adet):
+    pdf = sinif()
+    for _ in range(adet):
+        _pazaryeri_karti_ciz(pdf, ORNEK_SIPARIS)
+    return pdf.cikti()
+
+
+def main():
+    ayar = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ayar.add_argument("--tekrar", type=int, default=50, help="her ölçümün tekrar sayısı")
+    ayar.add_argument("--adet", type=int, default=200, help="toplu ölçümdeki kart sayısı")
+    a = ayar.parse_args()
+    if not etiket_fontu(): raise SystemExit("arial.ttf yüklenemedi; depo kökünden çalıştırın.")
+    # fpdf 1.7.2 ilk add_font'ta metrik önbelleğini yazar; ölçümler ısınmış durumda yapılır
+    for sinif in (OncekiEtiketPDF, EtiketPDF): tek_kart(sinif)
+
+    toplu_tekrar = max(1, a.tekrar // 10)
+    satirlar = [
+        ("boş belge (belge başına)", *(sure_ms(lambda: bos_belge(s), a.tekrar) for s in (OncekiEtiketPDF, EtiketPDF))),
+        ("pazaryeri kartı (belge başına)", *(sure_ms(lambda: tek_kart(s), a.tekrar) for s in (OncekiEtiketPDF, EtiketPDF))),
+        (f"toplu seri, {a.adet} kart (etiket başına)",
+         *(sure_ms(lambda: seri_kartlar(s, a.adet), toplu_tekrar) / a.adet for s in (OncekiEtiketPDF, EtiketPDF))),
+    ]
+    paralel = sure_ms(lambda: pazaryeri_kartlari([ORNEK_SIPARIS] * a.adet).cikti(), toplu_tekrar) / a.adet
+    boyutlar = [len(tek_kart(s)) for s in (OncekiEtiketPDF, EtiketPDF)]
+
+    print(f"{'ölçüm':<44}{'önceki ms':>12}{'şimdiki ms':>12}")
+    for ad, onceki, simdiki in satirlar:
+        print(f"{ad:<44}{onceki:>12.2f}{simdiki:>12.2f}")
+    print(f"{f'pazaryeri_kartlari, {a.adet} kart (etiket başına)':<44}{'':>12}{paralel:>12.2f}")
+    print(f"{'tek kart belge boyutu (bayt)':<44}{boyutlar[0]:>12}{boyutlar[1]:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import random
+import string
+
+import pytest
+
+from etiket import code128_kodla, CODE128_DESENLERI
+
+
+def coz(degerler):
+    """code128_kodla çıktısını başlangıç/küme değiştirme sembollerini izleyerek metne geri çevirir."""
+    assert degerler[-1] == 106
+    basla, veri, kontrol = degerler[0], degerler[1:-2], degerler[-2]
+    assert basla in (104, 105)
+    assert kontrol == (basla + sum(k * v for k, v in enumerate(veri, 1))) % 103
+
+    kume, metin = 'B' if basla == 104 else 'C', []
+    for v in veri:
+        if kume == 'B' and v == 99: kume = 'C'
+        elif kume == 'C' and v == 100: kume = 'B'
+        elif kume == 'B':
+            assert 0 <= v < 95
+            metin.append(chr(v + 32))
+        else:
+            assert 0 <= v < 100
+            metin.append(f"{v:02d}")
+    return ''.join(metin)
+
+
+def test_desenler_modul_genislikleri():
+    assert len(CODE128_DESENLERI) == 107
+    assert all(sum(map(int, d)) == 11 for d in CODE128_DESENLERI[:106])
+    assert sum(map(int, CODE128_DESENLERI[106])) == 13
+
+
+@pytest.mark.parametrize("metin, beklenen", [
+    ("PJJ123C", [104, 48, 42, 42, 17, 18, 19, 35, 55, 106]),
+    ("123456", [105, 12, 34, 56, 44, 106]),
+    ("12", [105, 12, 14, 106]),
+])
+def test_bilinen_kodlamalar(metin, beklenen):
+    assert code128_kodla(metin) == beklenen
+
+
+@pytest.mark.parametrize("metin", [
+    "7330012345678", "TY123456789", "1234567AB", "AB1234567", "A12345678901B", "12345", "X", "0", "a b-c/9",
+])
+def test_geri_cozme(metin):
+    assert coz(code128_kodla(metin)) == metin
+
+
+def test_rastgele_geri_cozme():
+    rnd = random.Random(128)
+    alfabe = string.ascii_uppercase + string.digits * 3 + string.ascii_lowercase + " -./"
+    for _ in range(2000):
+        metin = ''.join(rnd.choice(alfabe) for _ in range(rnd.randint(1, 30)))
+        assert coz(code128_kodla(metin)) == metin
+
+
+def test_rakam_dizisi_c_kumesiyle_kisalir():
+    # 12 rakam B'de 12 sembol, C'de 6 sembol tutar
+    assert len(code128_kodla("123456789012")) == 1 + 6 + 2
+
+
+@pytest.mark.parametrize("metin", ["", "TYİ123", "ş", "12²", "AB\t1"])
+def test_kodlanamayan_metin(metin):
+    with pytest.raises(ValueError):
+        code128_kodla(metin)
@@ -0,0 +1,83 @@
+import json
+import os
+import time
+
+import pytest
+import requests
+
+from pazaryeri import PazaryeriAdaptoru, TrendyolAdaptoru, kayitli_cevap_istegi
+
+KAYIT_KLASORU = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kayitli_cevaplar")
+# Kayıtlı cevapların alındığı (sahte) hesap; istek adresi satıcı numarasını içerdiği için anahtarın parçasıdır
+AYAR = {"supplier_id": "123456", "api_key": "test-anahtar", "api_secret": "test-sir"}
+GUN_MS = 24 * 3600 * 1000
+
+
+def senkron_penceresi(gun=7):
+    bitis = int(time.time() * 1000)
+    return bitis - gun * GUN_MS, bitis
+
+
+def test_trendyol_adaptoru_kayitli_cevaplarla():
+    adaptor = TrendyolAdaptoru(kayitli_cevap_istegi(KAYIT_KLASORU), AYAR)
+    assert adaptor.ayarli_mi()
+
+    # Pencere kayıttakinden farklıdır (o anki saatten hesaplanır); cevap yine de bulunmalı
+    orders, msg = adaptor.siparisleri_getir(*senkron_penceresi(), degisiklik_tarihine_gore=True)
+    assert msg == "BAŞARILI"
+    assert len(orders) == 3
+
+    kayitlar = {k["no"]: k for k in adaptor.tekillestir(adaptor.normalize(orders))}
+    assert sorted(kayitlar) == ["10734567801", "10734567802"]
+
+    # Aynı siparişin iki paketinden son değişeni geçerlidir
+    ilk = kayitlar["10734567801"]
+    assert ilk["degisiklik_ms"] == 1760003600000
+    assert ilk["satir"][2] == "KARGOLANDI"
+    assert ilk["satir"][17] == "7330098765432"
+    assert ilk["satir"][22] == "Trendyol Express Marketplace"
+
+    ikinci = kayitlar["10734567802"]
+    assert ikinci["satir"][2] == "YENİ SİPARİŞ"
+    assert ikinci["satir"][3] == "Mehmet Demir"
+    assert ikinci["satir"][9] == "Trendyol panelinden kontrol ediniz (3+ ürün)"
+    assert [u for u, _, _ in ikinci["kalemler"]] == ["TEKLİ FIÇI", "SATRANÇ", "MAÇA AS"]
+
+
+def test_kayitli_cevap_yoksa_hata_doner():
+    adaptor = TrendyolAdaptoru(kayitli_cevap_istegi(KAYIT_KLASORU), dict(AYAR, supplier_id="999"))
+    orders, msg = adaptor.siparisleri_getir(*senkron_penceresi())
+    assert orders is None
+    assert msg.startswith("Sistem Hatası")
+
+
+def test_kaydet_ve_tekrar_oynat(tmp_path):
+    cagrilar = []
+
+    def gercek_istek(uc_nokta, method, url, **kwargs):
+        cagrilar.append(kwargs["params"])
+        response = requests.Response()
+        response.status_code, response.encoding = 200, "utf-8"
+        response._content = json.dumps({"totalPages": 1, "content": [{"orderNumber": str(len(cagrilar))}]}).encode()
+        return response
+
+    bas, bit = senkron_penceresi(20)  # iki pencere: aynı sayfa isteği iki kez yapılır
+    kaydeden = TrendyolAdaptoru(kayitli_cevap_istegi(str(tmp_path), gercek_istek), AYAR)
+    kayitli, _ = kaydeden.siparisleri_getir(bas, bit)
+    assert len(cagrilar) == 2
+    assert len(os.listdir(tmp_path)) == 2
+
+    tekrar, msg = TrendyolAdaptoru(kayitli_cevap_istegi(str(tmp_path)), AYAR).siparisleri_getir(bas - GUN_MS, bit - GUN_MS)
+    assert msg == "BAŞARILI"
+    assert sorted(o["orderNumber"] for o in tekrar) == sorted(o["orderNumber"] for o in kayitli)
+
+
+def test_eksik_adaptor_olusturulamaz():
+    class EksikAdaptor(PazaryeriAdaptoru):
+        kaynak = "Eksik"
+
+        def ayarli_mi(self):
+            return True
+
+    with pytest.raises(TypeError):
+        EksikAdaptor(lambda *a, **k: None)